@@ -0,0 +1,216 @@
+"""
+Benchmark de la carga de datos de AnalizadorDatos: fila por fila vs columnar
+Ejecutar: python benchmark_analisis.py [tamaños...] [--max-anterior N]
+Ejemplo:  python benchmark_analisis.py 10000 100000 1000000
+
+Crea una base de datos de prueba desechable (nunca toca la real), la llena con
+pedidos sintéticos del mes actual (una línea por pedido) y compara, para
+analizar_ventas_mensuales y analizar_productos_vendidos:
+
+- anterior: instancias del ORM, un dict por fila y ``pedido.usuario`` perezoso
+  (una consulta por pedido).
+- columnar: ``cargar_dataframe`` (values_list por lotes, JOIN en SQL).
+
+Mide tiempo, consultas, pico de memoria Python (tracemalloc) y pico de RSS del
+proceso (incluye la memoria de Polars, que tracemalloc no ve). La versión
+anterior solo corre hasta --max-anterior pedidos: con un millón son un millón
+de consultas.
+"""
+import argparse
+import gc
+import os
+import random
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glamoure.settings')
+django.setup()
+
+import polars as pl
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+from carrito.models import Pedido, PedidoLinea, Producto
+from dashboard.utils import ESTADOS_VENTA, AnalizadorDatos
+
+TAMANOS_POR_DEFECTO = [10_000, 100_000, 1_000_000]
+LOTE = 5_000
+USUARIOS = 1_000
+PRODUCTOS = 200
+CIUDADES = ['Bogotá', 'Medellín', 'Cali', 'Barranquilla', 'Cartagena', '', None]
+
+
+def ventas_anterior():
+    """analizar_ventas_mensuales antes de la carga columnar (solo la carga)"""
+    ahora = timezone.now()
+    pedidos = Pedido.objects.filter(fecha__month=ahora.month, fecha__year=ahora.year, estado__in=ESTADOS_VENTA)
+    datos = []
+    for pedido in pedidos:
+        datos.append({
+            'id_pedido': pedido.id,
+            'fecha': pedido.fecha,
+            'total': float(pedido.total),
+            'estado': pedido.estado,
+            'ciudad': pedido.ciudad or 'Sin especificar',
+            'usuario': pedido.usuario.username if pedido.usuario else 'Invitado'
+        })
+    return pl.DataFrame(datos)
+
+
+def productos_anterior():
+    """analizar_productos_vendidos antes de la carga columnar (solo la carga)"""
+    lineas = PedidoLinea.objects.filter(
+        pedido__fecha__gte=timezone.now() - timedelta(days=30),
+        pedido__fecha__lte=timezone.now(),
+        pedido__estado__in=ESTADOS_VENTA
+    ).select_related('producto', 'pedido')
+    datos = []
+    for linea in lineas:
+        datos.append({
+            'producto_id': linea.producto.id,
+            'producto_nombre': linea.producto.nombre,
+            'cantidad': linea.cantidad,
+            'precio': float(linea.precio_unitario),
+            'subtotal': float(linea.subtotal),
+            'fecha': linea.pedido.fecha
+        })
+    return pl.DataFrame(datos)
+
+
+def poblar(total):
+    """Agrega pedidos (con una línea cada uno) hasta llegar a ``total``"""
+    if not Producto.objects.exists():
+        get_user_model().objects.bulk_create([
+            get_user_model()(username=f'cliente{i}', email=f'cliente{i}@example.com') for i in range(USUARIOS)
+        ])
+        Producto.objects.bulk_create([
+            Producto(nombre=f'Producto {i}', descripcion='', precio=Decimal(random.randint(10, 500) * 1000), stock=10)
+            for i in range(PRODUCTOS)
+        ])
+    usuarios = list(get_user_model().objects.values_list('id', flat=True))
+    productos = list(Producto.objects.values_list('id', 'precio'))
+
+    existentes = Pedido.objects.count()
+    while existentes < total:
+        lote = min(LOTE, total - existentes)
+        elegidos = [random.choice(productos) for _ in range(lote)]
+        cantidades = [random.randint(1, 3) for _ in range(lote)]
+        pedidos = Pedido.objects.bulk_create([
+            Pedido(
+                usuario_id=random.choice(usuarios),
+                numero=f'BENCH-{existentes + i}',
+                total=precio * cantidad,
+                estado=random.choice(ESTADOS_VENTA + ['pendiente']),
+                ciudad=random.choice(CIUDADES),
+            )
+            for i, ((_, precio), cantidad) in enumerate(zip(elegidos, cantidades))
+        ])
+        PedidoLinea.objects.bulk_create([
+            PedidoLinea(pedido=pedido, producto_id=producto_id, cantidad=cantidad,
+                        precio_unitario=precio, subtotal=precio * cantidad)
+            for pedido, (producto_id, precio), cantidad in zip(pedidos, elegidos, cantidades)
+        ])
+        existentes += lote
+
+
+def rss_actual():
+    """RSS del proceso en bytes (Linux); 0 si /proc no está disponible"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return 0
+
+
+def medir(func):
+    """Retorna (segundos, consultas, filas, pico tracemalloc, pico RSS sobre el inicial)"""
+    consultas = 0
+
+    def contar(execute, sql, params, many, context):
+        nonlocal consultas
+        consultas += 1
+        return execute(sql, params, many, context)
+
+    # Primera corrida: tiempo, consultas y RSS muestreado cada 5 ms
+    gc.collect()
+    base = pico = rss_actual()
+    terminado = threading.Event()
+
+    def muestrear():
+        nonlocal pico
+        while not terminado.wait(0.005):
+            pico = max(pico, rss_actual())
+
+    muestreo = threading.Thread(target=muestrear, daemon=True)
+    muestreo.start()
+    with connection.execute_wrapper(contar):
+        inicio = time.perf_counter()
+        df = func()
+        segundos = time.perf_counter() - inicio
+    pico = max(pico, rss_actual())
+    terminado.set()
+    muestreo.join()
+    filas = df.height
+    del df
+
+    # Segunda corrida con tracemalloc (es más lenta, no se cronometra)
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, pico_python = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return segundos, consultas, filas, pico_python, pico - base
+
+
+def imprimir(nombre, resultado):
+    segundos, consultas, filas, pico_python, pico_rss = resultado
+    print(
+        f"   {nombre:<22} {segundos:8.2f}s | {consultas:>9,} consulta(s) | {filas:>9,} filas | "
+        f"pico Python {pico_python / 2**20:8.1f} MB | pico RSS +{pico_rss / 2**20:8.1f} MB"
+    )
+
+
+def benchmark(total, max_anterior):
+    poblar(total)
+    print(f"\n📦 {total:,} pedidos")
+    casos = [
+        ('ventas', ventas_anterior, lambda: AnalizadorDatos.analizar_ventas_mensuales()['dataframe']),
+        ('productos', productos_anterior, lambda: AnalizadorDatos.analizar_productos_vendidos()['dataframe']),
+    ]
+    for nombre, anterior, columnar in casos:
+        if total <= max_anterior:
+            imprimir(f'{nombre} anterior', medir(anterior))
+        else:
+            print(f"   {nombre + ' anterior':<22} omitido (más de {max_anterior:,} pedidos)")
+        imprimir(f'{nombre} columnar', medir(columnar))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la carga de datos de AnalizadorDatos')
+    parser.add_argument('tamanos', nargs='*', type=int, default=TAMANOS_POR_DEFECTO)
+    parser.add_argument('--max-anterior', type=int, default=100_000,
+                        help='Tamaño máximo en el que se mide la versión anterior (default: 100000)')
+    opciones = parser.parse_args()
+
+    print("=" * 60)
+    print("🚀 BENCHMARK DE CARGA DE DATOS PARA ANÁLISIS")
+    print("=" * 60)
+
+    nombre_original = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        for total in sorted(opciones.tamanos):
+            benchmark(total, opciones.max_anterior)
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+    print("\n✅ Benchmark completado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Mide los bytes de imagen por página de las categorías antes y después de los
+derivados responsivos.
+Ejecutar: python benchmark_imagenes.py [ancho_viewport] [densidad]
+Ejemplo:  python benchmark_imagenes.py 390 3     # móvil típico
+
+"Antes" suma los originales (<img src>); "después" suma, para cada tarjeta, el
+candidato que elegiría el navegador del primer <source> (AVIF si existe) según
+el ancho de la tarjeta en ese viewport.
+"""
+import os
+import re
+import sys
+from html.parser import HTMLParser
+
+import django
+import requests
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glamoure.settings')
+django.setup()
+
+from django.conf import settings
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+PAGINAS = ['/hombres/', '/mujeres/', '/zapatos/', '/ofertas/', '/catalogo/']
+_tamanos = {}
+
+
+class Imagenes(HTMLParser):
+    """Extrae (src original, primer srcset) de cada <picture> o <img>"""
+
+    def __init__(self):
+        super().__init__()
+        self.tarjetas = []
+        self._srcset = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'source' and self._srcset is None:
+            self._srcset = attrs.get('srcset')
+        elif tag == 'img' and attrs.get('src'):
+            self.tarjetas.append((attrs['src'], self._srcset))
+            self._srcset = None
+
+
+def ancho_tarjeta(viewport):
+    """Mismo criterio que TAMANOS_TARJETA en core/templatetags/imagenes.py"""
+    columnas = 4 if viewport >= 1024 else 3 if viewport >= 768 else 2 if viewport >= 640 else 1
+    return viewport / columnas
+
+
+def elegir(srcset, ancho_necesario):
+    candidatos = sorted((int(w.rstrip('w')), url) for url, w in (c.split() for c in srcset.split(', ')))
+    for ancho, url in candidatos:
+        if ancho >= ancho_necesario:
+            return url
+    return candidatos[-1][1]
+
+
+def bytes_de(url):
+    if url not in _tamanos:
+        if url.startswith('http'):
+            _tamanos[url] = len(requests.get(url, timeout=30).content)
+        else:
+            ruta = os.path.join(settings.MEDIA_ROOT, url[len(settings.MEDIA_URL):]) if url.startswith(settings.MEDIA_URL) \
+                else os.path.join(settings.BASE_DIR, url.lstrip('/'))
+            _tamanos[url] = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+    return _tamanos[url]
+
+
+def main():
+    viewport = int(sys.argv[1]) if len(sys.argv) > 1 else 1440
+    densidad = float(sys.argv[2]) if len(sys.argv) > 2 else 1
+    necesario = ancho_tarjeta(viewport) * densidad
+
+    setup_test_environment()
+    settings.ALLOWED_HOSTS = ['*']
+    cliente = Client()
+
+    print("=" * 70)
+    print(f"🖼️  BYTES DE IMAGEN POR PÁGINA (viewport {viewport}px, densidad {densidad}x)")
+    print("=" * 70)
+
+    total_antes = total_despues = 0
+    for pagina in PAGINAS:
+        parser = Imagenes()
+        parser.feed(cliente.get(pagina).content.decode())
+        tarjetas = [(src, srcset) for src, srcset in parser.tarjetas if not re.search(r'/static/', src)]
+
+        antes = sum(bytes_de(src) for src, _ in tarjetas)
+        despues = sum(bytes_de(elegir(srcset, necesario) if srcset else src) for src, srcset in tarjetas)
+        con_derivados = sum(1 for _, srcset in tarjetas if srcset)
+        total_antes += antes
+        total_despues += despues
+
+        print(f"{pagina:<12} {len(tarjetas):>3} imágenes ({con_derivados} con derivados) | "
+              f"antes: {antes / 1024:9.1f} KB | después: {despues / 1024:9.1f} KB")
+
+    if total_antes:
+        print(f"\n✅ Total: {total_antes / 1024:.1f} KB -> {total_despues / 1024:.1f} KB "
+              f"({100 * (1 - total_despues / total_antes):.1f}% menos)")
+
+
+if __name__ == "__main__":
+    main()
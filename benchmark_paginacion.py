@@ -0,0 +1,105 @@
+"""
+Benchmark de paginación del catálogo: OFFSET vs keyset
+Ejecutar: python benchmark_paginacion.py [tamaños...]
+Ejemplo:  python benchmark_paginacion.py 10000 100000 1000000
+
+Crea una base de datos de prueba desechable (nunca toca la real), la llena con
+productos sintéticos y mide la primera página, una página profunda con OFFSET y
+la misma página con cursor keyset.
+"""
+import os
+import sys
+import time
+import random
+from decimal import Decimal
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glamoure.settings')
+django.setup()
+
+from django.db import connection
+from carrito.models import Producto
+from core.paginacion import ORDENES, TAMANO_PAGINA, paginar_keyset
+
+TAMANOS_POR_DEFECTO = [10_000, 100_000, 1_000_000]
+LOTE = 5_000
+REPETICIONES = 5
+
+
+def poblar(total):
+    """Agrega productos hasta llegar a ``total`` usando bulk_create por lotes"""
+    existentes = Producto.objects.count()
+    categorias = Producto.CategoriaEnum.values
+    restantes = total - existentes
+    while restantes > 0:
+        lote = min(LOTE, restantes)
+        Producto.objects.bulk_create([
+            Producto(
+                nombre=f'Producto {existentes + i}',
+                descripcion='',
+                precio=Decimal(random.randint(10_000, 500_000)),
+                categoria=random.choice(categorias),
+                stock=random.randint(0, 20),
+                en_oferta=random.random() < 0.2,
+            )
+            for i in range(lote)
+        ], batch_size=LOTE)
+        existentes += lote
+        restantes -= lote
+
+
+def medir(func):
+    """Mejor tiempo de REPETICIONES ejecuciones, en milisegundos"""
+    mejor = float('inf')
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        func()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor * 1000
+
+
+def cursor_en_posicion(queryset, orden, posicion):
+    """Cursor keyset equivalente a empezar en ``posicion`` (se calcula fuera del tiempo medido)"""
+    ultimo = queryset.order_by(*ORDENES[orden]).only('id', 'precio')[posicion - 1]
+    return str(ultimo.id) if orden == 'recientes' else f'{ultimo.precio}_{ultimo.id}'
+
+
+def benchmark(total):
+    poblar(total)
+    queryset = Producto.objects.filter(categoria=Producto.CategoriaEnum.MUJER).only('id', 'nombre', 'precio')
+    filas = queryset.count()
+    profundidad = (filas // TAMANO_PAGINA - 1) * TAMANO_PAGINA
+
+    print(f"\n📦 {total:,} productos ({filas:,} en la sección mujer, página profunda en la fila {profundidad:,})")
+    for orden, campos in ORDENES.items():
+        cursor = cursor_en_posicion(queryset, orden, profundidad)
+        ordenado = queryset.order_by(*campos)
+
+        primera = medir(lambda: list(ordenado[:TAMANO_PAGINA]))
+        offset = medir(lambda: list(ordenado[profundidad:profundidad + TAMANO_PAGINA]))
+        keyset = medir(lambda: paginar_keyset(queryset, orden, cursor))
+
+        print(f"   {orden:<12} primera: {primera:8.2f}ms | OFFSET: {offset:8.2f}ms | keyset: {keyset:8.2f}ms")
+
+
+def main():
+    tamanos = [int(t) for t in sys.argv[1:]] or TAMANOS_POR_DEFECTO
+
+    print("=" * 60)
+    print("🚀 BENCHMARK DE PAGINACIÓN DEL CATÁLOGO")
+    print("=" * 60)
+
+    nombre_original = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        for total in sorted(tamanos):
+            benchmark(total)
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+    print("\n✅ Benchmark completado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Prueba de carga del webhook de Wompi y de la bandeja de eventos
+Ejecutar: python benchmark_webhooks.py [opciones]
+Ejemplo:  python benchmark_webhooks.py --compras 500 --tasa 200 --hilos 16 --workers 4
+
+Crea una base de datos de prueba desechable (nunca toca la real) con la base
+configurada en DJANGO_SETTINGS_MODULE: SQLite o un Postgres local. Prepara
+productos con poco stock y más compras de las que alcanzan; cada compra pasa
+por el checkout real (transacción + reservar_stock) y las que no alcanzan a
+reservar se rechazan ahí, como en la tienda. Luego genera eventos
+``transaction.updated`` firmados como Wompi (WompiUtils.checksum_evento) y los
+envía en paralelo a la vista del webhook, en el mismo proceso, a la tasa pedida.
+Incluye reintentos de Wompi (mismo checksum), eventos reenviados con otra
+firma y rechazos. Mientras tanto, varios workers vacían la bandeja con
+procesar_lote.
+
+Reporta latencia p50/p95/p99 y consultas por evento del webhook y del worker, y
+al final verifica:
+- Cumplimiento duplicado: más de un pedido por referencia.
+- Aprobadas sin pedido.
+- Sobreventa: stock negativo o más unidades vendidas que el stock inicial.
+- Pedidos cuyo descuento de stock falló: unidades en pedidos distintas de las
+  descontadas en el inventario.
+- Reservas que quedaron abiertas tras aprobar o rechazar todos los pagos.
+Termina con código 1 si encuentra alguno.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glamoure.settings')
+django.setup()
+
+from django.db import OperationalError, connection, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import Count, Sum
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import reverse
+
+from carrito.models import Inventario, Pedido, PedidoLinea, Producto, ProductoVariante, UsuarioPersonalizado
+from pagos.bandeja import procesar_lote
+from pagos.models import EventoWebhook, Transaccion
+from pagos.reconciliacion import LimitadorTasa
+from pagos.reservas import StockInsuficiente, reservar_stock
+from pagos.utils import WompiUtils
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(int(len(valores) * p), len(valores) - 1)] if valores else 0
+
+
+def preparar_escenario(opciones):
+    """
+    Productos con una variante de ``stock`` unidades y ``compras`` checkouts de
+    una unidad. Retorna (stock inicial por variante, transacciones PENDING con
+    su reserva, checkouts rechazados por falta de stock).
+    """
+    usuario = UsuarioPersonalizado.objects.create_user(username='carga', password='carga1234', telefono='3000000000')
+    variantes = []
+    for i in range(opciones.productos):
+        producto = Producto.objects.create(nombre=f'Producto carga {i}', precio=100, stock=opciones.stock)
+        variantes.append(ProductoVariante.objects.create(producto=producto, talla='M', color='Negro', stock=opciones.stock))
+
+    # Como procesar_pago_carrito, sin liberar_reservas_reemplazadas: aquí
+    # todas las compras son del mismo usuario y deben convivir
+    transacciones, sin_stock = [], 0
+    for i in range(opciones.compras):
+        variante = random.choice(variantes)
+        try:
+            with transaction.atomic():
+                transaccion = Transaccion.objects.create(
+                    usuario=usuario, referencia=f'REF_CARGA_{i}', monto=100,
+                    detalle_pedido={'productos': [{
+                        'producto_id': variante.producto_id, 'variante_id': variante.id, 'nombre': 'Producto carga',
+                        'precio': 100.0, 'cantidad': 1, 'talla': 'M', 'color': 'Negro',
+                    }]},
+                )
+                reservar_stock(transaccion, [(variante.id, 1)])
+        except StockInsuficiente:
+            sin_stock += 1
+            continue
+        transacciones.append(transaccion)
+    return {v.id: v.stock for v in variantes}, transacciones, sin_stock
+
+
+def evento_firmado(referencia, estado, timestamp):
+    evento = {
+        'event': 'transaction.updated',
+        'data': {'transaction': {
+            'id': f'WOMPI-{referencia}', 'reference': referencia, 'status': estado,
+            'amount_in_cents': 10000, 'payment_method_type': 'CARD',
+        }},
+        'signature': {'properties': ['transaction.id', 'transaction.status', 'transaction.amount_in_cents']},
+        'timestamp': timestamp,
+    }
+    evento['signature']['checksum'] = WompiUtils.checksum_evento(evento)
+    return json.dumps(evento), evento['signature']['checksum']
+
+
+def generar_eventos(transacciones, opciones):
+    """
+    Un evento por transacción más reintentos (mismo checksum) y reenvíos (otra
+    firma), en orden aleatorio. Retorna (eventos, referencias aprobadas)
+    """
+    eventos, aprobadas = [], set()
+    timestamp = int(time.time())
+    for transaccion in transacciones:
+        estado = 'DECLINED' if random.random() < opciones.rechazos else 'APPROVED'
+        if estado == 'APPROVED':
+            aprobadas.add(transaccion.referencia)
+        evento = evento_firmado(transaccion.referencia, estado, timestamp)
+        eventos.append(evento)
+        if random.random() < opciones.duplicados:
+            eventos.append(evento)
+        if random.random() < opciones.reenvios:
+            eventos.append(evento_firmado(transaccion.referencia, estado, timestamp + 1))
+    random.shuffle(eventos)
+    return eventos, aprobadas
+
+
+def reproducir(eventos, opciones):
+    """Envía los eventos desde ``hilos`` clientes; retorna (latencias, consultas, códigos, segundos)"""
+    local = threading.local()
+    limitador = LimitadorTasa(opciones.tasa)
+    url = reverse('pagos:webhook')
+
+    def enviar(evento):
+        cuerpo, checksum = evento
+        if not hasattr(local, 'cliente'):
+            local.cliente = Client()
+        limitador.esperar()
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            respuesta = local.cliente.post(url, cuerpo, content_type='application/json', HTTP_X_EVENT_CHECKSUM=checksum)
+            segundos = time.perf_counter() - inicio
+        connection.close()
+        return segundos, len(consultas), respuesta.status_code
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=opciones.hilos) as pool:
+        resultados = list(pool.map(enviar, eventos))
+    duracion = time.perf_counter() - inicio
+
+    codigos = {}
+    for _, _, codigo in resultados:
+        codigos[codigo] = codigos.get(codigo, 0) + 1
+    return [r[0] for r in resultados], [r[1] for r in resultados], codigos, duracion
+
+
+def trabajar(detener, totales, lock):
+    """Un worker de la bandeja: procesa lotes hasta que termina el envío y no queda nada"""
+    try:
+        while True:
+            try:
+                with CaptureQueriesContext(connection) as consultas:
+                    procesados, fallidos = procesar_lote(20)
+            except OperationalError:
+                # SQLite: otro hilo escribió entre la lectura y la escritura del lote
+                with lock:
+                    totales['bloqueos'] += 1
+                time.sleep(0.05)
+                continue
+            with lock:
+                totales['procesados'] += procesados
+                totales['fallidos'] += fallidos
+                totales['consultas'] += len(consultas)
+            if not procesados + fallidos:
+                if detener.is_set():
+                    return
+                time.sleep(0.05)
+    finally:
+        connection.close()
+
+
+def verificar(stock_inicial, aprobadas):
+    """Retorna la lista de problemas encontrados (vacía si todo está bien)"""
+    problemas = []
+    sin_cumplir = Transaccion.objects.filter(referencia__in=aprobadas).exclude(cumplimiento=Transaccion.CUMPLIDA).count()
+    if sin_cumplir:
+        problemas.append(f"{sin_cumplir} transacción(es) aprobada(s) sin cumplir")
+
+    duplicados = Pedido.objects.values('referencia').annotate(n=Count('id')).filter(n__gt=1)
+    for fila in duplicados:
+        problemas.append(f"Cumplimiento duplicado: {fila['referencia']} tiene {fila['n']} pedidos")
+
+    sin_pedido = Transaccion.objects.filter(cumplimiento=Transaccion.CUMPLIDA).exclude(
+        referencia__in=Pedido.objects.values('referencia')
+    ).count()
+    if sin_pedido:
+        problemas.append(f"{sin_pedido} transacción(es) cumplida(s) sin pedido")
+
+    vendidas = dict(
+        Inventario.objects.filter(tipo_movimiento='salida').values('variante_id')
+        .annotate(total=Sum('cantidad')).values_list('variante_id', 'total')
+    )
+    pedidas = dict(
+        PedidoLinea.objects.values('variante_id').annotate(total=Sum('cantidad')).values_list('variante_id', 'total')
+    )
+    for variante in ProductoVariante.objects.filter(id__in=stock_inicial):
+        unidades = vendidas.get(variante.id, 0)
+        if variante.stock < 0 or unidades > stock_inicial[variante.id] or variante.stock != stock_inicial[variante.id] - unidades:
+            problemas.append(
+                f"Sobreventa en variante {variante.id}: stock inicial {stock_inicial[variante.id]}, "
+                f"vendidas {unidades}, stock final {variante.stock}"
+            )
+        # Un pedido sin su descuento de stock también es sobreventa, aunque el stock no quede negativo
+        if pedidas.get(variante.id, 0) != unidades:
+            problemas.append(
+                f"Variante {variante.id}: {pedidas.get(variante.id, 0)} unidad(es) en pedidos "
+                f"pero {unidades} descontada(s) del stock"
+            )
+        if variante.stock_reservado:
+            problemas.append(f"Variante {variante.id}: {variante.stock_reservado} unidad(es) siguen reservadas")
+    return problemas
+
+
+def benchmark(opciones):
+    random.seed(opciones.semilla)
+    stock_inicial, transacciones, sin_stock = preparar_escenario(opciones)
+    eventos, aprobadas = generar_eventos(transacciones, opciones)
+    print(
+        f"📦 {opciones.productos} productos × {opciones.stock} unidades, {opciones.compras} compras "
+        f"({sin_stock} rechazada(s) en el checkout por falta de stock), {len(eventos)} eventos"
+    )
+
+    detener, lock = threading.Event(), threading.Lock()
+    totales = {'procesados': 0, 'fallidos': 0, 'consultas': 0, 'bloqueos': 0}
+    workers = [threading.Thread(target=trabajar, args=(detener, totales, lock)) for _ in range(opciones.workers)]
+    # Los mensajes de cada pedido ensucian el reporte; --verboso los muestra
+    silencio = contextlib.nullcontext() if opciones.verboso else contextlib.redirect_stdout(io.StringIO())
+    inicio = time.perf_counter()
+    with silencio:
+        for worker in workers:
+            worker.start()
+        latencias, consultas, codigos, duracion = reproducir(eventos, opciones)
+        detener.set()
+        for worker in workers:
+            worker.join()
+    duracion_total = time.perf_counter() - inicio
+
+    print(
+        f"\n📨 Webhook: {len(eventos)} eventos en {duracion:.2f}s ({len(eventos) / duracion:.0f} ev/s) · "
+        f"códigos {dict(sorted(codigos.items()))}"
+    )
+    print(
+        f"   latencia p50 {percentil(latencias, 0.5) * 1000:.1f} ms · p95 {percentil(latencias, 0.95) * 1000:.1f} ms · "
+        f"p99 {percentil(latencias, 0.99) * 1000:.1f} ms"
+    )
+    print(f"   consultas por evento: promedio {sum(consultas) / len(consultas):.1f}, máximo {max(consultas)}")
+
+    en_bandeja = EventoWebhook.objects.count()
+    print(
+        f"⚙️  Worker: {totales['procesados']} procesado(s), {totales['fallidos']} fallo(s), "
+        f"{en_bandeja} evento(s) únicos en la bandeja, bandeja vacía a los {duracion_total:.2f}s"
+    )
+    if totales['bloqueos']:
+        print(f"   {totales['bloqueos']} lote(s) reintentado(s) por bloqueo de SQLite")
+    if totales['procesados']:
+        print(f"   consultas por evento procesado: {totales['consultas'] / totales['procesados']:.1f}")
+
+    vendidas = Inventario.objects.filter(tipo_movimiento='salida').aggregate(total=Sum('cantidad'))['total'] or 0
+    pedidas = PedidoLinea.objects.aggregate(total=Sum('cantidad'))['total'] or 0
+    print(
+        f"🧾 {Pedido.objects.count()} pedido(s) con {pedidas} unidad(es), "
+        f"{vendidas} de {sum(stock_inicial.values())} unidades descontadas del stock, "
+        f"{Transaccion.objects.filter(estado='DECLINED').count()} rechazada(s)"
+    )
+
+    problemas = verificar(stock_inicial, aprobadas)
+    for problema in problemas:
+        print(f"❌ {problema}")
+    return problemas
+
+
+def activar_wal(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--compras', type=int, default=300, help='Checkouts de una unidad (default: 300)')
+    parser.add_argument('--productos', type=int, default=10, help='Productos de una variante (default: 10)')
+    parser.add_argument('--stock', type=int, default=20, help='Stock inicial de cada variante (default: 20)')
+    parser.add_argument('--tasa', type=float, default=0, help='Eventos por segundo, 0 = sin límite (default: 0)')
+    parser.add_argument('--hilos', type=int, default=8, help='Envíos simultáneos al webhook (default: 8)')
+    parser.add_argument('--workers', type=int, default=2, help='Workers de la bandeja en paralelo (default: 2)')
+    parser.add_argument('--duplicados', type=float, default=0.2, help='Fracción de eventos que Wompi reintenta (default: 0.2)')
+    parser.add_argument('--reenvios', type=float, default=0.1, help='Fracción reenviada con otra firma (default: 0.1)')
+    parser.add_argument('--rechazos', type=float, default=0.1, help='Fracción de pagos rechazados (default: 0.1)')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--verboso', action='store_true', help='Muestra los mensajes del cumplimiento de cada pedido')
+    opciones = parser.parse_args()
+
+    print("=" * 60)
+    print("🚀 PRUEBA DE CARGA DEL WEBHOOK DE WOMPI")
+    print("=" * 60)
+
+    setup_test_environment()
+    nombre_original = connection.settings_dict['NAME']
+    if connection.vendor == 'sqlite':
+        # Un archivo (no :memory:) para que los hilos compartan la base; WAL y
+        # timeout para que esperen el bloqueo de escritura en vez de fallar
+        connection.settings_dict['TEST']['NAME'] = 'benchmark_webhooks.sqlite3'
+        connection.settings_dict['OPTIONS']['timeout'] = 30
+        connection_created.connect(activar_wal)
+    print(f"🗄️  Base de datos: {connection.vendor}")
+
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        problemas = benchmark(opciones)
+    finally:
+        connection.close()
+        connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+    if problemas:
+        sys.exit(1)
+    print("\n✅ Sin cumplimientos duplicados, sobreventa ni reservas abiertas")
+
+
+if __name__ == "__main__":
+    main()
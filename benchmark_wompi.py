@@ -0,0 +1,70 @@
+"""
+Benchmark de la consulta de transacciones a Wompi contra el stub local
+Ejecutar: python benchmark_wompi.py [consultas] [latencia_ms]
+Ejemplo:  python benchmark_wompi.py 500 20
+
+Nunca llama a la API real: levanta pagos/stub_wompi.py en este proceso y compara
+la consulta anterior (requests.get suelto, conexión nueva cada vez) con
+ClienteWompi sin caché (pool keep-alive) y con caché de estados finales.
+"""
+import os
+import sys
+import time
+
+import django
+import requests
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glamoure.settings')
+django.setup()
+
+from django.core.cache import cache
+from pagos.cliente_wompi import ClienteWompi
+from pagos.stub_wompi import ServidorWompiStub
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(int(len(valores) * p), len(valores) - 1)]
+
+
+def medir(nombre, consultar, consultas, stub):
+    cache.clear()
+    peticiones, conexiones = stub.peticiones, stub.conexiones
+    tiempos = []
+    for i in range(consultas):
+        inicio = time.perf_counter()
+        consultar(f'tx-{i % 10}')
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    print(
+        f"{nombre:<28} p50 {percentil(tiempos, 0.5):7.2f} ms   p95 {percentil(tiempos, 0.95):7.2f} ms   "
+        f"{stub.peticiones - peticiones:>5} peticiones   {stub.conexiones - conexiones:>5} conexiones"
+    )
+
+
+def main():
+    consultas = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latencia = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+
+    with ServidorWompiStub(latencia=latencia) as stub:
+        for i in range(10):
+            stub.agregar_transaccion(f'tx-{i}', f'REF_{i}', 'APPROVED')
+
+        print(f"📊 {consultas} consultas sobre 10 transacciones, latencia simulada {latencia * 1000:.0f} ms\n")
+
+        def sin_sesion(transaction_id):
+            respuesta = requests.get(f'{stub.base_url}/transactions/{transaction_id}')
+            respuesta.raise_for_status()
+            return respuesta.json()
+
+        medir('requests.get (anterior)', sin_sesion, consultas, stub)
+
+        # Timeout 0: la caché de Django no guarda nada
+        cliente = ClienteWompi(stub.base_url, 'pub_test', cache_segundos=0)
+        medir('ClienteWompi sin caché', cliente.consultar_transaccion, consultas, stub)
+
+        cliente = ClienteWompi(stub.base_url, 'pub_test')
+        medir('ClienteWompi con caché', cliente.consultar_transaccion, consultas, stub)
+
+
+if __name__ == '__main__':
+    main()
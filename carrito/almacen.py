@@ -0,0 +1,378 @@
+"""
+Almacenamiento del carrito con dos backends intercambiables.
+
+- ``CarritoCookie``: visitantes anónimos. Las líneas viajan en una cookie
+  firmada (no se puede manipular), así que agregar al carrito no escribe nada
+  en la base de datos; solo se lee el producto o la variante.
+- ``CarritoBD``: usuarios autenticados, sobre las tablas Carrito/ItemCarrito.
+
+Las vistas usan ``obtener_carrito(request)`` y no saben cuál les tocó. La cookie
+se escribe en la respuesta desde ``carrito.middleware.CarritoAnonimoMiddleware``
+y, al iniciar sesión, ``fusionar_carrito_anonimo`` pasa sus líneas a la base de
+datos en un solo bulk_update + bulk_create (ver carrito/signals.py).
+
+Ambos exponen ``resumen()`` ({lineas, unidades, total}). El de BD sale de una
+sola consulta agregada y se cachea por usuario hasta que cambia un item o un
+precio.
+"""
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from core.generaciones import cache_por_generacion, incrementar_generacion
+from .lote import OperacionInvalida, simular, validar_stock, variantes_del_lote
+from .models import Carrito, ItemCarrito, Producto, ProductoVariante
+
+COOKIE_CARRITO = 'carrito'
+SAL_COOKIE = 'carrito.anonimo'
+DURACION_COOKIE = settings.SESSION_COOKIE_AGE
+# Una cookie no pasa de ~4 KB; cada línea ocupa unos 40 bytes
+MAX_LINEAS_COOKIE = 50
+
+CAMPOS_PRODUCTO = ('id', 'nombre', 'precio', 'imagen', 'imagen_url')
+
+
+def ambito_carrito(usuario_id):
+    """Generación de la que depende el resumen cacheado del carrito de un usuario"""
+    return f'carrito:{usuario_id}'
+
+
+def invalidar_resumen(usuario_id):
+    incrementar_generacion(ambito_carrito(usuario_id))
+
+
+def resumen_carrito_usuario(usuario_id):
+    """
+    {lineas, unidades, total} del carrito en BD. Depende también de Producto
+    porque el total usa el precio actual de cada producto.
+    """
+    return cache_por_generacion(
+        f'carrito_resumen:{usuario_id}', [Producto, ambito_carrito(usuario_id)],
+        lambda: ItemCarrito.objects.filter(carrito__usuario_id=usuario_id).resumen(),
+    )
+
+
+def resumen_de_items(items):
+    """{lineas, unidades, total} a partir de items ya cargados (sin consultas)"""
+    return {
+        'lineas': len(items),
+        'unidades': sum(item.cantidad for item in items),
+        'total': sum((item.subtotal() for item in items), Decimal('0')),
+    }
+
+
+class CarritoLlenoError(Exception):
+    """El carrito anónimo alcanzó el máximo de líneas que caben en la cookie"""
+
+
+class LineaCarrito:
+    """Línea del carrito anónimo con la misma interfaz que ItemCarrito"""
+
+    def __init__(self, id, producto, talla, color, cantidad):
+        self.id = id
+        self.producto = producto
+        self.producto_id = producto.id
+        self.talla = talla
+        self.color = color
+        self.cantidad = cantidad
+
+    def subtotal(self):
+        return self.producto.precio * self.cantidad
+
+
+def _normalizar(valor):
+    valor = (valor or '').strip()
+    return valor or None
+
+
+def _ids_variantes(claves):
+    """{(producto_id, talla, color): variante_id} de las claves dadas, en una consulta"""
+    filtro = Q()
+    for producto_id, talla, color in claves:
+        if talla and color:
+            filtro |= Q(producto_id=producto_id, talla=talla, color=color)
+    if not filtro:
+        return {}
+    return {
+        (producto_id, talla, color): id_
+        for id_, producto_id, talla, color in ProductoVariante.objects.filter(filtro).values_list(
+            'id', 'producto_id', 'talla', 'color'
+        )
+    }
+
+
+class CarritoCookie:
+    """Carrito anónimo guardado en una cookie firmada.
+
+    Formato de la cookie: ``{"n": <siguiente id>, "l": {"<id>": [producto_id, talla, color, cantidad]}}``.
+    Los ids de línea son estables para que las URLs de eliminar/cambiar cantidad
+    funcionen igual que con ItemCarrito.
+    """
+    autenticado = False
+
+    def __init__(self, request):
+        self.modificado = False
+        self.siguiente, self.lineas = 1, {}
+        valor = request.get_signed_cookie(COOKIE_CARRITO, default=None, salt=SAL_COOKIE, max_age=DURACION_COOKIE)
+        if valor:
+            try:
+                datos = json.loads(valor)
+                self.siguiente = int(datos['n'])
+                self.lineas = {int(i): linea for i, linea in datos['l'].items()}
+            except (ValueError, KeyError, TypeError, AttributeError):
+                self.siguiente, self.lineas = 1, {}
+
+    def valor_cookie(self):
+        return json.dumps({'n': self.siguiente, 'l': self.lineas}, separators=(',', ':'))
+
+    def _buscar(self, producto_id, talla, color):
+        for id_linea, (pid, t, c, _) in self.lineas.items():
+            if (pid, t, c) == (producto_id, talla, color):
+                return id_linea
+        return None
+
+    def cantidad_en_carrito(self, producto_id, talla=None, color=None):
+        id_linea = self._buscar(producto_id, _normalizar(talla), _normalizar(color))
+        return self.lineas[id_linea][3] if id_linea else 0
+
+    def agregar(self, producto, cantidad, talla=None, color=None, variante_id=None):
+        # La cookie no guarda la variante: se resuelve al fusionar con el carrito en BD
+        talla, color = _normalizar(talla), _normalizar(color)
+        id_linea = self._buscar(producto.id, talla, color)
+        if id_linea:
+            self.lineas[id_linea][3] += cantidad
+        else:
+            if len(self.lineas) >= MAX_LINEAS_COOKIE:
+                raise CarritoLlenoError('Tu carrito está lleno. Inicia sesión para agregar más productos.')
+            id_linea = self.siguiente
+            self.siguiente += 1
+            self.lineas[id_linea] = [producto.id, talla, color, cantidad]
+        self.modificado = True
+        return LineaCarrito(id_linea, producto, talla, color, self.lineas[id_linea][3])
+
+    def obtener(self, item_id):
+        """Línea ``item_id`` con su producto, o None si no existe"""
+        linea = self.lineas.get(item_id)
+        if linea is None:
+            return None
+        producto = Producto.objects.only(*CAMPOS_PRODUCTO).filter(pk=linea[0]).first()
+        return LineaCarrito(item_id, producto, *linea[1:]) if producto else None
+
+    def guardar_cantidad(self, item):
+        self.lineas[item.id][3] = item.cantidad
+        self.modificado = True
+
+    def eliminar(self, item_id):
+        if self.lineas.pop(item_id, None) is None:
+            return False
+        self.modificado = True
+        return True
+
+    def items(self):
+        """Líneas con sus productos (una consulta); descarta productos que ya no existen"""
+        productos = Producto.objects.only(*CAMPOS_PRODUCTO).in_bulk({linea[0] for linea in self.lineas.values()})
+        return [
+            LineaCarrito(id_linea, productos[pid], talla, color, cantidad)
+            for id_linea, (pid, talla, color, cantidad) in sorted(self.lineas.items())
+            if pid in productos
+        ]
+
+    def resumen(self):
+        return resumen_de_items(self.items())
+
+    def total(self):
+        return self.resumen()['total']
+
+    def cantidad_lineas(self):
+        return len(self.lineas)
+
+    def cantidad_unidades(self):
+        """Unidades en el carrito sin consultar la base de datos"""
+        return sum(linea[3] for linea in self.lineas.values())
+
+    def vaciar(self):
+        self.lineas = {}
+        self.modificado = True
+
+    def aplicar_lote(self, operaciones):
+        """Aplica un lote normalizado (ver carrito/lote.py) sin tocar la base de datos salvo lecturas"""
+        finales = simular(self.lineas, operaciones, variantes_del_lote(operaciones))
+        validar_stock(self.lineas, finales)
+        if len(finales) > MAX_LINEAS_COOKIE:
+            raise OperacionInvalida('Tu carrito está lleno. Inicia sesión para agregar más productos.')
+
+        lineas = {}
+        for id_linea, linea in finales.items():
+            if isinstance(id_linea, tuple):
+                id_linea = self.siguiente
+                self.siguiente += 1
+            lineas[id_linea] = linea
+        self.lineas = lineas
+        self.modificado = True
+
+
+class CarritoBD:
+    """Carrito de un usuario autenticado sobre Carrito/ItemCarrito"""
+    autenticado = True
+
+    def __init__(self, usuario):
+        self.usuario = usuario
+        self._carrito = None
+
+    @property
+    def carrito(self):
+        if self._carrito is None:
+            self._carrito, _ = Carrito.objects.get_or_create(usuario=self.usuario)
+        return self._carrito
+
+    def _items(self):
+        return ItemCarrito.objects.filter(carrito__usuario=self.usuario)
+
+    def cantidad_en_carrito(self, producto_id, talla=None, color=None):
+        item = self._items().filter(producto_id=producto_id, talla=talla, color=color).only('cantidad').first()
+        return item.cantidad if item else 0
+
+    def agregar(self, producto, cantidad, talla=None, color=None, variante_id=None):
+        item, creado = ItemCarrito.objects.get_or_create(
+            carrito=self.carrito, producto=producto, talla=_normalizar(talla), color=_normalizar(color),
+            defaults={'cantidad': cantidad, 'variante_id': variante_id},
+        )
+        if not creado:
+            item.cantidad += cantidad
+            campos = ['cantidad']
+            # Líneas anteriores a la FK o que no encontró el backfill
+            if variante_id and item.variante_id != variante_id:
+                item.variante_id = variante_id
+                campos.append('variante')
+            item.save(update_fields=campos)
+        return item
+
+    def obtener(self, item_id):
+        return self._items().select_related('producto', 'carrito').filter(pk=item_id).first()
+
+    def guardar_cantidad(self, item):
+        item.save(update_fields=['cantidad'])
+
+    def eliminar(self, item_id):
+        return self._items().filter(pk=item_id).delete()[0] > 0
+
+    def items(self):
+        """Items con el subtotal de cada línea calculado en SQL"""
+        return list(self._items().select_related('producto').only(
+            'id', 'cantidad', 'talla', 'color', 'producto_id', *(f'producto__{c}' for c in CAMPOS_PRODUCTO)
+        ).con_subtotal().order_by('id'))
+
+    def resumen(self):
+        return resumen_carrito_usuario(self.usuario.pk)
+
+    def total(self):
+        return self.resumen()['total']
+
+    def cantidad_lineas(self):
+        return self.resumen()['lineas']
+
+    def cantidad_unidades(self):
+        return self.resumen()['unidades']
+
+    def vaciar(self):
+        self._items().delete()
+
+    def aplicar_lote(self, operaciones):
+        """
+        Aplica un lote normalizado en una transacción: una lectura con bloqueo
+        acotada al carrito del usuario, un DELETE, un UPDATE con F() y un
+        bulk_create como máximo.
+        """
+        variantes = variantes_del_lote(operaciones)
+        items_ids = {id_ for op, id_, _ in operaciones if op != 'agregar'}
+        productos_ids = {v.producto_id for v in variantes.values()}
+
+        with transaction.atomic():
+            # Los items de otro usuario simplemente no aparecen: "no encontrado"
+            filas = self._items().filter(
+                Q(id__in=items_ids) | Q(producto_id__in=productos_ids)
+            ).select_for_update().values_list('id', 'producto_id', 'talla', 'color', 'cantidad')
+            iniciales = {fila[0]: list(fila[1:]) for fila in filas}
+            finales = simular(iniciales, operaciones, variantes)
+            validar_stock(iniciales, finales)
+
+            eliminados = [id_ for id_ in iniciales if id_ not in finales]
+            deltas = {
+                id_: finales[id_][3] - linea[3]
+                for id_, linea in iniciales.items() if id_ in finales and finales[id_][3] != linea[3]
+            }
+            if eliminados:
+                ItemCarrito.objects.filter(id__in=eliminados).delete()
+            if deltas:
+                # Relativo a la fila (F) para no pisar cambios aunque el bloqueo no exista (SQLite)
+                ItemCarrito.objects.filter(id__in=deltas).update(cantidad=F('cantidad') + Case(
+                    *(When(id=id_, then=Value(delta)) for id_, delta in deltas.items()),
+                    output_field=IntegerField(),
+                ))
+            ids_variantes = {(v.producto_id, v.talla, v.color): v.id for v in variantes.values()}
+            nuevas = [
+                ItemCarrito(
+                    carrito=self.carrito, producto_id=producto_id, talla=talla, color=color, cantidad=cantidad,
+                    variante_id=ids_variantes.get((producto_id, talla, color)),
+                )
+                for id_, (producto_id, talla, color, cantidad) in finales.items() if isinstance(id_, tuple)
+            ]
+            ItemCarrito.objects.bulk_create(nuevas)
+            # update() y bulk_create no envían señales
+            invalidar_resumen(self.usuario.pk)
+
+
+def obtener_carrito(request):
+    """Backend del carrito para esta petición (memorizado en el request)"""
+    carrito = getattr(request, '_carrito', None)
+    if carrito is None:
+        carrito = CarritoBD(request.user) if request.user.is_authenticated else CarritoCookie(request)
+        request._carrito = carrito
+    return carrito
+
+
+def fusionar_carrito_anonimo(usuario, carrito_cookie):
+    """
+    Suma las líneas del carrito anónimo al carrito en BD del usuario.
+
+    ItemCarrito no tiene restricción única (talla y color admiten NULL), así que
+    el upsert se hace a mano: una lectura con bloqueo de las líneas existentes,
+    un bulk_update de las que coinciden y un bulk_create de las nuevas.
+    Retorna el número de líneas fusionadas.
+    """
+    lineas = list(carrito_cookie.lineas.values())
+    if not lineas:
+        return 0
+
+    productos_ids = set(Producto.objects.filter(id__in={l[0] for l in lineas}).values_list('id', flat=True))
+    ids_variantes = _ids_variantes({tuple(l[:3]) for l in lineas if l[0] in productos_ids})
+    with transaction.atomic():
+        carrito, _ = Carrito.objects.get_or_create(usuario=usuario)
+        existentes = {
+            (item.producto_id, item.talla, item.color): item
+            for item in carrito.items.select_for_update().filter(producto_id__in=productos_ids)
+        }
+        actualizados, nuevos = [], {}
+        for producto_id, talla, color, cantidad in lineas:
+            if producto_id not in productos_ids:
+                continue
+            clave = (producto_id, talla, color)
+            if clave in existentes:
+                existentes[clave].cantidad += cantidad
+                existentes[clave].variante_id = existentes[clave].variante_id or ids_variantes.get(clave)
+                actualizados.append(existentes[clave])
+            elif clave in nuevos:
+                nuevos[clave].cantidad += cantidad
+            else:
+                nuevos[clave] = ItemCarrito(
+                    carrito=carrito, producto_id=producto_id, talla=talla, color=color, cantidad=cantidad,
+                    variante_id=ids_variantes.get(clave),
+                )
+        ItemCarrito.objects.bulk_update(actualizados, ['cantidad', 'variante'])
+        ItemCarrito.objects.bulk_create(nuevos.values())
+        # bulk_update/bulk_create no envían señales
+        invalidar_resumen(usuario.pk)
+    return len(actualizados) + len(nuevos)
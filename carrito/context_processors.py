@@ -0,0 +1,15 @@
+from django.utils.functional import SimpleLazyObject
+
+from .almacen import obtener_carrito
+
+
+def carrito(request):
+    """Expone ``cantidad_carrito`` (unidades) a todas las plantillas.
+
+    Es perezoso: para anónimos sale de la cookie y para usuarios del resumen
+    cacheado, así que una página que lo muestra cuesta como máximo una consulta
+    agregada cuando el carrito cambió.
+    """
+    return {
+        'cantidad_carrito': SimpleLazyObject(lambda: obtener_carrito(request).cantidad_unidades()),
+    }
@@ -0,0 +1,126 @@
+"""
+Mutaciones del carrito en lote (``/carrito/batch/``).
+
+Una petición trae una lista de operaciones::
+
+    [{"op": "cantidad", "item_id": 3, "cantidad": 2},
+     {"op": "incrementar", "item_id": 3, "delta": -1},
+     {"op": "eliminar", "item_id": 4},
+     {"op": "agregar", "variante_id": 9, "cantidad": 1}]
+
+Primero se simulan sobre las líneas actuales (bloqueadas con SELECT ... FOR
+UPDATE en el carrito de BD), luego se valida el stock de todas las variantes
+tocadas en una sola consulta y solo entonces se escribe. Si algo falla no se
+aplica ninguna operación.
+"""
+from django.db.models import Q
+
+from .models import ProductoVariante
+
+MAX_OPERACIONES_LOTE = 50
+OPERACIONES = ('cantidad', 'incrementar', 'eliminar', 'agregar')
+
+
+class OperacionInvalida(Exception):
+    """Una operación del lote no se puede aplicar; el lote completo se descarta"""
+
+
+def _entero(operacion, campo):
+    try:
+        return int(operacion[campo])
+    except (KeyError, TypeError, ValueError):
+        raise OperacionInvalida(f"La operación '{operacion.get('op')}' requiere '{campo}' numérico")
+
+
+def normalizar_operaciones(operaciones):
+    """Valida la forma del lote y retorna una lista de tuplas (op, id, valor)"""
+    if not isinstance(operaciones, list) or not operaciones:
+        raise OperacionInvalida('Se esperaba una lista de operaciones')
+    if len(operaciones) > MAX_OPERACIONES_LOTE:
+        raise OperacionInvalida(f'Máximo {MAX_OPERACIONES_LOTE} operaciones por lote')
+
+    normalizadas = []
+    for operacion in operaciones:
+        if not isinstance(operacion, dict) or operacion.get('op') not in OPERACIONES:
+            raise OperacionInvalida(f"Operación desconocida. Use una de: {', '.join(OPERACIONES)}")
+        op = operacion['op']
+        if op == 'agregar':
+            normalizadas.append((op, _entero(operacion, 'variante_id'), _entero(operacion, 'cantidad')))
+        elif op == 'eliminar':
+            normalizadas.append((op, _entero(operacion, 'item_id'), None))
+        else:
+            campo = 'delta' if op == 'incrementar' else 'cantidad'
+            normalizadas.append((op, _entero(operacion, 'item_id'), _entero(operacion, campo)))
+    return normalizadas
+
+
+def variantes_del_lote(operaciones):
+    """{id: variante} de las variantes que se agregan (una consulta)"""
+    ids = {id_ for op, id_, _ in operaciones if op == 'agregar'}
+    if not ids:
+        return {}
+    variantes = ProductoVariante.objects.only('id', 'producto_id', 'talla', 'color').in_bulk(ids)
+    faltantes = ids - set(variantes)
+    if faltantes:
+        raise OperacionInvalida(f'Variante {min(faltantes)} no encontrada')
+    return variantes
+
+
+def simular(lineas, operaciones, variantes):
+    """
+    Aplica las operaciones sobre ``lineas`` ({id: [producto_id, talla, color, cantidad]})
+    y retorna el estado final. Las líneas nuevas usan claves ('nueva', n).
+    """
+    finales = {id_: list(linea) for id_, linea in lineas.items()}
+    nuevas = 0
+    for op, id_, valor in operaciones:
+        if op == 'agregar':
+            if valor < 1:
+                raise OperacionInvalida('La cantidad a agregar debe ser al menos 1')
+            variante = variantes[id_]
+            clave = (variante.producto_id, variante.talla, variante.color)
+            existente = next((k for k, l in finales.items() if tuple(l[:3]) == clave), None)
+            if existente is None:
+                nuevas += 1
+                finales[('nueva', nuevas)] = [*clave, valor]
+            else:
+                finales[existente][3] += valor
+            continue
+
+        if id_ not in finales:
+            raise OperacionInvalida(f'Item {id_} no encontrado en tu carrito')
+        if op == 'eliminar' or (op == 'cantidad' and valor == 0):
+            del finales[id_]
+            continue
+
+        cantidad = valor if op == 'cantidad' else finales[id_][3] + valor
+        if cantidad < 1:
+            raise OperacionInvalida('Cantidad mínima es 1')
+        finales[id_][3] = cantidad
+    return finales
+
+
+def validar_stock(iniciales, finales):
+    """
+    Comprueba en una sola consulta el stock de las variantes cuyas líneas
+    aumentaron. Las líneas de productos sin variante no se validan (igual que
+    agregar_al_carrito).
+    """
+    aumentos = {}
+    for id_, (producto_id, talla, color, cantidad) in finales.items():
+        anterior = iniciales[id_][3] if id_ in iniciales else 0
+        if cantidad > anterior:
+            aumentos[(producto_id, talla, color)] = cantidad
+    if not aumentos:
+        return
+
+    filtro = Q()
+    for producto_id, talla, color in aumentos:
+        filtro |= Q(producto_id=producto_id, talla=talla, color=color)
+    for variante in ProductoVariante.objects.filter(filtro).only('producto_id', 'talla', 'color', 'stock', 'stock_reservado'):
+        cantidad = aumentos[(variante.producto_id, variante.talla, variante.color)]
+        if cantidad > variante.stock_disponible:
+            raise OperacionInvalida(
+                f"Stock insuficiente para {variante.color} talla {variante.talla}. "
+                f"Solo hay {variante.stock_disponible} unidades disponibles"
+            )
@@ -0,0 +1,31 @@
+from .almacen import COOKIE_CARRITO, DURACION_COOKIE, SAL_COOKIE, CarritoCookie
+
+
+class CarritoAnonimoMiddleware:
+    """
+    Persiste el carrito anónimo en su cookie firmada.
+
+    Escribe la cookie solo si la petición modificó el carrito y la borra cuando
+    el carrito se fusionó con el del usuario al iniciar sesión.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if getattr(request, '_carrito_fusionado', False):
+            response.delete_cookie(COOKIE_CARRITO, samesite='Lax')
+            return response
+
+        carrito = getattr(request, '_carrito', None)
+        if isinstance(carrito, CarritoCookie) and carrito.modificado:
+            if carrito.lineas:
+                response.set_signed_cookie(
+                    COOKIE_CARRITO, carrito.valor_cookie(), salt=SAL_COOKIE,
+                    max_age=DURACION_COOKIE, httponly=True, samesite='Lax',
+                )
+            else:
+                response.delete_cookie(COOKIE_CARRITO, samesite='Lax')
+        return response
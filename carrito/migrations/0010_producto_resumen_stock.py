@@ -0,0 +1,50 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:17
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def calcular_resumen_stock(apps, schema_editor):
+    Producto = apps.get_model('carrito', 'Producto')
+    ProductoVariante = apps.get_model('carrito', 'ProductoVariante')
+
+    variantes = ProductoVariante.objects.filter(
+        producto=OuterRef('pk')
+    ).order_by().values('producto')
+
+    Producto.objects.update(
+        tiene_stock=Exists(variantes.filter(stock__gt=0)),
+        stock_variantes=Coalesce(
+            Subquery(variantes.annotate(total=Sum('stock')).values('total')), Value(0)
+        ),
+        cantidad_variantes=Coalesce(
+            Subquery(variantes.annotate(total=Count('id')).values('total')), Value(0)
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0009_producto_activo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='cantidad_variantes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='stock_variantes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='tiene_stock',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(calcular_resumen_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0010_producto_resumen_stock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['categoria', '-id'], name='carrito_pro_categor_aa71d1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['categoria', '-precio', '-id'], name='carrito_pro_categor_7b8b57_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['en_oferta', '-id'], name='carrito_pro_en_ofer_2ebe1e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['-precio', '-id'], name='carrito_pro_precio_e9c045_idx'),
+        ),
+    ]
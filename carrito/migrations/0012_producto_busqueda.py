@@ -0,0 +1,82 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:22
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.db import migrations
+
+# Configuración de texto en español que además ignora tildes (camisón == camison)
+CREAR_BUSQUEDA = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_unaccent') THEN
+        CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = spanish);
+        ALTER TEXT SEARCH CONFIGURATION es_unaccent
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+    END IF;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION carrito_producto_busqueda_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.busqueda :=
+        setweight(to_tsvector('es_unaccent', coalesce(NEW.nombre, '')), 'A') ||
+        setweight(to_tsvector('es_unaccent', coalesce(NEW.categoria, '')), 'B') ||
+        setweight(to_tsvector('es_unaccent', coalesce(NEW.descripcion, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS carrito_producto_busqueda ON carrito_producto;
+CREATE TRIGGER carrito_producto_busqueda
+    BEFORE INSERT OR UPDATE OF nombre, categoria, descripcion ON carrito_producto
+    FOR EACH ROW EXECUTE FUNCTION carrito_producto_busqueda_trigger();
+
+-- Rellenar el vector de los productos existentes (dispara el trigger)
+UPDATE carrito_producto SET nombre = nombre;
+
+CREATE INDEX IF NOT EXISTS carrito_producto_busqueda_gin
+    ON carrito_producto USING gin (busqueda);
+
+-- Reemplaza los índices creados a mano por optimize_database.sql
+DROP INDEX IF EXISTS idx_producto_nombre_trgm;
+DROP INDEX IF EXISTS idx_producto_descripcion_trgm;
+CREATE INDEX IF NOT EXISTS carrito_producto_nombre_trgm
+    ON carrito_producto USING gin (nombre gin_trgm_ops);
+"""
+
+ELIMINAR_BUSQUEDA = """
+DROP INDEX IF EXISTS carrito_producto_nombre_trgm;
+DROP INDEX IF EXISTS carrito_producto_busqueda_gin;
+DROP TRIGGER IF EXISTS carrito_producto_busqueda ON carrito_producto;
+DROP FUNCTION IF EXISTS carrito_producto_busqueda_trigger();
+DROP TEXT SEARCH CONFIGURATION IF EXISTS es_unaccent;
+"""
+
+
+def crear_busqueda(apps, schema_editor):
+    # Solo PostgreSQL; en SQLite la búsqueda se resuelve en core.busqueda
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREAR_BUSQUEDA)
+
+
+def eliminar_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(ELIMINAR_BUSQUEDA)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0011_producto_indices_keyset'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        UnaccentExtension(),
+        migrations.AddField(
+            model_name='producto',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(crear_busqueda, eliminar_busqueda),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0013_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='imagenes_derivadas',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productovariante',
+            name='imagenes_derivadas',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0014_imagenes_derivadas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productovariante',
+            name='stock_reservado',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
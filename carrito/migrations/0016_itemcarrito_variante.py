@@ -0,0 +1,34 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def enlazar_variantes(apps, schema_editor):
+    ItemCarrito = apps.get_model('carrito', 'ItemCarrito')
+    ProductoVariante = apps.get_model('carrito', 'ProductoVariante')
+
+    # Un solo UPDATE: cada línea toma la variante con su mismo producto + talla + color.
+    # Las que no coinciden (productos sin variantes, textos viejos) quedan en NULL
+    ItemCarrito.objects.filter(variante__isnull=True).update(variante=Subquery(
+        ProductoVariante.objects.filter(
+            producto=OuterRef('producto'), talla=OuterRef('talla'), color=OuterRef('color')
+        ).values('id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0015_productovariante_stock_reservado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemcarrito',
+            name='variante',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='items_carrito', to='carrito.productovariante'),
+        ),
+        migrations.RunPython(enlazar_variantes, migrations.RunPython.noop),
+    ]
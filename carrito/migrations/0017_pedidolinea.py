@@ -0,0 +1,38 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0016_itemcarrito_variante'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='referencia',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=100),
+        ),
+        migrations.CreateModel(
+            name='PedidoLinea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('talla', models.CharField(blank=True, default='', max_length=20)),
+                ('color', models.CharField(blank=True, default='', max_length=50)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='carrito.pedido')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas_pedido', to='carrito.producto')),
+                ('variante', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lineas_pedido', to='carrito.productovariante')),
+            ],
+            options={
+                'verbose_name': 'Línea de pedido',
+                'verbose_name_plural': 'Líneas de pedido',
+                'indexes': [models.Index(fields=['producto', 'pedido'], name='carrito_ped_product_43e4a7_idx')],
+            },
+        ),
+    ]
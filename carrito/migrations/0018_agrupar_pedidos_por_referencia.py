@@ -0,0 +1,97 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:58
+
+import re
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations
+
+REFERENCIA = re.compile(r'Referencia: (\S+)')
+
+
+def agrupar_pedidos(apps, schema_editor):
+    """
+    Hasta ahora cada producto comprado era un Pedido. Las filas de una misma
+    compra (misma referencia de Wompi en las notas, mismo usuario y mismo
+    estado) pasan a ser líneas de un solo pedido: se conserva la primera como
+    cabecera y se borran las demás. Filas de una compra con estados distintos
+    (p. ej. una ya enviada y otra cancelada) quedan como cabeceras separadas
+    para no perder el estado. Los números de los pedidos borrados se anotan en
+    las notas de la cabecera, donde los encuentra la búsqueda de pedidos.
+    Los pedidos sin referencia quedan como cabecera de una línea.
+
+    No es reversible: 0019 elimina ``producto`` y ``cantidad`` de Pedido y las
+    filas borradas no se pueden reconstruir con sus fechas y datos originales.
+    """
+    Pedido = apps.get_model('carrito', 'Pedido')
+    PedidoLinea = apps.get_model('carrito', 'PedidoLinea')
+    Transaccion = apps.get_model('pagos', 'Transaccion')
+
+    grupos = defaultdict(list)
+    for pedido in Pedido.objects.select_related('producto').order_by('id').iterator():
+        encontrada = REFERENCIA.search(pedido.notas or '')
+        if encontrada:
+            grupos[(pedido.usuario_id, encontrada.group(1), pedido.estado, None)].append(pedido)
+        else:
+            grupos[(pedido.usuario_id, '', pedido.estado, pedido.id)].append(pedido)
+
+    # Talla, color y variante de cada producto según el detalle guardado en la transacción
+    referencias = {referencia for _, referencia, _, _ in grupos if referencia}
+    detalles = {}
+    for referencia, detalle in Transaccion.objects.filter(referencia__in=referencias).values_list(
+        'referencia', 'detalle_pedido'
+    ):
+        for prod in (detalle or {}).get('productos', []):
+            detalles.setdefault((referencia, prod.get('producto_id')), prod)
+
+    lineas, cabeceras, sobrantes = [], [], []
+    for (_, referencia, _, _), pedidos in grupos.items():
+        cabecera = pedidos[0]
+        total = Decimal('0')
+        for pedido in pedidos:
+            prod = detalles.get((referencia, pedido.producto_id), {})
+            cantidad = max(pedido.cantidad, 1)
+            lineas.append(PedidoLinea(
+                pedido_id=cabecera.id,
+                producto_id=pedido.producto_id,
+                variante_id=prod.get('variante_id'),
+                talla=prod.get('talla') or '',
+                color=prod.get('color') or '',
+                cantidad=cantidad,
+                precio_unitario=(pedido.total / cantidad) if pedido.total else pedido.producto.precio,
+                subtotal=pedido.total or pedido.producto.precio * cantidad,
+            ))
+            total += lineas[-1].subtotal
+        cabecera.total = total
+        cabecera.referencia = referencia
+        if len(pedidos) > 1:
+            anteriores = ', '.join(p.numero for p in pedidos[1:])
+            cabecera.notas = f'{cabecera.notas or ""}\nAgrupa los pedidos: {anteriores}'.strip()
+        cabeceras.append(cabecera)
+        sobrantes.extend(p.id for p in pedidos[1:])
+
+    # Variantes que ya no existen quedan en NULL
+    ProductoVariante = apps.get_model('carrito', 'ProductoVariante')
+    existentes = set(ProductoVariante.objects.filter(
+        id__in={l.variante_id for l in lineas if l.variante_id}
+    ).values_list('id', flat=True))
+    for linea in lineas:
+        if linea.variante_id not in existentes:
+            linea.variante_id = None
+
+    PedidoLinea.objects.bulk_create(lineas, batch_size=1000)
+    Pedido.objects.bulk_update(cabeceras, ['total', 'referencia', 'notas'], batch_size=1000)
+    Pedido.objects.filter(id__in=sobrantes).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0017_pedidolinea'),
+        ('pagos', '0006_transaccion_cumplimiento'),
+    ]
+
+    operations = [
+        # Sin reverse_code: deshacerla lanza IrreversibleError en vez de dejar los datos a medias
+        migrations.RunPython(agrupar_pedidos),
+    ]
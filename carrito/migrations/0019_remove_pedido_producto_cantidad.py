@@ -0,0 +1,21 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:58
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0018_agrupar_pedidos_por_referencia'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='pedido',
+            name='cantidad',
+        ),
+        migrations.RemoveField(
+            model_name='pedido',
+            name='producto',
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from decimal import Decimal
@@ -35,6 +36,25 @@ class Producto(models.Model):
         # Índice creado manualmente para evitar conflictos con ENUM
     )
 
+    # Resumen de disponibilidad de las variantes (desnormalizado).
+    # Solo se escribe con recalcular_resumen_stock() para que las páginas del
+    # catálogo lean la disponibilidad sin consultar ProductoVariante.
+    tiene_stock = models.BooleanField(default=False)  # Alguna variante con stock > 0
+    stock_variantes = models.IntegerField(default=0)  # Suma del stock de las variantes
+    cantidad_variantes = models.IntegerField(default=0)
+
+    CAMPOS_RESUMEN_STOCK = ('tiene_stock', 'stock_variantes', 'cantidad_variantes')
+
+    # Vector de búsqueda (nombre, categoría y descripción) en PostgreSQL.
+    # Lo mantiene un trigger de la base de datos (migración 0012); en SQLite queda vacío.
+    busqueda = SearchVectorField(null=True, editable=False)
+
+    # Última modificación del producto o de cualquiera de sus variantes
+    # (ETag/Last-Modified de las páginas y APIs, lastmod del sitemap)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Anchos en AVIF/WebP de la imagen, generados en segundo plano (core/utils/derivados.py)
+    imagenes_derivadas = models.JSONField(default=dict, blank=True, editable=False)
+
     class Meta:
         indexes = [
             models.Index(fields=['categoria', 'destacado']),  # Índice compuesto
@@ -42,6 +62,11 @@ class Producto(models.Model):
             models.Index(fields=['en_oferta']),  # Para filtrar ofertas rápidamente
             models.Index(fields=['nombre']),  # Para búsquedas por nombre
             models.Index(fields=['categoria', 'en_oferta']),  # Índice compuesto para ofertas por categoría
+            # Paginación por keyset: el orden del listado termina siempre en id
+            models.Index(fields=['categoria', '-id']),
+            models.Index(fields=['categoria', '-precio', '-id']),
+            models.Index(fields=['en_oferta', '-id']),
+            models.Index(fields=['-precio', '-id']),
         ]
         ordering = ['-id']  # Orden por defecto
 
@@ -78,6 +103,19 @@ class Producto(models.Model):
         except Exception as e:
             print("Error procesando imagen:", e)
 
+        # No sobrescribir el resumen de stock, el vector de búsqueda ni los
+        # derivados de imagen con valores posiblemente obsoletos de esta
+        # instancia: los mantienen recalcular_resumen_stock(), el trigger de
+        # búsqueda y core/utils/derivados.py
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            excluidos = set(self.CAMPOS_RESUMEN_STOCK) | {'busqueda', 'imagenes_derivadas'} | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in excluidos and f.name not in excluidos
+            ]
+        elif kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at'}
+
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -85,25 +123,51 @@ class Producto(models.Model):
     
     def tiene_stock_disponible(self):
         """Verifica si el producto tiene stock disponible en alguna variante"""
-        from carrito.models import ProductoVariante
-        
-        # Si tiene variantes, verificar stock de variantes
-        variantes = ProductoVariante.objects.filter(producto=self)
-        if variantes.exists():
-            return variantes.filter(stock__gt=0).exists()
+        # Si tiene variantes, usar el resumen de stock de variantes
+        if self.cantidad_variantes:
+            return self.tiene_stock
         
         # Si no tiene variantes, verificar stock del producto base
         return self.stock > 0
     
     def stock_total_variantes(self):
         """Retorna el stock total sumando todas las variantes"""
-        from carrito.models import ProductoVariante
-        from django.db.models import Sum
+        return self.stock_variantes
+    
+    @classmethod
+    def marcar_modificados(cls, producto_ids):
+        """Actualiza updated_at de los productos (p. ej. al cambiar una variante)"""
+        return cls.objects.filter(pk__in=producto_ids).update(updated_at=timezone.now())
+
+    @classmethod
+    def recalcular_resumen_stock(cls, producto_ids=None):
+        """
+        Recalcula tiene_stock, stock_variantes y cantidad_variantes en un único
+        UPDATE con subconsultas. Sin producto_ids recalcula todo el catálogo.
+        
+        Returns:
+            int: número de productos actualizados
+        """
+        from django.db.models import Count, Exists, OuterRef, Subquery, Sum, Value
+        from django.db.models.functions import Coalesce
+        
+        variantes = ProductoVariante.objects.filter(
+            producto=OuterRef('pk')
+        ).order_by().values('producto')
         
-        total = ProductoVariante.objects.filter(producto=self).aggregate(
-            total=Sum('stock')
-        )['total']
-        return total or 0
+        productos = cls.objects.all()
+        if producto_ids is not None:
+            productos = productos.filter(pk__in=producto_ids)
+        
+        return productos.update(
+            tiene_stock=Exists(variantes.filter(stock__gt=0)),
+            stock_variantes=Coalesce(
+                Subquery(variantes.annotate(total=Sum('stock')).values('total')), Value(0)
+            ),
+            cantidad_variantes=Coalesce(
+                Subquery(variantes.annotate(total=Count('id')).values('total')), Value(0)
+            ),
+        )
     
     def delete(self, *args, **kwargs):
         """Elimina la imagen del bucket de Supabase al eliminar el producto."""
@@ -153,11 +217,24 @@ class EstadoPedido(models.TextChoices):
     CANCELADO = 'cancelado', 'Cancelado'
 
 
+class PedidoQuerySet(models.QuerySet):
+    def con_lineas(self):
+        """Anota ``unidades`` y precarga las líneas con su producto (dos consultas en total)"""
+        return self.annotate(unidades=models.Sum('lineas__cantidad')).prefetch_related(models.Prefetch(
+            'lineas',
+            queryset=PedidoLinea.objects.select_related('producto').only(
+                'id', 'pedido_id', 'cantidad', 'talla', 'color', 'precio_unitario', 'subtotal',
+                'producto__id', 'producto__nombre', 'producto__imagen', 'producto__imagen_url',
+            ).order_by('id'),
+        ))
+
+
 class Pedido(models.Model):
+    """Cabecera del pedido; los productos van en PedidoLinea (``pedido.lineas``)"""
     usuario = models.ForeignKey(UsuarioPersonalizado, on_delete=models.CASCADE, related_name='pedidos')
     numero = models.CharField(max_length=50, unique=True, editable=False)
-    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
-    cantidad = models.IntegerField()
+    # Referencia de la transacción de Wompi que originó el pedido
+    referencia = models.CharField(max_length=100, blank=True, default='', db_index=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     estado = models.CharField(
         max_length=20,
@@ -180,6 +257,8 @@ class Pedido(models.Model):
     fecha = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
+    objects = PedidoQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=['usuario', '-fecha']),
@@ -190,6 +269,10 @@ class Pedido(models.Model):
         verbose_name = 'Pedido'
         verbose_name_plural = 'Pedidos'
 
+    @staticmethod
+    def generar_numero():
+        return f"PED-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
+
     def save(self, *args, **kwargs):
         # Asegurar que el estado tenga un valor
         if not self.estado:
@@ -197,11 +280,7 @@ class Pedido(models.Model):
         
         # Generar número de pedido único si no existe
         if not self.numero:
-            self.numero = f"PED-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
-        
-        # Calcular total si no está establecido o es cero
-        if not self.total or self.total == Decimal('0'):
-            self.total = self.producto.precio * self.cantidad
+            self.numero = self.generar_numero()
         
         super().save(*args, **kwargs)
 
@@ -218,11 +297,61 @@ class Pedido(models.Model):
         """Retorna el email del cliente"""
         return self.usuario.email
 
+
+class PedidoLinea(models.Model):
+    """Un producto de un pedido, con el precio cobrado al momento de la compra"""
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='lineas')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='lineas_pedido')
+    variante = models.ForeignKey(
+        'ProductoVariante', on_delete=models.SET_NULL, null=True, blank=True, related_name='lineas_pedido'
+    )
+    talla = models.CharField(max_length=20, blank=True, default='')
+    color = models.CharField(max_length=50, blank=True, default='')
+    cantidad = models.PositiveIntegerField()
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            # Ventas por producto (analítica) y "¿el producto tiene pedidos?" sin recorrer cabeceras
+            models.Index(fields=['producto', 'pedido']),
+        ]
+        verbose_name = 'Línea de pedido'
+        verbose_name_plural = 'Líneas de pedido'
+
+    def __str__(self):
+        return f"{self.pedido.numero} - {self.producto.nombre} x{self.cantidad}"
+
 class Carrito(models.Model):
     usuario = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
     def total(self):
-        return sum(item.subtotal() for item in self.items.all())
+        return self.items.resumen()['total']
+
+
+class ItemCarritoQuerySet(models.QuerySet):
+    def con_subtotal(self):
+        """Anota ``subtotal_linea`` (cantidad * precio) calculado en SQL"""
+        return self.annotate(subtotal_linea=models.ExpressionWrapper(
+            models.F('cantidad') * models.F('producto__precio'), output_field=models.DecimalField(max_digits=12, decimal_places=2)
+        ))
+
+    def resumen(self):
+        """Líneas, unidades y total del carrito en una sola consulta agregada"""
+        datos = self.aggregate(
+            lineas=models.Count('id'),
+            unidades=models.Sum('cantidad'),
+            total=models.Sum(
+                models.F('cantidad') * models.F('producto__precio'),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+        return {
+            'lineas': datos['lineas'],
+            'unidades': datos['unidades'] or 0,
+            'total': datos['total'] or Decimal('0'),
+        }
+
 
 class ItemCarrito(models.Model):
     carrito = models.ForeignKey(Carrito, on_delete=models.CASCADE, related_name='items')
@@ -230,18 +359,26 @@ class ItemCarrito(models.Model):
     # Guardamos la talla y color seleccionados por el usuario cuando agrega al carrito
     talla = models.CharField(max_length=20, blank=True, null=True)
     color = models.CharField(max_length=50, blank=True, null=True)
+    # Variante exacta elegida; talla y color se conservan como texto para mostrar la línea.
+    # NULL en productos sin variantes (o si la variante se elimina)
+    variante = models.ForeignKey(
+        'ProductoVariante', on_delete=models.SET_NULL, null=True, blank=True, related_name='items_carrito'
+    )
     cantidad = models.PositiveIntegerField(default=1)
 
+    objects = ItemCarritoQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=['carrito', 'producto']),  # Para búsquedas rápidas
         ]
 
     def subtotal(self):
-        precio = self.producto.precio
-        if isinstance(precio, Decimal):
-            precio = self.producto.precio 
-        return precio * self.cantidad
+        # Si viene de con_subtotal() no hace falta tocar el producto
+        subtotal = getattr(self, 'subtotal_linea', None)
+        if subtotal is not None:
+            return subtotal
+        return self.producto.precio * self.cantidad
 
 
 class TipoProducto(models.TextChoices):
@@ -265,11 +402,17 @@ class ProductoVariante(models.Model):
     talla = models.CharField(max_length=10)  # Ej: S, M, L, 32, 38
     color = models.CharField(max_length=50)  # Ej: Negro, Rojo, Azul
     stock = models.IntegerField(default=0)
+    # Unidades apartadas por checkouts pendientes de pago (pagos/reservas.py).
+    # Solo se modifica con UPDATE condicionales; disponible = stock - stock_reservado
+    stock_reservado = models.PositiveIntegerField(default=0, editable=False)
     # Imagen específica para esta variante (puede ser generada por IA)
     imagen = models.ImageField(upload_to='variantes/', blank=True, null=True)
     imagen_url = models.URLField(blank=True, null=True)
     # Indica si la imagen fue generada por IA
     imagen_generada_ia = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Anchos en AVIF/WebP de la imagen, generados en segundo plano (core/utils/derivados.py)
+    imagenes_derivadas = models.JSONField(default=dict, blank=True, editable=False)
     
     class Meta:
         # Una combinación producto+talla+color debe ser única
@@ -282,6 +425,11 @@ class ProductoVariante(models.Model):
     
     def __str__(self):
         return f"{self.producto.nombre} - {self.talla} - {self.color} (Stock: {self.stock})"
+
+    @property
+    def stock_disponible(self):
+        """Stock que se puede vender: el físico menos lo reservado por checkouts pendientes"""
+        return max(self.stock - self.stock_reservado, 0)
     
     def save(self, *args, **kwargs):
         """Similar al Producto, sube imagen a Supabase si existe"""
@@ -309,7 +457,33 @@ class ProductoVariante(models.Model):
         except Exception as e:
             print("Error subiendo imagen de variante a Supabase:", e)
 
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and self.pk and not self._state.adding and not kwargs.get('force_insert'):
+            # stock_reservado y los derivados se actualizan por fuera (UPDATE condicionales
+            # y un hilo en segundo plano): un save completo no debe pisarlos con valores viejos
+            excluidos = {'stock_reservado', 'imagenes_derivadas'} | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in excluidos and f.name not in excluidos
+            ]
+        elif update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'updated_at'}
+        recalcular_stock = update_fields is None or 'stock' in update_fields
+
+        # Guardar la variante, el resumen de stock y la fecha de modificación
+        # del producto en la misma transacción
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if recalcular_stock:
+                Producto.recalcular_resumen_stock([self.producto_id])
+            Producto.marcar_modificados([self.producto_id])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            Producto.recalcular_resumen_stock([self.producto_id])
+            Producto.marcar_modificados([self.producto_id])
+        return resultado
 
 
 class Inventario(models.Model):
@@ -0,0 +1,31 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .almacen import COOKIE_CARRITO, CarritoCookie, fusionar_carrito_anonimo, invalidar_resumen
+from .models import Carrito, ItemCarrito
+
+
+@receiver(user_logged_in)
+def fusionar_carrito_al_iniciar_sesion(sender, request, user, **kwargs):
+    """Pasa el carrito anónimo de la cookie al carrito en BD del usuario"""
+    if request is None or COOKIE_CARRITO not in request.COOKIES:
+        return
+    fusionadas = fusionar_carrito_anonimo(user, CarritoCookie(request))
+    if fusionadas:
+        print(f"🛒 Carrito anónimo fusionado para {user.username}: {fusionadas} línea(s)")
+    # El middleware borra la cookie; el resto de la petición ya usa el carrito en BD
+    request._carrito_fusionado = True
+    request.__dict__.pop('_carrito', None)
+
+
+@receiver(post_save, sender=ItemCarrito)
+@receiver(post_delete, sender=ItemCarrito)
+def invalidar_resumen_carrito(sender, instance, **kwargs):
+    """El resumen cacheado (unidades, total) queda obsoleto al cambiar un item"""
+    if ItemCarrito.carrito.is_cached(instance):
+        usuario_id = instance.carrito.usuario_id
+    else:
+        usuario_id = Carrito.objects.filter(pk=instance.carrito_id).values_list('usuario_id', flat=True).first()
+    if usuario_id is not None:
+        invalidar_resumen(usuario_id)
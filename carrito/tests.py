@@ -1,8 +1,9 @@
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 
-from .models import Producto
+from .models import Producto, ProductoVariante
 
 
 User = get_user_model()
@@ -10,6 +11,7 @@ User = get_user_model()
 
 class WishlistTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.user = User.objects.create_user(username='tester', password='pass1234')
         self.producto = Producto.objects.create(nombre='Prueba', precio=10.0)
@@ -51,6 +53,242 @@ class WishlistTests(TestCase):
         self.assertEqual(resp.status_code, 200)
         # template should contain product name
         self.assertContains(resp, 'Prueba')
+
+    def test_favoritos_ids_se_invalida_al_toggle(self):
+        from core.favoritos import obtener_favoritos_ids
+        self.client.login(username='tester', password='pass1234')
+        self.assertEqual(obtener_favoritos_ids(self.user), frozenset())
+
+        url = reverse('toggle_favorito', args=[self.producto.id])
+        self.client.post(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(obtener_favoritos_ids(user), frozenset({self.producto.id}))
+
+    def test_categoria_marca_favoritos_desde_el_conjunto(self):
+        self.user.favoritos.add(self.producto)
+        self.producto.categoria = Producto.CategoriaEnum.HOMBRE
+        self.producto.save()
+        self.client.login(username='tester', password='pass1234')
+        resp = self.client.get(reverse('hombres'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'data-favorito="true"')
+
+
+class ResumenStockTests(TestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Camisa', precio=50)
+
+    def test_resumen_se_actualiza_con_las_variantes(self):
+        variante = ProductoVariante.objects.create(producto=self.producto, talla='M', color='Negro', stock=3)
+        ProductoVariante.objects.create(producto=self.producto, talla='L', color='Negro', stock=0)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad_variantes, 2)
+        self.assertEqual(self.producto.stock_variantes, 3)
+        self.assertTrue(self.producto.tiene_stock)
+
+        variante.stock = 0
+        variante.save()
+        self.producto.refresh_from_db()
+        self.assertFalse(self.producto.tiene_stock)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.producto.tiene_stock_disponible())
+
+        variante.delete()
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad_variantes, 1)
+
+    def test_guardar_producto_no_pisa_el_resumen(self):
+        obsoleto = Producto.objects.get(pk=self.producto.pk)
+        ProductoVariante.objects.create(producto=self.producto, talla='M', color='Rojo', stock=5)
+        obsoleto.nombre = 'Camisa nueva'
+        obsoleto.save()
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.nombre, 'Camisa nueva')
+        self.assertEqual(self.producto.stock_variantes, 5)
+
+
+class CarritoAnonimoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='comprador', password='pass1234')
+        self.producto = Producto.objects.create(nombre='Camisa', precio=20)
+        self.m = ProductoVariante.objects.create(producto=self.producto, talla='M', color='Rojo', stock=5)
+        self.l = ProductoVariante.objects.create(producto=self.producto, talla='L', color='Azul', stock=5)
+
+    def agregar(self, variante, cantidad):
+        return self.client.post(reverse('agregar_al_carrito_variante'), {'variante_id': variante.id, 'cantidad': cantidad})
+
+    def test_anonimo_agrega_sin_escribir_en_bd(self):
+        from .almacen import COOKIE_CARRITO
+        from .models import ItemCarrito
+
+        # Solo la lectura de la variante con su producto
+        with self.assertNumQueries(1):
+            respuesta = self.agregar(self.m, 2)
+        self.assertTrue(respuesta.json()['success'])
+        self.assertIn(COOKIE_CARRITO, respuesta.cookies)
+        self.assertFalse(ItemCarrito.objects.exists())
+
+        self.agregar(self.m, 1)
+        datos = self.client.get(reverse('carrito_modal')).json()
+        self.assertEqual([(i['talla'], i['cantidad']) for i in datos['items']], [('M', 3)])
+        self.assertEqual(datos['total'], 60.0)
+
+        # El stock se valida contra lo que ya está en el carrito
+        self.assertEqual(self.agregar(self.m, 3).status_code, 400)
+
+    def test_login_fusiona_el_carrito_anonimo(self):
+        from .almacen import COOKIE_CARRITO
+        from .models import Carrito, ItemCarrito
+
+        carrito = Carrito.objects.create(usuario=self.user)
+        ItemCarrito.objects.create(carrito=carrito, producto=self.producto, talla='M', color='Rojo', cantidad=1)
+        self.agregar(self.m, 2)
+        self.agregar(self.l, 1)
+
+        respuesta = self.client.post(reverse('login'), {'usuario': 'comprador', 'password': 'pass1234'})
+        self.assertEqual(respuesta.cookies[COOKIE_CARRITO].value, '')
+        items = {(i.talla, i.cantidad, i.variante_id) for i in ItemCarrito.objects.filter(carrito=carrito)}
+        self.assertEqual(items, {('M', 3, self.m.id), ('L', 1, self.l.id)})
+        self.assertEqual(len(self.client.get(reverse('carrito_modal')).json()['items']), 2)
+
+
+class VarianteItemCarritoTests(TestCase):
+    def setUp(self):
+        from .models import Carrito
+
+        self.user = User.objects.create_user(username='comprador', password='pass1234')
+        self.carrito = Carrito.objects.create(usuario=self.user)
+        self.producto = Producto.objects.create(nombre='Falda', precio=40, stock=10)
+        self.variante = ProductoVariante.objects.create(producto=self.producto, talla='S', color='Verde', stock=4)
+
+    def test_backfill_enlaza_lineas_existentes(self):
+        import importlib
+        from django.apps import apps
+        from .models import ItemCarrito
+
+        enlazada = ItemCarrito.objects.create(carrito=self.carrito, producto=self.producto, talla='S', color='Verde')
+        huerfana = ItemCarrito.objects.create(carrito=self.carrito, producto=self.producto, talla='XL', color='Verde')
+        migracion = importlib.import_module('carrito.migrations.0016_itemcarrito_variante')
+        migracion.enlazar_variantes(apps, None)
+
+        enlazada.refresh_from_db()
+        huerfana.refresh_from_db()
+        self.assertEqual(enlazada.variante_id, self.variante.id)
+        self.assertIsNone(huerfana.variante_id)
+
+    def test_el_stock_se_descuenta_por_la_fk_aunque_cambie_el_texto(self):
+        from pagos.utils import actualizar_stock_productos
+
+        self.client.force_login(self.user)
+        self.client.post(reverse('agregar_al_carrito_variante'), {'variante_id': self.variante.id, 'cantidad': 2})
+        item = self.carrito.items.get()
+        self.assertEqual(item.variante_id, self.variante.id)
+
+        # El administrador renombra el color después de que el cliente agregó la línea
+        self.variante.color = 'Verde oliva'
+        self.variante.save()
+        exitoso, _ = actualizar_stock_productos({'productos': [{
+            'producto_id': item.producto_id, 'variante_id': item.variante_id,
+            'cantidad': item.cantidad, 'talla': item.talla, 'color': item.color,
+        }]})
+        self.variante.refresh_from_db()
+        self.assertTrue(exitoso)
+        self.assertEqual(self.variante.stock, 2)
+
+
+class ResumenCarritoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        from .models import Carrito, ItemCarrito
+        self.user = User.objects.create_user(username='resumen', password='pass1234')
+        self.producto = Producto.objects.create(nombre='Gorra', precio=15)
+        self.otro = Producto.objects.create(nombre='Bolso', precio=40)
+        carrito = Carrito.objects.create(usuario=self.user)
+        self.item = ItemCarrito.objects.create(carrito=carrito, producto=self.producto, cantidad=2)
+        ItemCarrito.objects.create(carrito=carrito, producto=self.otro, cantidad=1)
+
+    def test_resumen_en_una_consulta_cacheado_e_invalidado(self):
+        from decimal import Decimal
+        from .almacen import resumen_carrito_usuario
+
+        with self.assertNumQueries(1):
+            resumen = resumen_carrito_usuario(self.user.pk)
+        self.assertEqual(resumen, {'lineas': 2, 'unidades': 3, 'total': Decimal('70')})
+        with self.assertNumQueries(0):
+            resumen_carrito_usuario(self.user.pk)
+
+        # Cambiar un item o un precio deja obsoleto el resumen
+        self.client.force_login(self.user)
+        respuesta = self.client.post(reverse('cambiar_cantidad', args=[self.item.id, 'mas']))
+        self.assertEqual(respuesta.json()['total_carrito'], 85.0)
+        self.otro.precio = 50
+        self.otro.save()
+        self.assertEqual(resumen_carrito_usuario(self.user.pk)['total'], Decimal('95'))
+
+    def test_context_processor_expone_las_unidades(self):
+        self.client.force_login(self.user)
+        respuesta = self.client.get(reverse('index'))
+        self.assertEqual(int(str(respuesta.context['cantidad_carrito'])), 3)
+        self.assertContains(respuesta, '>3</span>')
+
+
+class CarritoLoteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        from .models import Carrito, ItemCarrito
+        self.user = User.objects.create_user(username='lote', password='pass1234')
+        self.producto = Producto.objects.create(nombre='Camisa', precio=10)
+        self.m = ProductoVariante.objects.create(producto=self.producto, talla='M', color='Rojo', stock=3)
+        self.l = ProductoVariante.objects.create(producto=self.producto, talla='L', color='Rojo', stock=3)
+        self.otro = Producto.objects.create(nombre='Bolso', precio=40)
+        carrito = Carrito.objects.create(usuario=self.user)
+        self.item_m = ItemCarrito.objects.create(carrito=carrito, producto=self.producto, talla='M', color='Rojo', cantidad=1)
+        self.item_bolso = ItemCarrito.objects.create(carrito=carrito, producto=self.otro, cantidad=1)
+
+    def lote(self, *operaciones):
+        import json
+        return self.client.post(
+            reverse('carrito_batch'), json.dumps({'operaciones': list(operaciones)}), content_type='application/json'
+        )
+
+    def test_aplica_todo_en_una_transaccion(self):
+        from .models import ItemCarrito
+        self.client.force_login(self.user)
+
+        respuesta = self.lote(
+            {'op': 'incrementar', 'item_id': self.item_m.id, 'delta': 2},
+            {'op': 'eliminar', 'item_id': self.item_bolso.id},
+            {'op': 'agregar', 'variante_id': self.l.id, 'cantidad': 1},
+        )
+        self.assertEqual(respuesta.json()['resumen'], {'lineas': 2, 'unidades': 4, 'total': 40.0})
+        self.assertEqual(
+            set(ItemCarrito.objects.values_list('talla', 'cantidad')), {('M', 3), ('L', 1)}
+        )
+
+        # Falta de stock en una operación: no se aplica ninguna
+        respuesta = self.lote(
+            {'op': 'eliminar', 'item_id': self.item_m.id},
+            {'op': 'agregar', 'variante_id': self.l.id, 'cantidad': 5},
+        )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertTrue(ItemCarrito.objects.filter(pk=self.item_m.pk).exists())
+
+    def test_items_ajenos_y_carrito_anonimo(self):
+        from .models import ItemCarrito
+
+        # Anónimo: los ids del carrito en BD de otro usuario no existen en su cookie
+        self.assertEqual(self.lote({'op': 'eliminar', 'item_id': self.item_m.id}).status_code, 400)
+        self.assertEqual(ItemCarrito.objects.count(), 2)
+
+        datos = self.lote({'op': 'agregar', 'variante_id': self.m.id, 'cantidad': 2}).json()
+        id_linea = datos['items'][0]['id']
+        datos = self.lote({'op': 'cantidad', 'item_id': id_linea, 'cantidad': 3}).json()
+        self.assertEqual(datos['resumen'], {'lineas': 1, 'unidades': 3, 'total': 30.0})
+        self.assertEqual(ItemCarrito.objects.count(), 2)
+
+
 from django.test import TestCase
 
 # Create your tests here.
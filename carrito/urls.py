@@ -10,6 +10,7 @@ urlpatterns = [
     path('carrito/agregar-variante/', views.agregar_al_carrito_variante, name='agregar_al_carrito_variante'),
     path('carrito/eliminar/<int:item_id>/', views.eliminar_item, name='eliminar_item'),
     path('carrito/modal/', views.carrito_modal, name='carrito_modal'),
+    path('carrito/batch/', views.carrito_batch, name='carrito_batch'),
     path('producto/<int:product_id>/', views.producto, name='producto'),
     path('favorito/toggle/<int:producto_id>/', views.toggle_favorito, name='toggle_favorito'),
     path('mis-deseos/', views.mis_deseos, name='mis_deseos'),
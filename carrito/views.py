@@ -5,45 +5,38 @@ from django.http import JsonResponse
 from django.conf import settings
 from django.contrib import messages
 from .models import Producto, Carrito, ItemCarrito, Pedido
+from .almacen import CAMPOS_PRODUCTO, CarritoLlenoError, obtener_carrito, resumen_carrito_usuario, resumen_de_items
+from .lote import OperacionInvalida, normalizar_operaciones
+from core.favoritos import es_favorito, invalidar_favoritos, obtener_favoritos_ids
+from core.generaciones import cache_por_generacion
 from decimal import Decimal
+import json
 
 
 @login_required
 def cliente_dashboard(request):
-    from django.core.cache import cache
-    from django.db.models import Sum
-    
     # 1. Obtener los items del carrito del usuario con optimización
-    carrito, _ = Carrito.objects.prefetch_related(
-        'items__producto'
-    ).get_or_create(usuario=request.user)
+    carrito, _ = Carrito.objects.get_or_create(usuario=request.user)
     items_carrito = carrito.items.select_related('producto').only(
         'id', 'cantidad', 'talla', 'color',
         'producto__id', 'producto__nombre', 'producto__precio', 'producto__imagen_url'
-    )
+    ).con_subtotal()
     
-    # Calcular total de items en carrito eficientemente
-    total_items_carrito = items_carrito.aggregate(total=Sum('cantidad'))['total'] or 0
+    # Total de unidades desde el resumen cacheado del carrito
+    total_items_carrito = resumen_carrito_usuario(request.user.pk)['unidades']
 
     # 2. Obtener SOLO los pedidos del usuario actual con optimización
     pedidos_usuario = Pedido.objects.filter(
         usuario=request.user
-    ).select_related('producto').only(
-        'id', 'fecha', 'estado', 'total', 'cantidad',
-        'producto__id', 'producto__nombre', 'producto__imagen_url'
-    ).order_by('-fecha')[:20]  # Limitar a últimos 20 pedidos
+    ).only('id', 'fecha', 'estado', 'total').con_lineas().order_by('-fecha')[:20]  # Limitar a últimos 20 pedidos
     
     # Total de pedidos del usuario
     total_pedidos = Pedido.objects.filter(usuario=request.user).count()
 
-    # 3. Obtener productos destacados con caché
-    cache_key = 'productos_destacados_dashboard'
-    productos_destacados = cache.get(cache_key)
-    if productos_destacados is None:
-        productos_destacados = Producto.objects.filter(
-            destacado=True
-        ).only('id', 'nombre', 'precio', 'imagen_url')[:8]
-        cache.set(cache_key, productos_destacados, 600)  # Cache 10 minutos
+    # 3. Obtener productos destacados con caché (se invalida al cambiar un producto)
+    productos_destacados = cache_por_generacion('productos_destacados_dashboard', [Producto], lambda: Producto.objects.filter(
+        destacado=True
+    ).only('id', 'nombre', 'precio', 'imagen_url')[:8], timeout_local=600)
 
     # 4. Crear el contexto con toda la información
     context = {
@@ -64,70 +57,36 @@ def lista_productos(request):
 
 
 # Vista clásica del carrito
-@login_required
 def ver_carrito(request):
-    carrito, _ = Carrito.objects.prefetch_related(
-        'items__producto'
-    ).get_or_create(usuario=request.user)
-    
-    # Optimizar carga de items
-    carrito.items_optimizados = carrito.items.select_related('producto').only(
-        'id', 'cantidad', 'talla', 'color',
-        'producto__id', 'producto__nombre', 'producto__precio', 'producto__imagen_url'
-    )
-    
-    return render(request, 'carrito.html', {'carrito': carrito})
+    carrito = obtener_carrito(request)
+    return render(request, 'carrito.html', {'carrito': carrito, 'items': carrito.items()})
 
 
-# Agregar producto al carrito (funciona con POST normal y con AJAX)
-@login_required
+def _respuesta_error(request, mensaje, status=400):
+    if request.headers.get("x-requested-with") == "XMLHttpRequest":
+        return JsonResponse({"ok": False, "error": mensaje}, status=status)
+    messages.warning(request, mensaje)
+    return redirect('index')
+
+
+# Agregar producto al carrito (funciona con POST normal y con AJAX).
+# Los anónimos usan el carrito en cookie: no se escribe nada en la base de datos.
 def agregar_al_carrito(request, producto_id):
-    producto = get_object_or_404(Producto, id=producto_id)
+    producto = get_object_or_404(Producto.objects.only(*CAMPOS_PRODUCTO, 'cantidad_variantes'), id=producto_id)
     
-    # ⚠️ VALIDACIÓN: Verificar si el producto tiene variantes
-    from .models import ProductoVariante
-    tiene_variantes = ProductoVariante.objects.filter(producto=producto).exists()
-    
-    if tiene_variantes:
+    # ⚠️ VALIDACIÓN: Verificar si el producto tiene variantes (resumen desnormalizado, sin consulta)
+    if producto.cantidad_variantes:
         # Si tiene variantes, DEBE usar agregar_al_carrito_variante
-        mensaje = 'Este producto requiere seleccionar talla y color. Por favor, usa el modal de detalles.'
-        if request.headers.get("x-requested-with") == "XMLHttpRequest":
-            return JsonResponse({
-                "ok": False,
-                "error": mensaje
-            }, status=400)
-        else:
-            messages.warning(request, mensaje)
-            return redirect('index')
-    
-    carrito, _ = Carrito.objects.get_or_create(usuario=request.user)
+        return _respuesta_error(request, 'Este producto requiere seleccionar talla y color. Por favor, usa el modal de detalles.')
 
     cantidad = int(request.POST.get('cantidad', 1))
     # Permitimos que el usuario envíe una talla y color opcional al agregar al carrito
-    talla = request.POST.get('talla')
-    if talla:
-        talla = talla.strip()
-    else:
-        talla = None
-    
-    color = request.POST.get('color')
-    if color:
-        color = color.strip()
-    else:
-        color = None
-
-    # Buscamos el item teniendo en cuenta la talla y color seleccionados (pueden ser None)
-    item, creado = ItemCarrito.objects.get_or_create(
-        carrito=carrito, 
-        producto=producto, 
-        talla=talla,
-        color=color
-    )
-    if not creado:
-        item.cantidad += cantidad
-    else:
-        item.cantidad = cantidad
-    item.save()
+    try:
+        item = obtener_carrito(request).agregar(
+            producto, cantidad, request.POST.get('talla'), request.POST.get('color')
+        )
+    except CarritoLlenoError as e:
+        return _respuesta_error(request, str(e))
 
     # ✅ Si es AJAX, responde con JSON
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
@@ -149,7 +108,6 @@ def agregar_al_carrito(request, producto_id):
 
 
 # Agregar variante específica al carrito (para productos con variantes de talla/color)
-@login_required
 @require_POST
 def agregar_al_carrito_variante(request):
     """Agrega una variante específica (con talla y color) al carrito"""
@@ -164,45 +122,42 @@ def agregar_al_carrito_variante(request):
             'error': 'Debes seleccionar una talla y color'
         }, status=400)
     
-    # Obtener la variante
-    variante = get_object_or_404(ProductoVariante, id=variante_id)
+    # Obtener la variante con su producto en una sola consulta
+    variante = get_object_or_404(
+        ProductoVariante.objects.select_related('producto').only(
+            'id', 'talla', 'color', 'stock', 'stock_reservado', *(f'producto__{c}' for c in CAMPOS_PRODUCTO)
+        ),
+        id=variante_id,
+    )
     producto = variante.producto
     
-    # Verificar stock
-    if variante.stock <= 0:
+    # Verificar stock (lo apartado por checkouts pendientes no está disponible)
+    disponible = variante.stock_disponible
+    if disponible <= 0:
         return JsonResponse({
             'success': False,
             'error': 'Este producto no está disponible (sin stock)'
         }, status=400)
     
-    if variante.stock < cantidad:
+    if disponible < cantidad:
         return JsonResponse({
             'success': False,
-            'error': f'Solo hay {variante.stock} unidades disponibles'
+            'error': f'Solo hay {disponible} unidades disponibles'
         }, status=400)
     
-    # Obtener o crear el carrito
-    carrito, _ = Carrito.objects.get_or_create(usuario=request.user)
-    
-    # Buscar si ya existe un item con esta variante exacta (talla + color)
-    item, creado = ItemCarrito.objects.get_or_create(
-        carrito=carrito,
-        producto=producto,
-        talla=variante.talla,
-        color=variante.color,
-        defaults={'cantidad': cantidad}
-    )
+    carrito = obtener_carrito(request)
     
-    if not creado:
-        # Si ya existe, incrementar cantidad
-        nueva_cantidad = item.cantidad + cantidad
-        if nueva_cantidad > variante.stock:
-            return JsonResponse({
-                'success': False,
-                'error': f'Stock insuficiente. Solo hay {variante.stock} unidades disponibles'
-            }, status=400)
-        item.cantidad = nueva_cantidad
-        item.save()
+    # Lo que ya hay de esta variante exacta (talla + color) más lo nuevo no puede superar el stock
+    if carrito.cantidad_en_carrito(producto.id, variante.talla, variante.color) + cantidad > disponible:
+        return JsonResponse({
+            'success': False,
+            'error': f'Stock insuficiente. Solo hay {disponible} unidades disponibles'
+        }, status=400)
+
+    try:
+        item = carrito.agregar(producto, cantidad, variante.talla, variante.color, variante.id)
+    except CarritoLlenoError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
     
     # Responder con éxito
     return JsonResponse({
@@ -217,40 +172,68 @@ def agregar_al_carrito_variante(request):
             'precio': float(producto.precio),
             'subtotal': float(item.subtotal())
         },
-        'carrito_total': carrito.items.count()
+        'carrito_total': carrito.cantidad_lineas()
     })
 
 
 # Eliminar producto del carrito
-@login_required
 def eliminar_item(request, item_id):
-    item = get_object_or_404(ItemCarrito, id=item_id)
-    if item.carrito.usuario == request.user:
-        item.delete()
+    if obtener_carrito(request).eliminar(item_id):
         return JsonResponse({"ok": True})
-    return JsonResponse({"ok": False}, status=403)
+    return JsonResponse({"ok": False}, status=404)
+
+
+def _datos_items(items):
+    return [{
+        'id': item.id,
+        'producto': item.producto.nombre,
+        'imagen': item.producto.imagen_url if item.producto.imagen_url else (item.producto.imagen.url if item.producto.imagen else ''),
+        'precio': float(item.producto.precio),
+        'cantidad': item.cantidad,
+        'talla': item.talla or 'N/A',
+        'color': item.color or 'N/A',
+        'subtotal': float(item.subtotal())
+    } for item in items]
 
 
 # Modal del carrito (JSON)
-@login_required
 def carrito_modal(request):
-    carrito, _ = Carrito.objects.prefetch_related('items__producto').get_or_create(usuario=request.user)
-    items = carrito.items.select_related('producto').all()
+    items = obtener_carrito(request).items()
+    resumen = resumen_de_items(items)
+    return JsonResponse({
+        'items': _datos_items(items),
+        'total': float(resumen['total']),
+        'unidades': resumen['unidades'],
+    })
 
-    datos = []
-    for item in items:
-        datos.append({
-            'id': item.id,
-            'producto': item.producto.nombre,
-            'imagen': item.producto.imagen_url if item.producto.imagen_url else (item.producto.imagen.url if item.producto.imagen else ''),
-            'precio': float(item.producto.precio),
-            'cantidad': item.cantidad,
-            'talla': item.talla or 'N/A',
-            'color': item.color or 'N/A',
-            'subtotal': float(item.subtotal())
-        })
-    
-    return JsonResponse({'items': datos, 'total': float(carrito.total())})
+
+# Varias operaciones del carrito en una sola petición (el modal agrupa los clics)
+@require_POST
+def carrito_batch(request):
+    """
+    Recibe {"operaciones": [...]} (ver carrito/lote.py) y las aplica todas o
+    ninguna. Responde con los items y el resumen nuevos del carrito.
+    """
+    try:
+        operaciones = normalizar_operaciones(json.loads(request.body or b'{}').get('operaciones'))
+        carrito = obtener_carrito(request)
+        carrito.aplicar_lote(operaciones)
+    except (ValueError, AttributeError):
+        return JsonResponse({'ok': False, 'error': 'JSON inválido'}, status=400)
+    except OperacionInvalida as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=400)
+
+    items = carrito.items()
+    resumen = resumen_de_items(items)
+    return JsonResponse({
+        'ok': True,
+        'items': _datos_items(items),
+        'resumen': {
+            'lineas': resumen['lineas'],
+            'unidades': resumen['unidades'],
+            'total': float(resumen['total']),
+        },
+    })
 
 
 # Página de detalle de un producto
@@ -271,14 +254,15 @@ def toggle_favorito(request, producto_id):
     user = request.user
     # Asegurarse de que el usuario tenga el atributo favoritos (modelo personalizado)
     added = False
-    if producto in user.favoritos.all():
+    if es_favorito(user, producto.id):
         user.favoritos.remove(producto)
         added = False
     else:
         user.favoritos.add(producto)
         added = True
+    invalidar_favoritos(user)
 
-    total = user.favoritos.count()
+    total = len(obtener_favoritos_ids(user))
     return JsonResponse({
         'ok': True,
         'added': added,
@@ -292,22 +276,22 @@ def mis_deseos(request):
     """Muestra la lista de deseos del usuario autenticado."""
     # Optimizado: usar only() para cargar solo campos necesarios
     productos = request.user.favoritos.only(
-        'id', 'nombre', 'precio', 'imagen_url', 'destacado'
+        'id', 'nombre', 'precio', 'imagen_url', 'destacado',
+        'stock', 'tiene_stock', 'cantidad_variantes'
     ).all()
     context = {'productos': productos}
     return render(request, 'core/mis_deseos.html', context)
 
 
 # Cambiar cantidad de un producto en el carrito
-@login_required
 @require_POST
 def cambiar_cantidad(request, item_id, accion):
     try:
-        item = get_object_or_404(ItemCarrito, id=item_id)
-        
-        # Validar que el item pertenece al usuario
-        if item.carrito.usuario != request.user:
-            return JsonResponse({"ok": False, "error": "No autorizado"}, status=403)
+        carrito = obtener_carrito(request)
+        # Solo se encuentran los items del propio carrito (BD del usuario o cookie)
+        item = carrito.obtener(item_id)
+        if item is None:
+            return JsonResponse({"ok": False, "error": "Item no encontrado"}, status=404)
         
         print(f"🔄 Cambiando cantidad: item {item_id}, acción {accion}, cantidad actual: {item.cantidad}")
         
@@ -321,12 +305,12 @@ def cambiar_cantidad(request, item_id, accion):
             print(f"  ⚠️ No se puede reducir más (cantidad mínima: 1)")
             return JsonResponse({"ok": False, "error": "Cantidad mínima es 1"}, status=400)
         
-        item.save()
+        carrito.guardar_cantidad(item)
         print(f"  ✅ Cantidad guardada: {item.cantidad}")
         
         # Calcular subtotal del item y total del carrito
         subtotal = float(item.subtotal())
-        total_carrito = float(item.carrito.total())
+        total_carrito = float(carrito.total())
         
         return JsonResponse({
             "ok": True, 
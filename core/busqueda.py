@@ -0,0 +1,98 @@
+"""
+Búsqueda de productos por relevancia.
+
+En PostgreSQL usa el vector ``Producto.busqueda`` (índice GIN, configuración
+``es_unaccent``: raíces en español y sin tildes) combinado con similitud por
+trigramas sobre el nombre para tolerar errores de escritura. En SQLite
+(desarrollo y pruebas) se aplica la misma idea en memoria.
+"""
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connection
+from django.db.models import F, Q
+
+from carrito.models import Producto
+
+CONFIG_BUSQUEDA = 'es_unaccent'
+LIMITE_RESULTADOS = 50
+# En memoria se compara contra cada palabra del nombre, así que el umbral es
+# más alto que el 0.3 de pg_trgm (que compara contra el nombre completo)
+SIMILITUD_MINIMA_PALABRA = 0.75
+
+CAMPOS_RESULTADO = ('id', 'nombre', 'descripcion', 'precio', 'imagen_url', 'imagen', 'categoria')
+
+# Pesos equivalentes a setweight A/B/C del trigger
+PESOS = {'nombre': 1.0, 'categoria': 0.4, 'descripcion': 0.2}
+
+
+def buscar(texto, limite=LIMITE_RESULTADOS):
+    """Retorna una lista de productos ordenados por relevancia para ``texto``."""
+    texto = (texto or '').strip()
+    if not texto:
+        return []
+    if connection.vendor == 'postgresql':
+        return _buscar_postgres(texto, limite)
+    return _buscar_en_memoria(texto, limite)
+
+
+def _buscar_postgres(texto, limite):
+    consulta = SearchQuery(texto, config=CONFIG_BUSQUEDA, search_type='websearch')
+    productos = Producto.objects.annotate(
+        rango=SearchRank(F('busqueda'), consulta),
+        similitud=TrigramSimilarity('nombre', texto),
+    ).filter(
+        Q(busqueda=consulta) | Q(nombre__trigram_similar=texto)
+    ).order_by('-rango', '-similitud', '-id').only(*CAMPOS_RESULTADO)
+    return list(productos[:limite])
+
+
+# ---------------------------------------------------------------------------
+# Alternativa en memoria (SQLite)
+# ---------------------------------------------------------------------------
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: 'Camisón' -> 'camison'"""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def raiz(palabra):
+    """Stemming mínimo en español: quita plurales ('camisas' -> 'camisa', 'pantalones' -> 'pantalon')"""
+    if len(palabra) > 4 and palabra.endswith('es'):
+        return palabra[:-2]
+    if len(palabra) > 3 and palabra.endswith('s'):
+        return palabra[:-1]
+    return palabra
+
+
+def _terminos(texto):
+    return {raiz(p) for p in re.findall(r'\w+', normalizar(texto))}
+
+
+def _buscar_en_memoria(texto, limite):
+    terminos = _terminos(texto)
+    texto_normalizado = normalizar(texto)
+    resultados = []
+
+    for producto in Producto.objects.only(*CAMPOS_RESULTADO).iterator():
+        rango = 0.0
+        for campo, peso in PESOS.items():
+            palabras = _terminos(getattr(producto, campo) or '')
+            rango += peso * sum(
+                1.0 if termino in palabras else 0.5
+                for termino in terminos
+                if any(p.startswith(termino) for p in palabras)
+            )
+        similitud = max(
+            (SequenceMatcher(None, texto_normalizado, palabra).ratio()
+             for palabra in normalizar(producto.nombre).split()),
+            default=0.0,
+        )
+        if rango or similitud >= SIMILITUD_MINIMA_PALABRA:
+            resultados.append((rango, similitud, producto.id, producto))
+
+    resultados.sort(key=lambda r: r[:3], reverse=True)
+    return [producto for *_, producto in resultados[:limite]]
@@ -0,0 +1,61 @@
+"""
+Validadores para GET condicional (ETag / Last-Modified) de las páginas y APIs
+de producto.
+
+Todos salen de ``Producto.updated_at``, que también se actualiza al cambiar una
+variante, así que se calculan con una consulta de una sola columna y la vista
+responde 304 sin renderizar cuando el cliente ya tiene la versión actual.
+Se usan con ``django.views.decorators.http.condition``.
+
+La página de detalle incluye la barra de navegación, que muestra las unidades
+del carrito y los favoritos: su ETag también los cubre, y no lleva
+Last-Modified cuando hay sesión o carrito anónimo (una fecha no los refleja).
+"""
+import hashlib
+
+from carrito.almacen import COOKIE_CARRITO, obtener_carrito
+from carrito.models import Producto
+from .favoritos import obtener_favoritos_ids
+
+
+def ultima_modificacion_producto(request, producto_id):
+    """updated_at del producto (None si no existe); una consulta por request"""
+    cache = request.__dict__.setdefault('_ultima_modificacion_productos', {})
+    if producto_id not in cache:
+        cache[producto_id] = Producto.objects.filter(pk=producto_id).values_list('updated_at', flat=True).first()
+    return cache[producto_id]
+
+
+def _etag(*partes):
+    return hashlib.md5(':'.join(str(p) for p in partes).encode()).hexdigest()
+
+
+def etag_producto(request, producto_id):
+    """ETag de las APIs JSON: solo depende del producto y sus variantes"""
+    modificado = ultima_modificacion_producto(request, producto_id)
+    if modificado is None:
+        return None
+    return _etag(producto_id, modificado.timestamp())
+
+
+def _estado_visitante(request):
+    """Lo que la página muestra del visitante: unidades del carrito y favoritos"""
+    # Cookie o resumen cacheado del carrito, y el conjunto de favoritos ya cacheado
+    favoritos = ','.join(str(i) for i in sorted(obtener_favoritos_ids(request.user)))
+    return obtener_carrito(request).cantidad_unidades(), favoritos
+
+
+def etag_pagina_producto(request, producto_id):
+    """ETag de la página de detalle, que además depende de quién la ve"""
+    modificado = ultima_modificacion_producto(request, producto_id)
+    if modificado is None:
+        return None
+    modal = request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.GET.get('modal') == 'true'
+    return _etag(producto_id, modificado.timestamp(), request.user.pk, modal, *_estado_visitante(request))
+
+
+def ultima_modificacion_pagina_producto(request, producto_id):
+    """Last-Modified de la página de detalle, solo si no depende del visitante"""
+    if request.user.is_authenticated or COOKIE_CARRITO in request.COOKIES:
+        return None
+    return ultima_modificacion_producto(request, producto_id)
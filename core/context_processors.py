@@ -0,0 +1,13 @@
+from django.utils.functional import SimpleLazyObject
+
+from .favoritos import obtener_favoritos_ids
+
+
+def favoritos(request):
+    """Expone ``favoritos_ids`` a todas las plantillas.
+
+    Es perezoso: las páginas que no muestran favoritos no hacen ninguna consulta.
+    """
+    return {
+        'favoritos_ids': SimpleLazyObject(lambda: obtener_favoritos_ids(request.user)),
+    }
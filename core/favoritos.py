@@ -0,0 +1,58 @@
+"""
+Servicio de favoritos (lista de deseos).
+
+Carga una sola vez por request el conjunto de IDs de productos favoritos del
+usuario y lo guarda en caché por usuario, de modo que las plantillas puedan
+preguntar ``producto.id in favoritos_ids`` sin lanzar una consulta por tarjeta.
+"""
+from django.core.cache import cache
+
+from .generaciones import timeout_cache
+
+# El conjunto solo cambia desde toggle_favorito, que lo invalida explícitamente,
+# pero solo en la caché de su proceso: sin caché compartida otro worker lo
+# sigue viendo hasta que vence FAVORITOS_CACHE_TIMEOUT_LOCAL
+FAVORITOS_CACHE_TIMEOUT = 60 * 60 * 24
+FAVORITOS_CACHE_TIMEOUT_LOCAL = 60
+
+
+def _cache_key(user_id):
+    return f'favoritos_ids:{user_id}'
+
+
+def obtener_favoritos_ids(user):
+    """Retorna un frozenset con los IDs de los productos favoritos del usuario.
+
+    El resultado se memoriza en el propio objeto ``user`` (uno por request) y en
+    la caché compartida, así que una página completa cuesta como máximo una
+    consulta.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    ids = getattr(user, '_favoritos_ids', None)
+    if ids is not None:
+        return ids
+
+    key = _cache_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(user.favoritos.values_list('id', flat=True))
+        cache.set(key, ids, timeout_cache(FAVORITOS_CACHE_TIMEOUT_LOCAL, FAVORITOS_CACHE_TIMEOUT))
+
+    user._favoritos_ids = ids
+    return ids
+
+
+def es_favorito(user, producto_id):
+    """Verifica en O(1) si un producto está en la lista de deseos del usuario."""
+    return producto_id in obtener_favoritos_ids(user)
+
+
+def invalidar_favoritos(user):
+    """Descarta el conjunto cacheado tras modificar los favoritos del usuario."""
+    cache.delete(_cache_key(user.pk))
+    try:
+        del user._favoritos_ids
+    except AttributeError:
+        pass
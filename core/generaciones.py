@@ -0,0 +1,108 @@
+"""
+Invalidación de caché por generaciones de modelo.
+
+Cada modelo registrado tiene un contador en la caché que se incrementa en cada
+post_save/post_delete (ver core/signals.py). Las claves de los valores
+cacheados incluyen las generaciones de los modelos de los que dependen, así un
+cambio deja obsoletas exactamente esas entradas.
+
+Los contadores viven en la caché de Django: solo invalidan en todos los
+procesos si es compartida (``CACHE_COMPARTIDA``, Redis). Con LocMem un cambio
+hecho en otro worker o comando no llega a este, así que ``timeout_cache``
+mantiene los TTL cortos y acota cuánto tiempo se ven datos viejos.
+También se aceptan ámbitos más finos como cadenas (``'producto:5'``).
+
+Ejemplo:
+
+    productos = cache_por_generacion(
+        'home_productos', [Producto],
+        lambda: Producto.objects.only('id', 'nombre')[:20],
+    )
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.query import QuerySet
+
+# Con caché compartida las entradas no dependen del TTL para invalidarse
+GENERACION_CACHE_TIMEOUT = 60 * 60 * 24
+# Con LocMem por proceso, lo máximo que otro worker muestra datos viejos
+GENERACION_CACHE_TIMEOUT_LOCAL = 60 * 5
+
+
+def timeout_cache(local=GENERACION_CACHE_TIMEOUT_LOCAL, compartida=GENERACION_CACHE_TIMEOUT):
+    """TTL de una entrada: ``compartida`` si la caché se comparte entre procesos, si no ``local``"""
+    return compartida if getattr(settings, 'CACHE_COMPARTIDA', False) else local
+
+
+def _nombre_ambito(ambito):
+    return ambito if isinstance(ambito, str) else ambito._meta.label_lower
+
+
+def _clave_generacion(ambito):
+    return f'generacion:{_nombre_ambito(ambito)}'
+
+
+def _generacion_inicial():
+    # Si la caché pierde el contador no se puede volver a una generación anterior
+    return time.time_ns()
+
+
+def generaciones(*modelos):
+    """Retorna {modelo: generación actual} con una sola lectura de la caché."""
+    claves = {_clave_generacion(m): m for m in modelos}
+    actuales = cache.get_many(claves)
+    faltantes = {clave: _generacion_inicial() for clave in claves if clave not in actuales}
+    if faltantes:
+        for clave, valor in faltantes.items():
+            cache.add(clave, valor, None)
+        actuales.update(cache.get_many(faltantes))
+    return {claves[clave]: valor for clave, valor in actuales.items()}
+
+
+def incrementar_generacion(modelo):
+    """Deja obsoletas todas las entradas que dependen de ``modelo``.
+
+    Dentro de una transacción se incrementa también al confirmar, para que una
+    lectura concurrente de los datos anteriores no quede cacheada en la nueva
+    generación.
+    """
+    _incrementar(modelo)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _incrementar(modelo))
+
+
+def _incrementar(modelo):
+    clave = _clave_generacion(modelo)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, _generacion_inicial(), None)
+
+
+def clave_cache(nombre, modelos):
+    """Clave de caché que incluye las generaciones de ``modelos``."""
+    actuales = generaciones(*modelos)
+    return ':'.join([nombre] + [f'{_nombre_ambito(m)}={actuales[m]}' for m in modelos])
+
+
+def materializar(valor):
+    """Evalúa los querysets antes de cachearlos (un QuerySet cacheado se vuelve a consultar)."""
+    if isinstance(valor, QuerySet):
+        return list(valor)
+    return valor
+
+
+def cache_por_generacion(nombre, modelos, calcular, timeout_local=GENERACION_CACHE_TIMEOUT_LOCAL):
+    """Retorna el valor cacheado para las generaciones actuales o lo calcula y guarda.
+
+    ``timeout_local`` es el TTL cuando la caché no es compartida (ver ``timeout_cache``).
+    """
+    clave = clave_cache(nombre, modelos)
+    valor = cache.get(clave)
+    if valor is None:
+        valor = materializar(calcular())
+        cache.set(clave, valor, timeout_cache(timeout_local))
+    return valor
@@ -0,0 +1,145 @@
+"""
+Caché de páginas completas para visitantes anónimos.
+
+Guarda el HTML de las páginas del catálogo (inicio, categorías, ofertas,
+catálogo completo y detalle de producto) para los GET anónimos. La clave incluye
+la ruta, la query string y la generación del catálogo (core/generaciones.py),
+así que un cambio en un producto, una variante o una oferta deja obsoletas las
+páginas afectadas sin esperar al TTL; la página de detalle depende solo de la
+generación de su propio producto. Eso vale en todos los procesos solo con caché
+compartida: con LocMem el stock que descuenta el worker de webhooks o un
+producto editado en otro worker no llegan aquí, y el TTL baja al ``max-age``.
+
+Nunca se sirve desde la caché a quien tenga sesión, carrito anónimo o mensajes
+pendientes, y no se guardan respuestas que usaron el token CSRF o que
+establecen cookies.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from carrito.almacen import COOKIE_CARRITO
+from carrito.models import Producto, ProductoVariante
+from .generaciones import clave_cache, timeout_cache
+
+VISTAS_CATALOGO = {'index', 'hombres', 'mujeres', 'zapatos', 'ofertas', 'catalogo_completo'}
+VISTAS_PRODUCTO = {'producto_detalle', 'producto'}
+
+# El navegador revalida pronto: la invalidación exacta solo ocurre en el servidor
+NAVEGADOR_MAX_AGE = 60
+# Solo con caché compartida; con LocMem por proceso se usa NAVEGADOR_MAX_AGE
+PAGINA_CACHE_TIMEOUT = 60 * 60
+
+CLAVE_ACIERTOS = 'pagina_cache:aciertos'
+CLAVE_FALLOS = 'pagina_cache:fallos'
+
+
+def ambito_producto(producto_id):
+    """Generación de la que depende la página de detalle de un producto"""
+    return f'producto:{producto_id}'
+
+
+def estadisticas_cache_paginas():
+    aciertos = cache.get(CLAVE_ACIERTOS, 0)
+    fallos = cache.get(CLAVE_FALLOS, 0)
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'tasa_aciertos': round(aciertos / total, 4) if total else 0.0,
+    }
+
+
+def _contar(clave):
+    if not cache.add(clave, 1, None):
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.set(clave, 1, None)
+
+
+class CachePaginasAnonimasMiddleware:
+    COOKIES_CON_ESTADO = (settings.SESSION_COOKIE_NAME, 'messages', COOKIE_CARRITO)
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        clave = self._clave(request)
+        if clave is None:
+            return self.get_response(request)
+
+        guardada = cache.get(clave)
+        if guardada is not None:
+            _contar(CLAVE_ACIERTOS)
+            return self._respuesta_cacheada(request, guardada)
+
+        _contar(CLAVE_FALLOS)
+        response = self.get_response(request)
+        if self._se_puede_guardar(request, response):
+            response['Cache-Control'] = f'public, max-age={NAVEGADOR_MAX_AGE}'
+            cache.set(clave, {
+                'contenido': response.content,
+                'status': response.status_code,
+                'headers': dict(response.items()),
+                'guardada': time.time(),
+            }, timeout_cache(NAVEGADOR_MAX_AGE, PAGINA_CACHE_TIMEOUT))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def _clave(self, request):
+        """Clave de la página o None si la petición no se puede cachear"""
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if any(nombre in request.COOKIES for nombre in self.COOKIES_CON_ESTADO):
+            return None
+        # El modal de producto se pide por AJAX y lleva formularios con token CSRF
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return None
+
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+
+        if match.url_name in VISTAS_CATALOGO:
+            ambitos = [Producto, ProductoVariante]
+        elif match.url_name in VISTAS_PRODUCTO:
+            ambitos = [ambito_producto(match.kwargs['producto_id'])]
+        else:
+            return None
+
+        ruta = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return clave_cache(f'pagina:{ruta}', ambitos)
+
+    @staticmethod
+    def _se_puede_guardar(request, response):
+        return (
+            request.method == 'GET'
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            # get_token() marca la petición cuando la plantilla usó {% csrf_token %}
+            and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        )
+
+    @staticmethod
+    def _respuesta_cacheada(request, guardada):
+        response = HttpResponse(guardada['contenido'], status=guardada['status'])
+        for nombre, valor in guardada['headers'].items():
+            response[nombre] = valor
+        response['Age'] = str(int(time.time() - guardada['guardada']))
+        response['X-Cache'] = 'HIT'
+        # Respeta los validadores guardados (p. ej. ETag de producto_detalle)
+        return get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+            response=response,
+        )
@@ -0,0 +1,93 @@
+"""
+Paginación por keyset (seek) para los listados del catálogo.
+
+En lugar de OFFSET, cada página continúa desde el último producto mostrado
+(``WHERE (precio, id) < (p, i) ORDER BY precio DESC, id DESC LIMIT n``), así una
+página profunda cuesta lo mismo que la primera. El cursor es opaco para el
+cliente: solo hay que reenviar el valor de ``siguiente_cursor``.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+
+TAMANO_PAGINA = 24
+
+# Cada orden termina en el id para que la clave sea única y el corte exacto
+ORDENES = {
+    'recientes': ('-id',),
+    'precio_desc': ('-precio', '-id'),
+    'precio_asc': ('precio', 'id'),
+}
+ORDEN_POR_DEFECTO = 'recientes'
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no corresponde al orden solicitado."""
+
+
+class PaginaKeyset:
+    def __init__(self, items, siguiente_cursor, orden):
+        self.items = items
+        self.siguiente_cursor = siguiente_cursor
+        self.orden = orden
+
+    @property
+    def tiene_siguiente(self):
+        return self.siguiente_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _codificar_cursor(producto, orden):
+    if orden == 'recientes':
+        return str(producto.id)
+    return f'{producto.precio}_{producto.id}'
+
+
+def _decodificar_cursor(cursor, orden):
+    try:
+        if orden == 'recientes':
+            return (int(cursor),)
+        precio, producto_id = cursor.split('_')
+        return Decimal(precio), int(producto_id)
+    except (ValueError, InvalidOperation):
+        raise CursorInvalido(cursor)
+
+
+def _filtro_despues_de(orden, valores):
+    if orden == 'recientes':
+        return Q(id__lt=valores[0])
+    precio, producto_id = valores
+    # El primer término acota el rango del índice; el OR solo desempata por id
+    if orden == 'precio_desc':
+        return Q(precio__lte=precio) & (Q(precio__lt=precio) | Q(id__lt=producto_id))
+    return Q(precio__gte=precio) & (Q(precio__gt=precio) | Q(id__gt=producto_id))
+
+
+def normalizar_orden(orden):
+    return orden if orden in ORDENES else ORDEN_POR_DEFECTO
+
+
+def paginar_keyset(queryset, orden=ORDEN_POR_DEFECTO, cursor=None, tamano=TAMANO_PAGINA):
+    """
+    Retorna una PaginaKeyset con hasta ``tamano`` productos posteriores al cursor.
+
+    Se pide una fila extra para saber si hay más páginas sin hacer un COUNT.
+    """
+    orden = normalizar_orden(orden)
+    queryset = queryset.order_by(*ORDENES[orden])
+
+    if cursor:
+        queryset = queryset.filter(_filtro_despues_de(orden, _decodificar_cursor(cursor, orden)))
+
+    items = list(queryset[:tamano + 1])
+    siguiente_cursor = None
+    if len(items) > tamano:
+        items = items[:tamano]
+        siguiente_cursor = _codificar_cursor(items[-1], orden)
+
+    return PaginaKeyset(items, siguiente_cursor, orden)
@@ -0,0 +1,53 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from carrito.models import Pedido, Producto, ProductoVariante, UsuarioPersonalizado
+from .generaciones import incrementar_generacion
+from .middleware import ambito_producto
+from .sugerencias import indice_construido
+from .utils.derivados import necesita_derivados, programar_derivados
+
+# Modelos con generación de caché (ver core/generaciones.py)
+MODELOS_CON_GENERACION = (Producto, ProductoVariante, Pedido, UsuarioPersonalizado)
+
+
+def _incrementar_generacion(sender, **kwargs):
+    incrementar_generacion(sender)
+
+
+for modelo in MODELOS_CON_GENERACION:
+    post_save.connect(_incrementar_generacion, sender=modelo, dispatch_uid=f'generacion_save_{modelo._meta.label}')
+    post_delete.connect(_incrementar_generacion, sender=modelo, dispatch_uid=f'generacion_delete_{modelo._meta.label}')
+
+
+@receiver([post_save, post_delete], sender=Producto)
+def purgar_pagina_producto(sender, instance, **kwargs):
+    """Invalida la página de detalle cacheada del producto (core/middleware.py)"""
+    incrementar_generacion(ambito_producto(instance.id))
+
+
+@receiver([post_save, post_delete], sender=ProductoVariante)
+def purgar_pagina_producto_de_variante(sender, instance, **kwargs):
+    incrementar_generacion(ambito_producto(instance.producto_id))
+
+
+@receiver(post_save, sender=Producto)
+def actualizar_indice_sugerencias(sender, instance, **kwargs):
+    """Mantiene al día el índice de sugerencias si este proceso ya lo construyó"""
+    indice = indice_construido()
+    if indice is not None:
+        indice.actualizar(instance)
+
+
+@receiver(post_delete, sender=Producto)
+def eliminar_de_indice_sugerencias(sender, instance, **kwargs):
+    indice = indice_construido()
+    if indice is not None:
+        indice.eliminar(instance.id)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=ProductoVariante)
+def generar_derivados_imagen(sender, instance, update_fields=None, **kwargs):
+    """Programa derivados AVIF/WebP y placeholder cuando cambia la imagen (fuera de la petición)"""
+    if necesita_derivados(instance, update_fields):
+        programar_derivados(instance)
@@ -20,11 +20,11 @@ class ProductoSitemap(Sitemap):
     priority = 0.9
 
     def items(self):
-        return Producto.objects.all()
+        return Producto.objects.only('id', 'updated_at').order_by('id')
 
     def lastmod(self, obj):
-        # Si tienes un campo de fecha de modificación, úsalo aquí
-        return None
+        # Incluye los cambios de variantes (ver ProductoVariante.save)
+        return obj.updated_at
 
     def location(self, obj):
         return reverse('producto', args=[obj.id])
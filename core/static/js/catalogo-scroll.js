@@ -0,0 +1,46 @@
+/**
+ * Scroll infinito del catálogo.
+ * Pide la siguiente página a /catalogo/pagina/ (paginación por keyset) cuando
+ * el marcador #catalogo-siguiente entra en pantalla y agrega las tarjetas al grid.
+ */
+(function () {
+    const marcador = document.getElementById('catalogo-siguiente');
+    const grid = document.getElementById('catalogo-grid');
+    if (!marcador || !grid || !('IntersectionObserver' in window)) return;
+
+    let cargando = false;
+
+    async function cargarSiguientePagina() {
+        const cursor = marcador.dataset.cursor;
+        if (cargando || !cursor) return;
+        cargando = true;
+
+        try {
+            const url = `${marcador.dataset.url}&cursor=${encodeURIComponent(cursor)}`;
+            const response = await fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } });
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            const data = await response.json();
+
+            grid.insertAdjacentHTML('beforeend', data.html);
+
+            if (data.siguiente) {
+                marcador.dataset.cursor = data.siguiente;
+            } else {
+                observer.disconnect();
+                marcador.remove();
+            }
+        } catch (error) {
+            console.error('Error cargando más productos:', error);
+        } finally {
+            cargando = false;
+        }
+    }
+
+    const observer = new IntersectionObserver((entries) => {
+        if (entries.some(entry => entry.isIntersecting)) cargarSiguientePagina();
+    }, { rootMargin: '600px 0px' });
+
+    // Con JavaScript el enlace de respaldo se reemplaza por la carga automática
+    marcador.querySelector('a').style.display = 'none';
+    observer.observe(marcador);
+})();
@@ -42,6 +42,7 @@ function mostrarCarrito() {
             }
 
             document.getElementById('carritoContenido').innerHTML = contenido;
+            actualizarContadorCarrito(data.unidades);
             
             // Agregar footer con total y botón fuera del body
             const modalContenido = document.querySelector('#carritoModal .modal-contenido');
@@ -72,6 +73,15 @@ function mostrarCarrito() {
         });
 }
 
+// Actualizar el contador del carrito en el navbar
+function actualizarContadorCarrito(unidades) {
+    if (unidades === undefined) return;
+    document.querySelectorAll('.carrito-count').forEach(contador => {
+        contador.textContent = unidades;
+        contador.style.display = unidades === 0 ? 'none' : '';
+    });
+}
+
 function eliminarItem(itemId) {
     fetch(`/carrito/eliminar/${itemId}/`).then(() => mostrarCarrito());
 }
@@ -80,47 +90,58 @@ function cerrarModal() {
     document.getElementById('carritoModal').style.display = 'none';
 }
 
+// Los clics de +/- se acumulan unos milisegundos y se envían juntos a /carrito/batch/,
+// que los aplica en una sola transacción
+const cambiosPendientes = {};
+let temporizadorCambios = null;
+
 function cambiarCantidad(itemId, accion) {
-    console.log(`🔄 Cambiando cantidad: item ${itemId}, acción: ${accion}`);
+    cambiosPendientes[itemId] = (cambiosPendientes[itemId] || 0) + (accion === 'mas' ? 1 : -1);
+    clearTimeout(temporizadorCambios);
+    temporizadorCambios = setTimeout(enviarCambiosCarrito, 300);
+}
+
+function enviarCambiosCarrito() {
+    const operaciones = Object.entries(cambiosPendientes)
+        .filter(([, delta]) => delta !== 0)
+        .map(([itemId, delta]) => ({ op: 'incrementar', item_id: Number(itemId), delta: delta }));
+    Object.keys(cambiosPendientes).forEach(itemId => delete cambiosPendientes[itemId]);
+    if (operaciones.length === 0) return;
+
+    console.log('🔄 Enviando cambios del carrito:', operaciones);
     
-    fetch(`/carrito/cambiar/${itemId}/${accion}/`, {
+    fetch('/carrito/batch/', {
         method: 'POST',
         headers: {
             'X-CSRFToken': getCookie('csrftoken'),
             'Content-Type': 'application/json'
-        }
-    })
-    .then(response => {
-        if (!response.ok) {
-            throw new Error('Error al cambiar cantidad');
-        }
-        return response.json();
+        },
+        body: JSON.stringify({ operaciones: operaciones })
     })
+    .then(response => response.json())
     .then(data => {
         if (!data.ok) {
             alert(data.error || 'No se pudo actualizar la cantidad');
             return;
         }
         
-        console.log('✅ Cantidad actualizada:', data);
+        console.log('✅ Carrito actualizado:', data.resumen);
         
         // Actualizar UI inmediatamente sin recargar
-        const itemElement = document.querySelector(`button[onclick="cambiarCantidad(${itemId}, 'mas')"]`).closest('.item-carrito');
-        if (itemElement) {
-            // Actualizar el texto de precio x cantidad = subtotal
-            const precioElement = itemElement.querySelector('.info-carrito p:nth-child(2)');
+        data.items.forEach(item => {
+            const boton = document.querySelector(`button[onclick="cambiarCantidad(${item.id}, 'mas')"]`);
+            const precioElement = boton && boton.closest('.item-carrito').querySelector('.info-carrito p:nth-child(2)');
             if (precioElement) {
-                const precioFormateado = data.precio.toLocaleString('es-CO');
-                const subtotalFormateado = data.subtotal.toLocaleString('es-CO');
-                precioElement.innerHTML = `$${precioFormateado} x ${data.cantidad} = <strong>$${subtotalFormateado}</strong>`;
+                precioElement.innerHTML = `$${item.precio.toLocaleString('es-CO')} x ${item.cantidad} = <strong>$${item.subtotal.toLocaleString('es-CO')}</strong>`;
             }
-        }
+        });
         
         // Actualizar total del carrito en el footer
         const totalElement = document.querySelector('.carrito-total span');
         if (totalElement) {
-            totalElement.textContent = `$${data.total_carrito.toLocaleString('es-CO')}`;
+            totalElement.textContent = `$${data.resumen.total.toLocaleString('es-CO')}`;
         }
+        actualizarContadorCarrito(data.resumen.unidades);
     })
     .catch(error => {
         console.error('❌ Error:', error);
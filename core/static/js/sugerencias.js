@@ -0,0 +1,84 @@
+/**
+ * Autocompletado del buscador.
+ * Consulta /buscar/sugerencias/ (índice en memoria del servidor) mientras se
+ * escribe y muestra los productos bajo el campo de búsqueda.
+ */
+(function () {
+    const ESPERA_MS = 120;
+
+    function crearLista(form) {
+        const lista = document.createElement('ul');
+        lista.className = 'search-suggestions';
+        lista.style.cssText = 'position:absolute; top:100%; left:0; right:0; z-index:60; display:none; ' +
+            'background:#1a1a1a; border:1px solid #C0A76B; border-radius:8px; margin-top:4px; ' +
+            'max-height:360px; overflow-y:auto; list-style:none; padding:4px 0;';
+        form.style.position = 'relative';
+        form.appendChild(lista);
+        return lista;
+    }
+
+    function pintar(lista, resultados, urlProducto) {
+        lista.innerHTML = '';
+        resultados.forEach(producto => {
+            const item = document.createElement('li');
+            const enlace = document.createElement('a');
+            enlace.href = urlProducto.replace('/0/', `/${producto.id}/`);
+            enlace.style.cssText = 'display:flex; align-items:center; gap:10px; padding:6px 12px; color:#fff;';
+
+            if (producto.imagen) {
+                const img = document.createElement('img');
+                img.src = producto.imagen;
+                img.alt = '';
+                img.loading = 'lazy';
+                img.style.cssText = 'width:36px; height:36px; object-fit:cover; border-radius:4px;';
+                enlace.appendChild(img);
+            }
+
+            const nombre = document.createElement('span');
+            nombre.textContent = producto.nombre;
+            nombre.style.flex = '1';
+            const precio = document.createElement('span');
+            precio.textContent = `$${Math.round(Number(producto.precio)).toLocaleString('es-CO')}`;
+            precio.style.color = '#C0A76B';
+
+            enlace.append(nombre, precio);
+            item.appendChild(enlace);
+            lista.appendChild(item);
+        });
+        lista.style.display = resultados.length ? 'block' : 'none';
+    }
+
+    document.querySelectorAll('input[data-sugerencias-url]').forEach(input => {
+        const lista = crearLista(input.form);
+        let temporizador = null;
+        let controlador = null;
+
+        input.setAttribute('autocomplete', 'off');
+
+        input.addEventListener('input', () => {
+            clearTimeout(temporizador);
+            const texto = input.value.trim();
+            if (!texto) {
+                pintar(lista, [], '');
+                return;
+            }
+
+            temporizador = setTimeout(async () => {
+                // Cancela la petición anterior si el usuario siguió escribiendo
+                if (controlador) controlador.abort();
+                controlador = new AbortController();
+                try {
+                    const url = `${input.dataset.sugerenciasUrl}?q=${encodeURIComponent(texto)}`;
+                    const response = await fetch(url, { signal: controlador.signal });
+                    const data = await response.json();
+                    pintar(lista, data.resultados, input.dataset.productoUrl);
+                } catch (error) {
+                    if (error.name !== 'AbortError') console.error('Error cargando sugerencias:', error);
+                }
+            }, ESPERA_MS);
+        });
+
+        input.addEventListener('blur', () => setTimeout(() => { lista.style.display = 'none'; }, 150));
+        input.addEventListener('focus', () => { if (lista.children.length) lista.style.display = 'block'; });
+    });
+})();
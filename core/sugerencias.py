@@ -0,0 +1,212 @@
+"""
+Índice de prefijos en memoria para las sugerencias de búsqueda.
+
+Guarda una lista ordenada de claves normalizadas por tipo de coincidencia
+(nombre completo, cada palabra del nombre y la categoría) y la recorre con
+bisect deteniéndose al llenar el límite, así una consulta no toca la base de
+datos y su costo no depende del tamaño del catálogo. Se construye
+perezosamente la primera vez que se usa y se actualiza por producto con las
+señales post_save/post_delete (core/signals.py).
+
+Cada proceso tiene su propio índice: las señales solo llegan al proceso que
+guardó el producto, por eso además se reconstruye completo cada
+``VIGENCIA_INDICE`` segundos (también cubre ``QuerySet.update()``). La
+reconstrucción corre en un hilo: mientras tanto se sigue respondiendo con el
+índice vencido, que anota los cambios de las señales para pasárselos al nuevo
+antes de reemplazarlo.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.db import connection
+
+from carrito.models import Producto
+from .busqueda import normalizar
+
+LIMITE_SUGERENCIAS = 8
+MAX_SUGERENCIAS = 20
+VIGENCIA_INDICE = 600  # segundos
+
+# Orden de las coincidencias: primero las que empiezan el nombre
+COINCIDE_NOMBRE, COINCIDE_PALABRA, COINCIDE_CATEGORIA = TIPOS = range(3)
+
+
+class IndicePrefijos:
+    def __init__(self):
+        self._claves = {tipo: [] for tipo in TIPOS}  # tipo -> [(clave, producto_id)] ordenada
+        self._por_producto = {}  # producto_id -> [(tipo, (clave, producto_id))] que aportó
+        self._productos = {}     # producto_id -> datos que devuelve el endpoint
+        self._lock = threading.Lock()
+        self._cambios = None      # [(método, argumento)] anotados mientras se reconstruye
+        self._reemplazo = None    # índice nuevo al que se reenvían los cambios
+        self.construido_en = 0.0
+
+    def construir(self):
+        """Carga todo el catálogo con una sola consulta y reemplaza el índice."""
+        productos = Producto.objects.only('id', 'nombre', 'precio', 'imagen_url', 'imagen', 'categoria')
+        claves, por_producto, datos = {tipo: [] for tipo in TIPOS}, {}, {}
+        for producto in productos.iterator():
+            por_producto[producto.id] = self._claves_de(producto)
+            for tipo, clave in por_producto[producto.id]:
+                claves[tipo].append(clave)
+            datos[producto.id] = self._datos_de(producto)
+        for lista in claves.values():
+            lista.sort()
+
+        with self._lock:
+            self._claves, self._por_producto, self._productos = claves, por_producto, datos
+            self.construido_en = time.monotonic()
+
+    def actualizar(self, producto):
+        with self._lock:
+            if self._reemplazo is None:
+                self._anotar('actualizar', producto)
+                self._quitar(producto.id)
+                self._por_producto[producto.id] = self._claves_de(producto)
+                for tipo, clave in self._por_producto[producto.id]:
+                    insort(self._claves[tipo], clave)
+                self._productos[producto.id] = self._datos_de(producto)
+                return
+        self._reemplazo.actualizar(producto)
+
+    def eliminar(self, producto_id):
+        with self._lock:
+            if self._reemplazo is None:
+                self._anotar('eliminar', producto_id)
+                self._quitar(producto_id)
+                return
+        self._reemplazo.eliminar(producto_id)
+
+    def anotar_cambios(self):
+        """Empieza a guardar los cambios que un índice en construcción podría no ver"""
+        with self._lock:
+            self._cambios = []
+
+    def ceder_a(self, nuevo):
+        """Aplica a ``nuevo`` los cambios anotados y le reenvía los que lleguen después"""
+        with self._lock:
+            for metodo, argumento in self._cambios or ():
+                getattr(nuevo, metodo)(argumento)
+            self._cambios = None
+            self._reemplazo = nuevo
+
+    def descartar_cambios(self):
+        with self._lock:
+            self._cambios = None
+
+    def buscar(self, texto, limite=LIMITE_SUGERENCIAS):
+        """Retorna hasta ``limite`` productos cuyo nombre, palabra o categoría empieza por ``texto``."""
+        prefijo = normalizar(texto).strip()
+        if not prefijo:
+            return []
+
+        encontrados = {}
+        with self._lock:
+            for tipo in TIPOS:
+                claves = self._claves[tipo]
+                i = bisect_left(claves, (prefijo,))
+                while len(encontrados) < limite and i < len(claves) and claves[i][0].startswith(prefijo):
+                    producto_id = claves[i][1]
+                    if producto_id not in encontrados:
+                        encontrados[producto_id] = self._productos[producto_id]
+                    i += 1
+
+        return list(encontrados.values())
+
+    def _anotar(self, metodo, argumento):
+        if self._cambios is not None:
+            self._cambios.append((metodo, argumento))
+
+    def _quitar(self, producto_id):
+        for tipo, clave in self._por_producto.pop(producto_id, ()):
+            claves = self._claves[tipo]
+            i = bisect_left(claves, clave)
+            if i < len(claves) and claves[i] == clave:
+                del claves[i]
+        self._productos.pop(producto_id, None)
+
+    @staticmethod
+    def _claves_de(producto):
+        nombre = normalizar(producto.nombre)
+        claves = {(COINCIDE_NOMBRE, (nombre, producto.id))}
+        claves.update((COINCIDE_PALABRA, (palabra, producto.id)) for palabra in nombre.split()[1:])
+        claves.add((COINCIDE_CATEGORIA, (normalizar(producto.categoria or ''), producto.id)))
+        return list(claves)
+
+    @staticmethod
+    def _datos_de(producto):
+        imagen = producto.imagen_url or (producto.imagen.url if producto.imagen else None)
+        return {
+            'id': producto.id,
+            'nombre': producto.nombre,
+            'precio': str(producto.precio),
+            'imagen': imagen,
+        }
+
+
+_indice = None
+_lock_indice = threading.Lock()
+_reconstruyendo = False
+
+
+def obtener_indice():
+    """
+    Índice del proceso. La primera vez se construye en la petición; cuando
+    vence se sigue usando mientras un hilo arma el reemplazo.
+    """
+    global _indice
+    indice = _indice
+    if indice is None:
+        with _lock_indice:
+            if _indice is None:
+                nuevo = IndicePrefijos()
+                nuevo.construir()
+                _indice = nuevo
+            indice = _indice
+    elif time.monotonic() - indice.construido_en > VIGENCIA_INDICE:
+        programar_reconstruccion(indice)
+    return indice
+
+
+def programar_reconstruccion(vencido):
+    """Arranca un hilo que reconstruye el índice, si no hay otro en curso"""
+    global _reconstruyendo
+    with _lock_indice:
+        if _reconstruyendo:
+            return
+        _reconstruyendo = True
+    # Antes de la consulta del nuevo índice, para no perder lo que cambie durante la carga
+    vencido.anotar_cambios()
+
+    def reconstruir_en_hilo():
+        try:
+            reconstruir(vencido)
+        finally:
+            connection.close()
+
+    threading.Thread(target=reconstruir_en_hilo, daemon=True).start()
+
+
+def reconstruir(vencido):
+    """Construye un índice nuevo y lo pone en lugar de ``vencido``"""
+    global _indice, _reconstruyendo
+    try:
+        nuevo = IndicePrefijos()
+        nuevo.construir()
+        vencido.ceder_a(nuevo)
+        _indice = nuevo
+    except Exception as e:
+        vencido.descartar_cambios()
+        print(f"⚠️ Error reconstruyendo el índice de sugerencias: {e}")
+    finally:
+        _reconstruyendo = False
+
+
+def indice_construido():
+    """El índice existente (o None); las señales no lo construyen por su cuenta"""
+    return _indice
+
+
+def sugerir(texto, limite=LIMITE_SUGERENCIAS):
+    return obtener_indice().buscar(texto, limite)
@@ -0,0 +1,46 @@
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+# Ancho que ocupa una tarjeta en el grid del catálogo (1/2/3/4 columnas)
+TAMANOS_TARJETA = '(min-width: 1024px) 25vw, (min-width: 768px) 33vw, (min-width: 640px) 50vw, 100vw'
+
+
+@register.filter
+def srcset(obj, formato='webp'):
+    """'url 320w, url 640w, ...' con los derivados de un producto o variante"""
+    derivados = (getattr(obj, 'imagenes_derivadas', None) or {}).get(formato) or {}
+    return ', '.join(f'{url} {ancho}w' for ancho, url in sorted(derivados.items(), key=lambda d: int(d[0])))
+
+
+@register.inclusion_tag('core/fuentes_responsivas.html')
+def fuentes_responsivas(obj, tamanos=TAMANOS_TARJETA):
+    """<source> AVIF/WebP para usar dentro de <picture> antes del <img> original"""
+    derivados = getattr(obj, 'imagenes_derivadas', None) or {}
+    return {
+        'fuentes': [
+            {'tipo': f'image/{formato}', 'srcset': srcset(obj, formato)}
+            for formato in ('avif', 'webp') if derivados.get(formato)
+        ],
+        'tamanos': tamanos,
+    }
+
+
+@register.simple_tag
+def dimensiones(obj):
+    """width/height intrínsecos para que el navegador reserve el espacio antes de cargar"""
+    derivados = getattr(obj, 'imagenes_derivadas', None) or {}
+    if not derivados.get('ancho'):
+        return ''
+    return format_html('width="{}" height="{}"', derivados['ancho'], derivados['alto'])
+
+
+@register.filter
+def estilo_placeholder(obj):
+    """Fondo con el LQIP en línea; la imagen real lo tapa al terminar de cargar.
+    La URL va sin comillas (base64 no las necesita) para poder usarla también en JS."""
+    lqip = (getattr(obj, 'imagenes_derivadas', None) or {}).get('lqip')
+    if not lqip:
+        return ''
+    return f'background: url({lqip}) center / cover no-repeat;'
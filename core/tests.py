@@ -1,3 +1,319 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from carrito.models import Producto
+from .busqueda import buscar
+from .generaciones import GENERACION_CACHE_TIMEOUT, cache_por_generacion, clave_cache, timeout_cache
+from .middleware import estadisticas_cache_paginas
+from .paginacion import paginar_keyset
+from . import sugerencias
+
+
+class PaginacionKeysetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Precios repetidos para comprobar el desempate por id
+        for i in range(7):
+            Producto.objects.create(
+                nombre=f'Producto {i}', descripcion='', precio=Decimal(1000 * (i % 3)),
+                categoria=Producto.CategoriaEnum.MUJER, stock=1,
+            )
+
+    def _recorrer(self, orden):
+        ids, cursor = [], None
+        while True:
+            pagina = paginar_keyset(Producto.objects.all(), orden, cursor, tamano=3)
+            ids.extend(p.id for p in pagina)
+            if not pagina.tiene_siguiente:
+                return ids
+            cursor = pagina.siguiente_cursor
+
+    def test_recorre_todos_los_productos_sin_repetir(self):
+        for orden, campos in [('recientes', ('-id',)), ('precio_desc', ('-precio', '-id')), ('precio_asc', ('precio', 'id'))]:
+            esperado = list(Producto.objects.order_by(*campos).values_list('id', flat=True))
+            self.assertEqual(self._recorrer(orden), esperado)
+
+    def test_catalogo_pagina_devuelve_html_y_cursor(self):
+        primera = self.client.get(reverse('catalogo_pagina'), {'seccion': 'mujer'})
+        self.assertEqual(primera.status_code, 200)
+        self.assertEqual(len(primera.json()['productos']), 7)
+        self.assertIsNone(primera.json()['siguiente'])
+        self.assertIn('Producto 6', primera.json()['html'])
+
+        invalido = self.client.get(reverse('catalogo_pagina'), {'orden': 'precio_desc', 'cursor': 'x'})
+        self.assertEqual(invalido.status_code, 400)
+        self.assertEqual(self.client.get(reverse('catalogo_pagina'), {'seccion': 'nada'}).status_code, 400)
+
+    def test_listado_muestra_enlace_a_la_siguiente_pagina(self):
+        respuesta = self.client.get(reverse('mujeres'), {'orden': 'precio_asc'})
+        self.assertEqual(len(respuesta.context['productos']), 7)
+        self.assertNotContains(respuesta, 'catalogo-siguiente')
+
+
+class BusquedaTests(TestCase):
+    def setUp(self):
+        datos = [
+            ('Camisón de algodón', 'Ideal para dormir', Producto.CategoriaEnum.MUJER),
+            ('Pantalón clásico', 'Corte recto', Producto.CategoriaEnum.HOMBRE),
+            ('Tenis urbanos', 'Suela de camisón reciclado', Producto.CategoriaEnum.ZAPATOS),
+        ]
+        self.productos = [
+            Producto.objects.create(nombre=n, descripcion=d, categoria=c, precio=Decimal('1000'))
+            for n, d, c in datos
+        ]
+
+    def test_ignora_tildes_y_plurales_y_ordena_por_relevancia(self):
+        camison, _, tenis = self.productos
+        # La coincidencia en el nombre pesa más que en la descripción
+        self.assertEqual(buscar('camisones'), [camison, tenis])
+        self.assertEqual(buscar('PANTALON'), [self.productos[1]])
+
+    def test_tolera_errores_de_escritura(self):
+        self.assertEqual(buscar('pantalom'), [self.productos[1]])
+        self.assertEqual(buscar('   '), [])
+
+    def test_vista_de_resultados(self):
+        respuesta = self.client.get(reverse('buscar_productos'), {'q': 'tenis'})
+        self.assertEqual(list(respuesta.context['productos']), [self.productos[2]])
+
+
+class SugerenciasTests(TestCase):
+    def setUp(self):
+        sugerencias._indice = None
+        self.camisa = Producto.objects.create(
+            nombre='Camisa Blanca', descripcion='', precio=Decimal('50000'),
+            categoria=Producto.CategoriaEnum.HOMBRE, imagen_url='https://cdn/camisa.jpg',
+        )
+        self.blazer = Producto.objects.create(
+            nombre='Blazer', descripcion='', precio=Decimal('90000'), categoria=Producto.CategoriaEnum.MUJER,
+        )
+
+    def tearDown(self):
+        sugerencias._indice = None
+
+    def _nombres(self, texto):
+        respuesta = self.client.get(reverse('sugerencias_busqueda'), {'q': texto})
+        return [r['nombre'] for r in respuesta.json()['resultados']]
+
+    def test_prefijos_de_nombre_palabra_y_categoria_sin_consultas(self):
+        sugerencias.obtener_indice()
+        with self.assertNumQueries(0):
+            # El nombre que empieza por el prefijo va antes que la coincidencia por palabra
+            self.assertEqual(self._nombres('bl'), ['Blazer', 'Camisa Blanca'])
+            self.assertEqual(self._nombres('HOMB'), ['Camisa Blanca'])
+            self.assertEqual(self._nombres(''), [])
+
+        resultado = sugerencias.sugerir('cami')[0]
+        self.assertEqual(resultado, {
+            'id': self.camisa.id, 'nombre': 'Camisa Blanca', 'precio': '50000.00', 'imagen': 'https://cdn/camisa.jpg',
+        })
+
+    def test_se_actualiza_con_las_senales(self):
+        sugerencias.obtener_indice()
+        self.camisa.nombre = 'Camiseta Básica'
+        self.camisa.save()
+        self.blazer.delete()
+        Producto.objects.create(nombre='Bolso', descripcion='', precio=Decimal('1'))
+
+        self.assertEqual(self._nombres('basic'), ['Camiseta Básica'])
+        self.assertEqual(self._nombres('bl'), [])
+        self.assertEqual(self._nombres('b'), ['Bolso', 'Camiseta Básica'])
+
+    def test_vencido_se_sigue_usando_mientras_se_reconstruye(self):
+        vencido = sugerencias.obtener_indice()
+        vencido.construido_en -= sugerencias.VIGENCIA_INDICE + 1
+        with mock.patch.object(sugerencias, 'programar_reconstruccion') as programar, self.assertNumQueries(0):
+            self.assertIs(sugerencias.obtener_indice(), vencido)
+        programar.assert_called_once_with(vencido)
+
+        # Lo que guardan las señales durante la carga del nuevo índice no se pierde
+        vencido.anotar_cambios()
+        nuevo = sugerencias.IndicePrefijos()
+        nuevo.construir()
+        self.camisa.nombre = 'Camiseta Básica'
+        self.camisa.save()
+        vencido.ceder_a(nuevo)
+        self.blazer.delete()  # Ya se reenvía al nuevo
+        self.assertEqual([r['nombre'] for r in nuevo.buscar('b')], ['Camiseta Básica'])
+
+        # update() no dispara señales: solo lo ve la reconstrucción, que reemplaza el índice
+        Producto.objects.filter(pk=self.camisa.pk).update(nombre='Chaqueta')
+        sugerencias.reconstruir(vencido)
+        self.assertIsNot(sugerencias.obtener_indice(), vencido)
+        self.assertEqual(self._nombres('chaq'), ['Chaqueta'])
+
+
+class GeneracionesCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _productos_home(self):
+        return cache_por_generacion('prueba_home', [Producto], lambda: Producto.objects.only('id', 'nombre'))
+
+    def test_materializa_e_invalida_al_guardar_o_eliminar(self):
+        producto = Producto.objects.create(nombre='Falda', descripcion='', precio=Decimal('1'))
+        self.assertIsInstance(self._productos_home(), list)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._productos_home(), [producto])
+
+        producto.nombre = 'Falda larga'
+        producto.save()
+        self.assertEqual(self._productos_home()[0].nombre, 'Falda larga')
+
+        producto.delete()
+        self.assertEqual(self._productos_home(), [])
+
+    def test_la_clave_solo_cambia_con_los_modelos_de_los_que_depende(self):
+        from carrito.models import Pedido
+        clave = clave_cache('prueba', [Pedido])
+        Producto.objects.create(nombre='Falda', descripcion='', precio=Decimal('1'))
+        self.assertEqual(clave_cache('prueba', [Pedido]), clave)
+        self.assertNotEqual(clave_cache('prueba', [Producto, Pedido]), clave)
+
+    def test_ttl_largo_solo_con_cache_compartida(self):
+        # Con LocMem las invalidaciones no llegan a los demás procesos
+        with override_settings(CACHE_COMPARTIDA=False):
+            self.assertEqual(timeout_cache(60), 60)
+        with override_settings(CACHE_COMPARTIDA=True):
+            self.assertEqual(timeout_cache(60), GENERACION_CACHE_TIMEOUT)
+
+
+class CachePaginasAnonimasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.producto = Producto.objects.create(
+            nombre='Vestido', descripcion='', precio=Decimal('1000'), categoria=Producto.CategoriaEnum.MUJER,
+        )
+
+    def test_segunda_visita_anonima_sale_de_la_cache(self):
+        primera = self.client.get(reverse('mujeres'))
+        self.assertEqual(primera['X-Cache'], 'MISS')
+        self.assertIn('max-age', primera['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            segunda = self.client.get(reverse('mujeres'))
+        self.assertEqual(segunda['X-Cache'], 'HIT')
+        self.assertIn('Age', segunda)
+        self.assertEqual(segunda.content, primera.content)
+        self.assertEqual(estadisticas_cache_paginas()['aciertos'], 1)
+
+    def test_cambio_de_producto_purga_sus_paginas(self):
+        url = reverse('producto_detalle', args=[self.producto.id])
+        self.client.get(url)
+        self.client.get(reverse('mujeres'))
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        self.producto.en_oferta = True
+        self.producto.save()
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(reverse('mujeres'))['X-Cache'], 'MISS')
+
+    def test_no_cachea_usuarios_autenticados(self):
+        from carrito.models import UsuarioPersonalizado
+        usuario = UsuarioPersonalizado.objects.create_user(username='ana', password='x')
+        self.client.force_login(usuario)
+        self.client.get(reverse('mujeres'))
+        self.assertNotIn('X-Cache', self.client.get(reverse('mujeres')))
+
+
+class GetCondicionalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.producto = Producto.objects.create(nombre='Bolso', descripcion='', precio=Decimal('1000'))
+
+    def test_producto_detalle_responde_304_hasta_que_cambia_una_variante(self):
+        from carrito.models import ProductoVariante
+        url = reverse('producto_detalle', args=[self.producto.id])
+        primera = self.client.get(url)
+        self.assertIn('ETag', primera)
+        self.assertIn('Last-Modified', primera)
+
+        for _ in range(2):  # la segunda sale de la caché de páginas
+            respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+            self.assertEqual(respuesta.status_code, 304)
+
+        ProductoVariante.objects.create(producto=self.producto, talla='M', color='Negro', stock=1)
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], primera['ETag'])
+
+    def test_etag_de_la_pagina_cambia_con_el_carrito_y_los_favoritos(self):
+        from django.contrib.auth import get_user_model
+        from carrito.models import Carrito, ItemCarrito
+        usuario = get_user_model().objects.create_user(username='ana', password='x')
+        self.client.force_login(usuario)
+        otro = Producto.objects.create(nombre='Falda', descripcion='', precio=Decimal('500'))
+        url = reverse('producto_detalle', args=[self.producto.id])
+        primera = self.client.get(url)
+        # Con sesión la fecha del producto no basta: solo se valida con el ETag
+        self.assertNotIn('Last-Modified', primera)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag']).status_code, 304)
+
+        carrito, _ = Carrito.objects.get_or_create(usuario=usuario)
+        ItemCarrito.objects.create(carrito=carrito, producto=otro, cantidad=1)
+        segunda = self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(segunda.status_code, 200)
+
+        self.client.post(reverse('toggle_favorito', args=[otro.id]))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=segunda['ETag']).status_code, 200)
+
+    def test_api_variantes_usa_if_modified_since_y_sitemap_lastmod(self):
+        url = reverse('api_variantes_producto', args=[self.producto.id])
+        primera = self.client.get(url)
+        respuesta = self.client.get(url, HTTP_IF_MODIFIED_SINCE=primera['Last-Modified'])
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(self.client.get(reverse('api_variantes_producto', args=[999])).status_code, 200)
+
+        from .sitemaps import ProductoSitemap
+        self.producto.refresh_from_db()
+        self.assertEqual(ProductoSitemap().lastmod(ProductoSitemap().items()[0]), self.producto.updated_at)
+
+
+class DerivadosImagenTests(TestCase):
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=self.media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        cache.clear()
+
+    def test_genera_anchos_con_nombres_deterministas_y_srcset(self):
+        import io
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .utils.derivados import FORMATOS_DERIVADOS, actualizar_derivados, necesita_derivados, ruta_derivado
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 1000), 'red').save(buffer, 'PNG')
+        producto = Producto.objects.create(
+            nombre='Gorra', descripcion='', precio=Decimal('1'), categoria=Producto.CategoriaEnum.HOMBRE,
+            imagen=SimpleUploadedFile('gorra.png', buffer.getvalue(), content_type='image/png'),
+        )
+        self.assertTrue(necesita_derivados(producto))
+
+        self.assertTrue(actualizar_derivados(Producto, producto.id))
+        producto.refresh_from_db()
+        derivados = producto.imagenes_derivadas
+        self.assertFalse(necesita_derivados(producto))
+        self.assertEqual(derivados['origen'], producto.imagen.url)
+        for formato in FORMATOS_DERIVADOS:
+            # Nunca se amplía: 1024 no se genera para un original de 800px
+            self.assertEqual(sorted(derivados[formato], key=int), ['320', '640'])
+            self.assertTrue(derivados[formato]['320'].endswith(ruta_derivado('producto', derivados['origen'], 320, formato)))
+
+        respuesta = self.client.get(reverse('hombres'))
+        self.assertContains(respuesta, f'type="image/{FORMATOS_DERIVADOS[0]}"')
+        self.assertContains(respuesta, f"{derivados[FORMATOS_DERIVADOS[0]]['640']} 640w")
+
+        # Placeholder en línea y dimensiones intrínsecas para evitar saltos de layout
+        self.assertTrue(derivados['lqip'].startswith('data:image/'))
+        self.assertLess(len(derivados['lqip']), 1400)
+        self.assertContains(respuesta, 'width="800" height="1000"')
+        self.assertContains(respuesta, f"background: url({derivados['lqip']})")
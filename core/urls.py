@@ -28,6 +28,8 @@ urlpatterns = [
     path('producto/<int:producto_id>/', views.producto_detalle, name='producto_detalle'),
     path('producto/<int:producto_id>/', views.producto_detalle, name='producto'),  # Alias para compatibilidad
     path('buscar/', views.buscar_productos, name='buscar_productos'),
+    path('buscar/sugerencias/', views.sugerencias_busqueda, name='sugerencias_busqueda'),
     path('catalogo/', views.catalogo_completo, name='catalogo_completo'),
+    path('catalogo/pagina/', views.catalogo_pagina, name='catalogo_pagina'),
   
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
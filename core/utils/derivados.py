@@ -0,0 +1,166 @@
+"""
+Derivados responsivos de las imágenes de productos y variantes.
+
+A partir de la imagen original se generan varios anchos en AVIF y WebP (si
+Pillow los soporta) con nombres deterministas, se suben junto al original
+(Supabase o MEDIA_ROOT) y se guardan en ``imagenes_derivadas`` del modelo:
+
+    {"origen": "<url original>", "ancho": 1200, "alto": 1600,
+     "lqip": "data:image/webp;base64,...",
+     "webp": {"320": "<url>", "640": "<url>", ...}, "avif": {...}}
+
+``ancho``/``alto`` son las dimensiones intrínsecas (width/height del <img>, sin
+saltos de layout) y ``lqip`` una miniatura borrosa de menos de 1 KB que las
+plantillas ponen en línea como fondo mientras carga la imagen real.
+
+La generación corre en un hilo al confirmar la transacción (ver
+core/signals.py), nunca durante la petición que guardó el producto.
+"""
+import base64
+import hashlib
+import io
+import os
+import threading
+
+import requests
+from PIL import Image, ImageFilter, ImageOps, features
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .supabase_storage import subir_bytes_a_supabase
+
+ANCHOS_DERIVADOS = (320, 640, 1024)
+# El primero que soporte el navegador gana, así que AVIF va antes
+FORMATOS_DERIVADOS = tuple(f for f in ('avif', 'webp') if features.check(f))
+CALIDAD = {'avif': 55, 'webp': 78}
+# Miniatura para el placeholder: el navegador la escala y el blur oculta los píxeles
+ANCHO_LQIP = 16
+FORMATO_LQIP = 'webp' if features.check('webp') else 'jpeg'
+
+
+def origen_imagen(obj):
+    """URL de la imagen original de un producto o variante (None si no tiene)"""
+    if obj.imagen_url:
+        return obj.imagen_url
+    return obj.imagen.url if obj.imagen else None
+
+
+def ruta_derivado(carpeta, origen, ancho, formato):
+    """Ruta determinista: la misma imagen original siempre produce los mismos nombres"""
+    huella = hashlib.sha1(origen.encode()).hexdigest()[:16]
+    return f'derivados/{carpeta}/{huella}-{ancho}w.{formato}'
+
+
+def cargar_imagen(origen):
+    if origen.startswith('http'):
+        respuesta = requests.get(origen, timeout=15)
+        respuesta.raise_for_status()
+        return Image.open(io.BytesIO(respuesta.content))
+
+    if origen.startswith(settings.MEDIA_URL):
+        ruta = os.path.join(settings.MEDIA_ROOT, origen[len(settings.MEDIA_URL):])
+    else:
+        ruta = os.path.join(settings.BASE_DIR, origen.lstrip('/'))
+    return Image.open(ruta)
+
+
+def _guardar(ruta, contenido, formato):
+    url = subir_bytes_a_supabase(ruta, contenido, f'image/{formato}')
+    if url:
+        return url
+    # Sin Supabase: almacenamiento local con el mismo nombre determinista
+    if default_storage.exists(ruta):
+        default_storage.delete(ruta)
+    return default_storage.url(default_storage.save(ruta, ContentFile(contenido)))
+
+
+def generar_placeholder(imagen):
+    """Data URI de una miniatura borrosa (LQIP) de ``imagen``; pesa unos cientos de bytes"""
+    ancho, alto = imagen.size
+    miniatura = imagen.resize((ANCHO_LQIP, max(1, round(alto * ANCHO_LQIP / ancho))), Image.BILINEAR)
+    buffer = io.BytesIO()
+    miniatura.filter(ImageFilter.GaussianBlur(1)).save(buffer, FORMATO_LQIP.upper(), quality=40)
+    return f'data:image/{FORMATO_LQIP};base64,{base64.b64encode(buffer.getvalue()).decode()}'
+
+
+def generar_derivados(origen, carpeta):
+    """Genera y sube todos los derivados de ``origen``; retorna el dict para imagenes_derivadas"""
+    imagen = ImageOps.exif_transpose(cargar_imagen(origen)).convert('RGB')
+    ancho_original, alto_original = imagen.size
+    datos = {
+        'origen': origen, 'ancho': ancho_original, 'alto': alto_original,
+        'lqip': generar_placeholder(imagen),
+    }
+
+    # Nunca se amplía: el ancho más grande útil es el del original
+    anchos = [a for a in ANCHOS_DERIVADOS if a < ancho_original] or [ancho_original]
+    for formato in FORMATOS_DERIVADOS:
+        datos[formato] = {}
+        for ancho in anchos:
+            copia = imagen.resize((ancho, round(alto_original * ancho / ancho_original)), Image.LANCZOS)
+            buffer = io.BytesIO()
+            copia.save(buffer, formato.upper(), quality=CALIDAD[formato])
+            datos[formato][str(ancho)] = _guardar(ruta_derivado(carpeta, origen, ancho, formato), buffer.getvalue(), formato)
+    return datos
+
+
+def actualizar_derivados(modelo, pk):
+    """
+    Genera los derivados de un producto o variante y los guarda si la imagen no
+    cambió mientras tanto. Retorna True si se actualizaron.
+    """
+    from carrito.models import Producto
+    from core.generaciones import incrementar_generacion
+    from core.middleware import ambito_producto
+
+    es_producto = modelo is Producto
+    obj = modelo.objects.get(pk=pk)
+    origen = origen_imagen(obj)
+    if not origen:
+        return False
+
+    datos = generar_derivados(origen, modelo._meta.model_name)
+    # update() condicional: no pisar los derivados de una imagen más nueva
+    misma_imagen = {'imagen_url': obj.imagen_url} if obj.imagen_url else {'imagen': obj.imagen.name}
+    actualizados = modelo.objects.filter(pk=pk, **misma_imagen).update(
+        imagenes_derivadas=datos, updated_at=timezone.now()
+    )
+    if not actualizados:
+        return False
+
+    producto_id = pk if es_producto else obj.producto_id
+    if not es_producto:
+        Producto.marcar_modificados([producto_id])
+    incrementar_generacion(modelo)
+    incrementar_generacion(ambito_producto(producto_id))
+    return True
+
+
+def necesita_derivados(instancia, update_fields=None):
+    """True si la imagen actual no tiene derivados (o placeholder) generados"""
+    if update_fields is not None and not {'imagen', 'imagen_url'} & set(update_fields):
+        return False
+    if {'imagen', 'imagen_url'} & instancia.get_deferred_fields():
+        return False
+    origen = origen_imagen(instancia)
+    derivados = instancia.imagenes_derivadas or {}
+    return bool(origen) and (derivados.get('origen') != origen or 'lqip' not in derivados)
+
+
+def programar_derivados(instancia):
+    """Genera los derivados en segundo plano después del commit"""
+    modelo, pk = type(instancia), instancia.pk
+
+    def generar():
+        try:
+            if actualizar_derivados(modelo, pk):
+                print(f"🖼️ Derivados generados para {modelo._meta.model_name} {pk}")
+        except Exception as e:
+            print(f"⚠️ Error generando derivados de {modelo._meta.model_name} {pk}: {e}")
+        finally:
+            connection.close()
+
+    transaction.on_commit(lambda: threading.Thread(target=generar, daemon=True).start())
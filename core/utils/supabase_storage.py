@@ -52,6 +52,24 @@ def subir_a_supabase(imagen):
     except Exception as e:
         print(f"⚠️ Error al subir imagen a Supabase: {e}")
         return None
+
+
+def subir_bytes_a_supabase(ruta, contenido, content_type):
+    """
+    Sube contenido ya generado (p. ej. derivados de una imagen) a una ruta fija
+    del bucket, reemplazándolo si existe. Retorna la URL pública o None.
+    """
+    if not USE_SUPABASE or not supabase:
+        return None
+
+    try:
+        supabase.storage.from_("media").upload(
+            ruta, contenido, {"content-type": content_type, "upsert": "true"}
+        )
+        return supabase.storage.from_("media").get_public_url(ruta)
+    except Exception as e:
+        print(f"⚠️ Error al subir {ruta} a Supabase: {e}")
+        return None
     
 def eliminar_de_supabase(nombre_archivo):
     """Elimina un archivo del bucket de Supabase."""
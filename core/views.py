@@ -1,28 +1,32 @@
 from django.contrib.auth import logout, authenticate, login
 from django.shortcuts import render, HttpResponse, redirect, get_object_or_404
 from django.http import JsonResponse
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
 from django.db.models import Q
 from .forms import LoginForm, RegistroForm, TwoFactorVerifyForm
 from carrito.models import Producto, Pedido, UsuarioPersonalizado
+from .busqueda import buscar
+from .condicional import etag_pagina_producto, ultima_modificacion_pagina_producto
+from .generaciones import cache_por_generacion
+from .favoritos import es_favorito, invalidar_favoritos, obtener_favoritos_ids
+from .paginacion import CursorInvalido, normalizar_orden, paginar_keyset
+from .sugerencias import LIMITE_SUGERENCIAS, MAX_SUGERENCIAS, sugerir
 import pyotp
 import qrcode
 import io
 import base64
 
+# Campos que necesitan las tarjetas del catálogo para mostrar "AGOTADO" sin consultas extra
+CAMPOS_DISPONIBILIDAD = ('stock', 'tiene_stock', 'cantidad_variantes')
+
 
 def home(request):
-    from django.core.cache import cache
-    
-    cache_key = 'home_productos'
-    productos = cache.get(cache_key)
-    
-    if productos is None:
-        productos = Producto.objects.all().only(
-            'id', 'nombre', 'precio', 'imagen_url', 'categoria'
-        )[:20]  # Limitar productos iniciales
-        cache.set(cache_key, productos, 300)  # Cache 5 minutos
+    # Se invalida al cambiar cualquier producto (core/generaciones.py)
+    productos = cache_por_generacion('home_productos', [Producto], lambda: Producto.objects.all().only(
+        'id', 'nombre', 'precio', 'imagen_url', 'categoria'
+    )[:20])  # Limitar productos iniciales
     
     return render(request, "core/home.html", {'productos': productos})
 
@@ -30,53 +34,88 @@ def home(request):
 def about(request):
     return render(request, "about.html",{})
 
-def catalogo_completo(request):
-    """Vista que muestra todos los productos de todas las categorías"""
-    productos = Producto.objects.all().only(
-        'id', 'nombre', 'precio', 'imagen_url', 'destacado', 'categoria', 'descripcion', 'en_oferta'
+def _productos_seccion(seccion):
+    """Queryset base de cada listado del catálogo (None si la sección no existe)"""
+    productos = Producto.objects.only(
+        'id', 'nombre', 'precio', 'imagen_url', 'imagen', 'imagenes_derivadas', 'destacado', 'en_oferta',
+        *CAMPOS_DISPONIBILIDAD
     )
+    if seccion == 'todos':
+        return productos
+    if seccion == 'ofertas':
+        return productos.filter(en_oferta=True)
+    if seccion in Producto.CategoriaEnum.values:
+        return productos.filter(categoria=seccion)
+    return None
+
+
+def _render_listado(request, seccion, template):
+    """Renderiza la primera página (o la indicada por ?cursor=) de un listado"""
+    orden = normalizar_orden(request.GET.get('orden'))
+    try:
+        pagina = paginar_keyset(_productos_seccion(seccion), orden, request.GET.get('cursor'))
+    except CursorInvalido:
+        pagina = paginar_keyset(_productos_seccion(seccion), orden)
+    
+    return render(request, template, {
+        'productos': pagina,
+        'pagina': pagina,
+        'seccion': seccion,
+        'orden': orden,
+    })
+
+
+def catalogo_pagina(request):
+    """
+    Siguiente página de un listado para el scroll infinito.
     
-    # Prefetch favoritos si el usuario está autenticado
-    if request.user.is_authenticated:
-        productos = productos.prefetch_related('favorited_by')
+    GET: seccion (todos|hombre|mujer|zapatos|ofertas), orden y cursor.
+    Responde JSON con el fragmento HTML de las tarjetas y el cursor siguiente.
+    """
+    seccion = request.GET.get('seccion', 'todos')
+    productos = _productos_seccion(seccion)
+    if productos is None:
+        return JsonResponse({'error': 'Sección no válida'}, status=400)
     
-    return render(request, 'core/catalogo_completo.html', {
-        'productos': productos
+    orden = normalizar_orden(request.GET.get('orden'))
+    try:
+        pagina = paginar_keyset(productos, orden, request.GET.get('cursor'))
+    except CursorInvalido:
+        return JsonResponse({'error': 'Cursor no válido'}, status=400)
+    
+    html = render_to_string('core/tarjetas_productos.html', {'productos': pagina}, request=request)
+    return JsonResponse({
+        'html': html,
+        'siguiente': pagina.siguiente_cursor,
+        'productos': [
+            {
+                'id': p.id,
+                'nombre': p.nombre,
+                'precio': str(p.precio),
+                'imagen_url': p.imagen_url,
+                'disponible': p.tiene_stock_disponible(),
+            }
+            for p in pagina
+        ],
     })
 
+
+def catalogo_completo(request):
+    """Vista que muestra todos los productos de todas las categorías"""
+    return _render_listado(request, 'todos', 'core/catalogo_completo.html')
+
 def index(request):
-    from carrito.models import ProductoVariante
-    from django.db.models import Exists, OuterRef
-    
     # Cargar productos destacados (para "Lo Más Vendido") - Límite de 12 productos
-    productos = Producto.objects.filter(destacado=True).annotate(
-        tiene_stock=Exists(
-            ProductoVariante.objects.filter(
-                producto=OuterRef('pk'),
-                stock__gt=0
-            )
-        )
-    ).only(
-        'id', 'nombre', 'precio', 'imagen_url', 'destacado', 'categoria', 'stock'
+    # tiene_stock es el resumen desnormalizado de las variantes (sin subconsulta)
+    productos = Producto.objects.filter(destacado=True).only(
+        'id', 'nombre', 'precio', 'imagen_url', 'destacado', 'categoria', 'stock', 'tiene_stock'
     )[:12]  # Máximo 12 productos en carrusel "Lo Más Vendido"
     
     # Cargar productos en oferta (para "Ofertas Especiales") - Límite de 9 productos
-    productos_ofertas = Producto.objects.filter(en_oferta=True).annotate(
-        tiene_stock=Exists(
-            ProductoVariante.objects.filter(
-                producto=OuterRef('pk'),
-                stock__gt=0
-            )
-        )
-    ).only(
-        'id', 'nombre', 'precio', 'imagen_url', 'en_oferta', 'stock'
+    productos_ofertas = Producto.objects.filter(en_oferta=True).only(
+        'id', 'nombre', 'precio', 'imagen_url', 'en_oferta', 'stock', 'tiene_stock'
     )[:9]  # Máximo 9 productos en carrusel "Ofertas"
     
-    # Prefetch favoritos si el usuario está autenticado
-    if request.user.is_authenticated:
-        productos = productos.prefetch_related('favorited_by')
-        productos_ofertas = productos_ofertas.prefetch_related('favorited_by')
-    
     return render(request, 'index.html', {
         'productos': productos,
         'productos_ofertas': productos_ofertas
@@ -153,19 +192,11 @@ def dashboard_view(request):
     return render(request, 'dashboard/dashboard.html')
 
 def admin_dashboard(request):
-    from django.core.cache import cache
-    
-    # Cachear contadores por 60 segundos
-    cache_key = 'dashboard_stats'
-    stats = cache.get(cache_key)
-    
-    if stats is None:
-        stats = {
-            'total_usuarios': UsuarioPersonalizado.objects.count(),
-            'total_productos': Producto.objects.count(),
-            'total_pedidos': Pedido.objects.count(),
-        }
-        cache.set(cache_key, stats, 60)
+    stats = cache_por_generacion('dashboard_stats', [UsuarioPersonalizado, Producto, Pedido], lambda: {
+        'total_usuarios': UsuarioPersonalizado.objects.count(),
+        'total_productos': Producto.objects.count(),
+        'total_pedidos': Pedido.objects.count(),
+    }, timeout_local=60)
     
     return render(request, 'dashboard/dashboard.html', stats)
 def gestion_productos(request):
@@ -217,23 +248,8 @@ def contact(request):
 
 def buscar_productos(request):
     query = request.GET.get('q', '').strip()
-    productos = []
-
-    if query:
-        # Búsqueda más precisa por nombre
-        productos = Producto.objects.filter(nombre__iexact=query).only(
-            'id', 'nombre', 'precio', 'imagen_url', 'categoria'
-        )[:50]  # Limitar a 50 resultados
-        
-        # Si no encuentra resultados exactos, busca coincidencias parciales
-        if not productos.exists():
-            productos = Producto.objects.filter(
-                Q(nombre__icontains=query) |
-                Q(descripcion__icontains=query) |
-                Q(categoria__icontains=query)
-            ).only(
-                'id', 'nombre', 'precio', 'imagen_url', 'categoria'
-            )[:50]  # Limitar a 50 resultados
+    # Ordenados por relevancia (texto completo + trigramas, ver core/busqueda.py)
+    productos = buscar(query)
 
     context = {
         'productos': productos,
@@ -243,6 +259,21 @@ def buscar_productos(request):
     return render(request, 'core/resultados_busqueda.html', context)
 
 
+def sugerencias_busqueda(request):
+    """
+    Autocompletado del buscador.
+    
+    GET: q (prefijo) y limite opcional. Se responde desde el índice en memoria
+    de core/sugerencias.py, sin consultar la base de datos.
+    """
+    try:
+        limite = min(int(request.GET.get('limite', LIMITE_SUGERENCIAS)), MAX_SUGERENCIAS)
+    except ValueError:
+        limite = LIMITE_SUGERENCIAS
+    
+    return JsonResponse({'resultados': sugerir(request.GET.get('q', ''), max(limite, 1))})
+
+
 from django.views.generic import ListView
 from .models import Reporte
 import openpyxl
@@ -327,49 +358,20 @@ def exportar_pdf(request):
     return response
 
 def hombres(request):
-    # Optimizado: solo cargar campos necesarios y usar caché
-    productos = Producto.objects.filter(categoria=Producto.CategoriaEnum.HOMBRE).only(
-        'id', 'nombre', 'precio', 'imagen_url', 'destacado', 'en_oferta'
-    )
-    
-    # Prefetch favoritos si el usuario está autenticado
-    if request.user.is_authenticated:
-        productos = productos.prefetch_related('favorited_by')
-    
-    return render(request, "core/hombres.html", {"productos": productos})
+    # Paginado por keyset: cada página cuesta lo mismo sin importar su profundidad
+    return _render_listado(request, Producto.CategoriaEnum.HOMBRE, "core/hombres.html")
 
 
 def mujeres(request):
-    productos = Producto.objects.filter(categoria=Producto.CategoriaEnum.MUJER).only(
-        'id', 'nombre', 'precio', 'imagen_url', 'destacado', 'en_oferta'
-    )
-    
-    if request.user.is_authenticated:
-        productos = productos.prefetch_related('favorited_by')
-    
-    return render(request, "core/mujeres.html", {"productos": productos})
+    return _render_listado(request, Producto.CategoriaEnum.MUJER, "core/mujeres.html")
 
 
 def zapatos(request):
-    productos = Producto.objects.filter(categoria=Producto.CategoriaEnum.ZAPATOS).only(
-        'id', 'nombre', 'precio', 'imagen_url', 'destacado', 'en_oferta'
-    )
-    
-    if request.user.is_authenticated:
-        productos = productos.prefetch_related('favorited_by')
-    
-    return render(request, "core/zapatos.html", {"productos": productos})
+    return _render_listado(request, Producto.CategoriaEnum.ZAPATOS, "core/zapatos.html")
 
 
 def ofertas(request):
-    productos = Producto.objects.filter(en_oferta=True).only(
-        'id', 'nombre', 'precio', 'imagen_url', 'destacado', 'en_oferta'
-    )
-    
-    if request.user.is_authenticated:
-        productos = productos.prefetch_related('favorited_by')
-    
-    return render(request, "core/ofertas.html", {"productos": productos})
+    return _render_listado(request, 'ofertas', "core/ofertas.html")
 
 
 @login_required
@@ -384,7 +386,7 @@ def toggle_favorito(request, producto_id):
         usuario = request.user
         
         # Verificar si el producto ya está en favoritos
-        if producto in usuario.favoritos.all():
+        if es_favorito(usuario, producto.id):
             usuario.favoritos.remove(producto)
             is_favorito = False
             mensaje = 'Producto eliminado de favoritos'
@@ -392,9 +394,10 @@ def toggle_favorito(request, producto_id):
             usuario.favoritos.add(producto)
             is_favorito = True
             mensaje = 'Producto agregado a favoritos'
+        invalidar_favoritos(usuario)
         
         # Contar favoritos actualizados
-        total_favoritos = usuario.favoritos.count()
+        total_favoritos = len(obtener_favoritos_ids(usuario))
         
         print(f"✓ Toggle favorito - Usuario: {usuario.username}, Producto: {producto.nombre}, Is_favorito: {is_favorito}, Total: {total_favoritos}")
         
@@ -421,6 +424,7 @@ def mis_deseos(request):
     return render(request, 'core/mis_deseos.html', {'productos': productos})
 
 
+@condition(etag_func=etag_pagina_producto, last_modified_func=ultima_modificacion_pagina_producto)
 def producto_detalle(request, producto_id):
     """Vista de detalle del producto con todas sus variantes"""
     from carrito.models import ProductoVariante
@@ -436,17 +440,12 @@ def producto_detalle(request, producto_id):
         tallas_disponibles = sorted(list(set(v.talla for v in variantes if v.talla)))
         colores_disponibles = sorted(list(set(v.color for v in variantes if v.color)))
         
-        # Verificar si es favorito
-        es_favorito = False
-        if request.user.is_authenticated:
-            es_favorito = request.user.favoritos.filter(id=producto.id).exists()
-        
         context = {
             'producto': producto,
             'variantes': variantes,
             'tallas_disponibles': tallas_disponibles,
             'colores_disponibles': colores_disponibles,
-            'es_favorito': es_favorito,
+            'es_favorito': es_favorito(request.user, producto.id),
         }
         
         # Si se solicita desde AJAX o con parámetro modal=true, devolver solo el contenido
@@ -1,6 +1,6 @@
 # Script para crear pedidos de prueba
 
-from carrito.models import Pedido, Producto, UsuarioPersonalizado
+from carrito.models import Pedido, PedidoLinea, Producto, UsuarioPersonalizado
 from decimal import Decimal
 
 # Obtener usuario y producto
@@ -50,8 +50,14 @@ try:
         ]
         
         for datos in pedidos_prueba:
+            producto_linea = datos.pop('producto')
+            cantidad = datos.pop('cantidad')
             pedido = Pedido(**datos)
             pedido.save()
+            PedidoLinea.objects.create(
+                pedido=pedido, producto=producto_linea, cantidad=cantidad,
+                precio_unitario=producto_linea.precio, subtotal=datos['total'],
+            )
             print(f"Pedido {pedido.numero} creado: {pedido.get_estado_display()}")
         
         print(f"\n✅ {len(pedidos_prueba)} pedidos de prueba creados exitosamente")
@@ -0,0 +1,58 @@
+"""
+Comando de Django para generar los derivados responsivos (AVIF/WebP en varios
+anchos), el placeholder LQIP y las dimensiones de las imágenes de productos y
+variantes que aún no los tienen.
+
+Uso:
+    python manage.py generar_imagenes_derivadas              # Solo las que faltan
+    python manage.py generar_imagenes_derivadas --todas      # Regenerar todas
+    python manage.py generar_imagenes_derivadas --limite 50  # Máximo 50 por modelo
+    python manage.py generar_imagenes_derivadas --hilos 8    # 8 imágenes en paralelo
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from carrito.models import Producto, ProductoVariante
+from core.utils.derivados import actualizar_derivados, necesita_derivados
+
+
+def _procesar(modelo, pk):
+    # Cada hilo abre su propia conexión; se cierra al terminar cada imagen
+    try:
+        return actualizar_derivados(modelo, pk)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Genera derivados AVIF/WebP, placeholder LQIP y dimensiones de las imágenes de productos y variantes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true', help='Regenerar aunque ya existan derivados')
+        parser.add_argument('--limite', type=int, default=None, help='Máximo de imágenes por modelo')
+        parser.add_argument('--hilos', type=int, default=4, help='Imágenes procesadas en paralelo (default: 4)')
+
+    def handle(self, *args, **options):
+        hilos = max(1, options['hilos'])
+        for modelo in (Producto, ProductoVariante):
+            objetos = modelo.objects.only('id', 'imagen', 'imagen_url', 'imagenes_derivadas').order_by('id')
+            pendientes = [o.pk for o in objetos.iterator() if options['todas'] or necesita_derivados(o)]
+            if options['limite'] is not None:
+                pendientes = pendientes[:options['limite']]
+
+            generados = errores = 0
+            # Descarga y codificación liberan el GIL: los hilos sí paralelizan
+            with ThreadPoolExecutor(max_workers=hilos) as pool:
+                futuros = {pool.submit(_procesar, modelo, pk): pk for pk in pendientes}
+                for futuro in as_completed(futuros):
+                    try:
+                        generados += futuro.result()
+                    except Exception as e:
+                        errores += 1
+                        self.stdout.write(self.style.WARNING(f'⚠️ {modelo._meta.model_name} {futuros[futuro]}: {e}'))
+
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ {modelo._meta.verbose_name_plural}: {generados} con derivados nuevos, {errores} error(es)'
+            ))
@@ -0,0 +1,49 @@
+"""
+Comando de Django para liberar las reservas de stock de checkouts que vencieron
+sin confirmación de pago. Pensado para correr cada minuto (cron o similar).
+
+Uso:
+    python manage.py liberar_reservas_vencidas                # Libera en lotes de 1000
+    python manage.py liberar_reservas_vencidas --lote 200     # Lotes más pequeños
+    python manage.py liberar_reservas_vencidas --recalcular   # Además repara stock_reservado
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from carrito.models import ProductoVariante
+from pagos.reservas import liberar_reservas_vencidas, stock_reservado_activo
+
+
+class Command(BaseCommand):
+    help = 'Libera las reservas de stock vencidas y devuelve sus unidades a las variantes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Reservas liberadas por transacción (default: 1000)')
+        parser.add_argument(
+            '--recalcular', action='store_true',
+            help='Recalcula stock_reservado de todas las variantes a partir de las reservas activas',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        # Lotes cortos: cada transacción bloquea pocas filas y los checkouts no esperan
+        while True:
+            liberadas = liberar_reservas_vencidas(options['lote'])
+            total += liberadas
+            if liberadas < options['lote']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} reserva(s) vencida(s) liberada(s)'))
+
+        if options['recalcular']:
+            with transaction.atomic():
+                # Bloquear las variantes espera a los checkouts en curso y frena los nuevos
+                list(ProductoVariante.objects.select_for_update().values_list('id', flat=True))
+                activas = stock_reservado_activo()
+                reparadas = ProductoVariante.objects.update(stock_reservado=Case(
+                    *(When(pk=variante_id, then=Value(unidades)) for variante_id, unidades in activas.items()),
+                    default=Value(0),
+                    output_field=IntegerField(),
+                ))
+            self.stdout.write(self.style.SUCCESS(f'✅ stock_reservado recalculado en {reparadas} variante(s)'))
@@ -0,0 +1,73 @@
+"""
+Comando de Django que aplica los eventos de Wompi guardados por el webhook
+(pagos/bandeja.py). Se pueden correr varios procesos a la vez: cada uno toma
+eventos distintos con SELECT ... FOR UPDATE SKIP LOCKED.
+
+Uso:
+    python manage.py procesar_webhooks                      # Worker continuo
+    python manage.py procesar_webhooks --una-vez            # Vacía la bandeja y termina (cron)
+    python manage.py procesar_webhooks --lote 100 --intervalo 0.5
+    python manage.py procesar_webhooks --metricas           # Solo imprime backlog y latencias
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from pagos.bandeja import MAX_INTENTOS, metricas_bandeja, procesar_lote
+
+
+class Command(BaseCommand):
+    help = 'Procesa la bandeja de eventos de Wompi y reporta backlog y latencia'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=50, help='Eventos por transacción (default: 50)')
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera con la bandeja vacía (default: 1)')
+        parser.add_argument('--max-intentos', type=int, default=MAX_INTENTOS, help=f'Fallos antes de marcar un evento como error (default: {MAX_INTENTOS})')
+        parser.add_argument('--metricas-cada', type=float, default=60.0, help='Segundos entre reportes de métricas (default: 60)')
+        parser.add_argument('--una-vez', action='store_true', help='Termina cuando no quedan eventos disponibles')
+        parser.add_argument('--metricas', action='store_true', help='Imprime las métricas de la bandeja y termina')
+
+    def reportar(self):
+        m = metricas_bandeja()
+        latencia = (
+            f"p50 {m['latencia_p50_s']:.2f}s · p95 {m['latencia_p95_s']:.2f}s ({m['procesados_ventana']} eventos)"
+            if m['procesados_ventana'] else 'sin eventos recientes'
+        )
+        self.stdout.write(
+            f"📊 Bandeja: {m['pendientes']} pendiente(s), {m['errores']} con error, "
+            f"atraso {m['antiguedad_s']:.1f}s · latencia {latencia}"
+        )
+
+    def handle(self, *args, **options):
+        if options['metricas']:
+            self.reportar()
+            return
+
+        total_procesados = total_fallidos = 0
+        ultimo_reporte = time.monotonic()
+        try:
+            while True:
+                # Proceso de larga duración: descartar conexiones caídas o vencidas
+                close_old_connections()
+                procesados, fallidos = procesar_lote(options['lote'], options['max_intentos'])
+                total_procesados += procesados
+                total_fallidos += fallidos
+                if fallidos:
+                    self.stdout.write(self.style.WARNING(f'⚠️ {fallidos} evento(s) fallaron y se reintentarán'))
+
+                if time.monotonic() - ultimo_reporte >= options['metricas_cada']:
+                    self.reportar()
+                    ultimo_reporte = time.monotonic()
+
+                if procesados + fallidos < options['lote']:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {total_procesados} evento(s) procesado(s), {total_fallidos} fallo(s)'
+        ))
+        self.reportar()
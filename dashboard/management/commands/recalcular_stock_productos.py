@@ -0,0 +1,35 @@
+"""
+Comando de Django para reparar el resumen de stock desnormalizado de los productos
+(tiene_stock, stock_variantes, cantidad_variantes) a partir de sus variantes.
+
+Uso:
+    python manage.py recalcular_stock_productos                    # Recalcular todo el catálogo
+    python manage.py recalcular_stock_productos --producto-id 123  # Solo el producto 123
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from carrito.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Recalcula en bloque el resumen de stock de variantes guardado en cada producto'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--producto-id',
+            type=int,
+            action='append',
+            dest='producto_ids',
+            help='ID del producto a recalcular (se puede repetir)',
+        )
+
+    def handle(self, *args, **options):
+        producto_ids = options['producto_ids']
+
+        with transaction.atomic():
+            actualizados = Producto.recalcular_resumen_stock(producto_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Resumen de stock recalculado para {actualizados} producto(s)'
+        ))
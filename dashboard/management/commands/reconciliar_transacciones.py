@@ -0,0 +1,92 @@
+"""
+Comando de Django que consulta en Wompi las transacciones que siguen en
+PENDING (webhook perdido, comprador que no volvió) y aplica su estado real:
+cumple las aprobadas y libera las reservas de las rechazadas
+(pagos/reconciliacion.py). Pensado para correr cada 10-15 minutos.
+
+Uso:
+    python manage.py reconciliar_transacciones                         # Pendientes de más de 15 min
+    python manage.py reconciliar_transacciones --dry-run               # Solo muestra qué cambiaría
+    python manage.py reconciliar_transacciones --hilos 16 --tasa 50    # Más concurrencia, 50 consultas/s
+    python manage.py reconciliar_transacciones --antiguedad-minutos 60 --ventana-dias 30
+"""
+
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from pagos.cliente_wompi import CircuitoAbierto, crear_cliente
+from pagos.reconciliacion import ESTADOS_RECHAZO, LimitadorTasa, aplicar_estados, consultar_estados, transacciones_estancadas
+
+
+def _percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(int(len(valores) * p), len(valores) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Consulta en Wompi las transacciones pendientes y aplica su estado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--antiguedad-minutos', type=float, default=15, help='Solo pendientes más viejas que esto (default: 15)')
+        parser.add_argument('--ventana-dias', type=float, default=7, help='Ignora pendientes más viejas que esto (default: 7)')
+        parser.add_argument('--lote', type=int, default=200, help='Transacciones leídas y guardadas por lote (default: 200)')
+        parser.add_argument('--hilos', type=int, default=8, help='Consultas simultáneas a Wompi (default: 8)')
+        parser.add_argument('--tasa', type=float, default=20, help='Máximo de consultas por segundo, 0 = sin límite (default: 20)')
+        parser.add_argument('--dry-run', action='store_true', help='Consulta Wompi pero no guarda nada')
+
+    def handle(self, *args, **options):
+        cliente = crear_cliente(tamano_pool=options['hilos'])
+        limitador = LimitadorTasa(options['tasa'])
+        estados_wompi = Counter()
+        aplicados = Counter()
+        latencias = []
+        errores = 0
+        inicio = time.perf_counter()
+
+        lotes = transacciones_estancadas(
+            timedelta(minutes=options['antiguedad_minutos']), timedelta(days=options['ventana_dias']), options['lote']
+        )
+        try:
+            for lote in lotes:
+                resultados = consultar_estados(cliente, lote, options['hilos'], limitador)
+                conocidas = []
+                for transaccion, datos, error, segundos in resultados:
+                    latencias.append(segundos)
+                    if error:
+                        errores += 1
+                        self.stdout.write(self.style.WARNING(f'⚠️ {transaccion.referencia}: {error}'))
+                    elif datos is None:
+                        estados_wompi['SIN_PAGO'] += 1
+                    else:
+                        estados_wompi[datos['status']] += 1
+                        if options['dry_run'] and datos['status'] != 'PENDING':
+                            self.stdout.write(f"   {transaccion.referencia}: PENDING → {datos['status']}")
+                        conocidas.append((transaccion, datos))
+
+                if conocidas and not options['dry_run']:
+                    aplicados.update(aplicar_estados(conocidas))
+                if any(isinstance(error, CircuitoAbierto) for _, _, error, _ in resultados):
+                    self.stdout.write(self.style.ERROR('❌ Wompi no responde (circuito abierto); se reintenta en la próxima corrida'))
+                    break
+        finally:
+            cliente.sesion.close()
+
+        duracion = time.perf_counter() - inicio
+        consultas = len(latencias)
+        resumen = ', '.join(f'{estado} {total}' for estado, total in sorted(estados_wompi.items())) or 'ninguna'
+        self.stdout.write(f'🔎 {consultas} transacción(es) consultada(s), {errores} error(es). En Wompi: {resumen}')
+        if consultas:
+            self.stdout.write(
+                f'📊 {duracion:.2f}s · {consultas / duracion:.1f} transacciones/s · '
+                f'latencia p50 {_percentil(latencias, 0.5) * 1000:.0f} ms · p95 {_percentil(latencias, 0.95) * 1000:.0f} ms'
+            )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('🧪 Dry run: no se guardó ningún cambio'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {aplicados['APPROVED']} aprobada(s) cumplida(s), "
+                f"{sum(aplicados[e] for e in ESTADOS_RECHAZO)} rechazada(s) cerrada(s), "
+                f"{aplicados['REPARADAS']} ya cumplida(s) marcada(s) como aprobada(s)"
+            ))
@@ -1,3 +1,97 @@
+from decimal import Decimal
+
+import polars as pl
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import FloatField
+from django.db.models.functions import Cast
 from django.test import TestCase
+from django.urls import reverse
+
+from carrito.models import Producto, ProductoVariante
+from dashboard.utils import COLUMNAS_VENTAS, AnalizadorDatos, cargar_dataframe
+
+
+class VariantesLoteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.camisa = Producto.objects.create(nombre='Camisa', descripcion='', precio=Decimal('100'), stock=5)
+        self.bolso = Producto.objects.create(nombre='Bolso', descripcion='', precio=Decimal('50'), stock=3)
+        for talla, color, stock in [('M', 'Negro', 2), ('M', 'Blanco', 0), ('L', 'Negro', 4)]:
+            ProductoVariante.objects.create(producto=self.camisa, talla=talla, color=color, stock=stock)
+
+    def _lote(self, ids):
+        return self.client.get(reverse('api_variantes_lote'), {'ids': ids})
+
+    def test_devuelve_matriz_y_variantes_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            data = self._lote(f'{self.camisa.id},{self.bolso.id}').json()['productos']
+
+        camisa = data[str(self.camisa.id)]
+        self.assertEqual(camisa['matriz'], {'L': {'Negro': 4}, 'M': {'Blanco': 0, 'Negro': 2}})
+        self.assertEqual(camisa['stock'], 6)
+        self.assertEqual(camisa['colores_disponibles'], ['Blanco', 'Negro'])
+        self.assertEqual(len(camisa['variantes']), 3)
+        # Sin variantes se usa el stock del producto
+        self.assertEqual(data[str(self.bolso.id)]['stock'], 3)
+        self.assertEqual(data[str(self.bolso.id)]['variantes'], [])
+
+    def test_clave_de_cache_valida_con_el_maximo_de_ids(self):
+        import warnings
+        from django.core.cache import CacheKeyWarning
+        ids = ','.join(str(100_000 + i) for i in range(100))
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            self.assertEqual(self._lote(ids).status_code, 200)
+
+    def test_se_cachea_hasta_que_cambia_el_catalogo(self):
+        ids = f'{self.bolso.id},{self.camisa.id}'
+        self._lote(ids)
+        with self.assertNumQueries(0):
+            self._lote(ids)
+
+        ProductoVariante.objects.create(producto=self.bolso, talla='U', color='Rojo', stock=1)
+        self.assertEqual(self._lote(ids).json()['productos'][str(self.bolso.id)]['matriz'], {'U': {'Rojo': 1}})
+        self.assertEqual(self._lote('1,x').status_code, 400)
+
+
+class AnalizadorDatosTests(TestCase):
+    def setUp(self):
+        from carrito.models import Pedido, PedidoLinea
+
+        usuario = get_user_model().objects.create_user(username='ana', password='x')
+        self.vestido = Producto.objects.create(nombre='Vestido', descripcion='', precio=Decimal('80'), stock=5)
+        for total, ciudad, estado in [('80.50', 'Cali', 'enviado'), ('160', '', 'procesando'),
+                                      ('40', None, 'entregado'), ('999', 'Cali', 'pendiente')]:
+            pedido = Pedido.objects.create(usuario=usuario, total=Decimal(total), ciudad=ciudad, estado=estado)
+            PedidoLinea.objects.create(pedido=pedido, producto=self.vestido, cantidad=2,
+                                       precio_unitario=Decimal('40'), subtotal=Decimal('80'))
+
+    def test_ventas_mensuales_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            analisis = AnalizadorDatos.analizar_ventas_mensuales()
+
+        df = analisis['dataframe']
+        self.assertEqual(df.columns, ['id_pedido', 'fecha', 'total', 'estado', 'ciudad', 'usuario'])
+        self.assertEqual(analisis['cantidad_pedidos'], 3)
+        self.assertAlmostEqual(analisis['total_ventas'], 280.5)
+        self.assertEqual(sorted(df['ciudad'].to_list()), ['Cali', 'Sin especificar', 'Sin especificar'])
+        self.assertEqual(set(df['usuario'].to_list()), {'ana'})
+
+    def test_productos_vendidos_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            analisis = AnalizadorDatos.analizar_productos_vendidos()
+
+        fila = analisis['productos_vendidos'].row(0, named=True)
+        self.assertEqual(fila['producto_nombre'], 'Vestido')
+        self.assertEqual(fila['cantidad_vendida'], 6)
+        self.assertAlmostEqual(fila['ingresos_generados'], 240.0)
+
+    def test_carga_por_lotes(self):
+        from carrito.models import Pedido
 
-# Create your tests here.
+        filas = Pedido.objects.order_by('id').values_list('id', 'fecha', Cast('total', FloatField()), 'estado', 'ciudad', 'usuario__username')
+        df = cargar_dataframe(filas, COLUMNAS_VENTAS, lote=3)
+        self.assertEqual(df.height, 4)
+        self.assertEqual(df['total'].to_list(), [80.5, 160.0, 40.0, 999.0])
+        self.assertEqual(cargar_dataframe(filas.none(), COLUMNAS_VENTAS).schema, pl.Schema(COLUMNAS_VENTAS))
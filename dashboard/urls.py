@@ -53,6 +53,8 @@ urlpatterns = [
     # APIs
     path('api/producto/<int:producto_id>/variantes/', views.obtener_variantes_producto, name='api_variantes_producto'),
     path('api/producto/<int:producto_id>/detalle/', views.obtener_producto_detalle, name='api_producto_detalle'),
+    path('api/productos/variantes/', views.obtener_variantes_lote, name='api_variantes_lote'),
     path('api/variante/<int:variante_id>/generar-color/', views.generar_imagen_color, name='generar_imagen_color'),
     path('api/inventario/completo/', views.obtener_inventario_completo, name='api_inventario_completo'),
+    path('api/cache-paginas/', views.obtener_estadisticas_cache_paginas, name='api_cache_paginas'),
 ]
\ No newline at end of file
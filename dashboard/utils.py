@@ -3,9 +3,51 @@ Utilidades para análisis de datos y generación de reportes con Polars
 """
 import polars as pl
 from datetime import datetime, timedelta
-from django.db.models import Count, Sum, Avg, Q
+from django.db.models import Count, Sum, Avg, Q, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.utils import timezone
-from carrito.models import Pedido, Producto
+from carrito.models import Pedido, PedidoLinea, Producto
+
+ESTADOS_VENTA = ['procesando', 'enviado', 'entregado']
+LOTE_CARGA = 10_000
+
+# Columnas de cada análisis: nombre en el DataFrame -> tipo de Polars
+COLUMNAS_VENTAS = {
+    'id_pedido': pl.Int64,
+    'fecha': pl.Datetime('us', 'UTC'),
+    'total': pl.Float64,
+    'estado': pl.String,
+    'ciudad': pl.String,
+    'usuario': pl.String,
+}
+COLUMNAS_PRODUCTOS = {
+    'producto_id': pl.Int64,
+    'producto_nombre': pl.String,
+    'cantidad': pl.Int64,
+    'precio': pl.Float64,
+    'subtotal': pl.Float64,
+    'fecha': pl.Datetime('us', 'UTC'),
+}
+
+
+def cargar_dataframe(filas, columnas, lote=LOTE_CARGA):
+    """
+    Carga un ``values_list`` en un DataFrame de Polars por lotes de ``lote``
+    tuplas, sin instancias del ORM ni un dict por fila. Los joins y las
+    conversiones (Decimal -> float, valores por defecto) van en el SQL de
+    ``filas``, que debe traer las columnas en el orden de ``columnas``.
+    """
+    esquema = list(columnas.items())
+    partes = []
+    buffer = []
+    for fila in filas.iterator(chunk_size=lote):
+        buffer.append(fila)
+        if len(buffer) == lote:
+            partes.append(pl.DataFrame(buffer, schema=esquema, orient='row'))
+            buffer = []
+    if buffer or not partes:
+        partes.append(pl.DataFrame(buffer, schema=esquema, orient='row'))
+    return pl.concat(partes, rechunk=True)
 
 
 class AnalizadorDatos:
@@ -19,30 +61,21 @@ class AnalizadorDatos:
         if not anio:
             anio = timezone.now().year
             
-        # Obtener pedidos del mes
+        # Pedidos del mes con el username por JOIN (antes, una consulta por pedido)
         pedidos = Pedido.objects.filter(
             fecha__month=mes,
             fecha__year=anio,
-            estado__in=['procesando', 'enviado', 'entregado']
-        )
-        
-        # Convertir a DataFrame de Polars
-        datos = []
-        for pedido in pedidos:
-            datos.append({
-                'id_pedido': pedido.id,
-                'fecha': pedido.fecha,
-                'total': float(pedido.total),
-                'estado': pedido.estado,
-                'ciudad': pedido.ciudad or 'Sin especificar',
-                'usuario': pedido.usuario.username if pedido.usuario else 'Invitado'
-            })
-        
-        if not datos:
+            estado__in=ESTADOS_VENTA
+        ).annotate(
+            total_float=Cast('total', FloatField()),
+            ciudad_o_defecto=Coalesce(NullIf('ciudad', Value('')), Value('Sin especificar')),
+            usuario_o_defecto=Coalesce('usuario__username', Value('Invitado')),
+        ).values_list('id', 'fecha', 'total_float', 'estado', 'ciudad_o_defecto', 'usuario_o_defecto')
+        
+        df = cargar_dataframe(pedidos, COLUMNAS_VENTAS)
+        if df.is_empty():
             return None
         
-        df = pl.DataFrame(datos)
-        
         # Análisis
         total_ventas = df['total'].sum()
         promedio_venta = df['total'].mean()
@@ -78,29 +111,20 @@ class AnalizadorDatos:
         if not fecha_fin:
             fecha_fin = timezone.now()
         
-        # Obtener pedidos
-        pedidos = Pedido.objects.filter(
-            fecha__gte=fecha_inicio,
-            fecha__lte=fecha_fin,
-            estado__in=['procesando', 'enviado', 'entregado']
-        ).select_related('producto')
-        
-        datos = []
-        for pedido in pedidos:
-            datos.append({
-                'producto_id': pedido.producto.id,
-                'producto_nombre': pedido.producto.nombre,
-                'cantidad': pedido.cantidad,
-                'precio': float(pedido.producto.precio),
-                'subtotal': float(pedido.total),
-                'fecha': pedido.fecha
-            })
-        
-        if not datos:
+        # Líneas de pedido con el nombre del producto y la fecha por JOIN
+        lineas = PedidoLinea.objects.filter(
+            pedido__fecha__gte=fecha_inicio,
+            pedido__fecha__lte=fecha_fin,
+            pedido__estado__in=ESTADOS_VENTA
+        ).annotate(
+            precio_float=Cast('precio_unitario', FloatField()),
+            subtotal_float=Cast('subtotal', FloatField()),
+        ).values_list('producto_id', 'producto__nombre', 'cantidad', 'precio_float', 'subtotal_float', 'pedido__fecha')
+        
+        df = cargar_dataframe(lineas, COLUMNAS_PRODUCTOS)
+        if df.is_empty():
             return None
         
-        df = pl.DataFrame(datos)
-        
         # Productos más vendidos
         productos_vendidos = df.group_by(['producto_id', 'producto_nombre']).agg([
             pl.col('cantidad').sum().alias('cantidad_vendida'),
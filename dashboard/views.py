@@ -1,11 +1,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.http import JsonResponse, HttpResponse
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
 from django.utils import timezone
+from django.core.files.storage import default_storage
+import hashlib
 import json
 import io
 from datetime import datetime, timedelta
@@ -13,6 +16,9 @@ from PIL import Image
 
 from carrito.models import UsuarioPersonalizado, Producto, Pedido, Carrito, ProductoVariante, Inventario
 from core.models import Reporte, Incidencia, SeguimientoReporte
+from core.generaciones import cache_por_generacion
+from core.middleware import estadisticas_cache_paginas
+from core.condicional import etag_producto, ultima_modificacion_producto
 from .forms import ProductoForm, ProductoVarianteForm, InventarioForm
 from .utils import AnalizadorDatos, ExportadorReportes
 from .sam_recolor import process_image_recolor, SamUnavailableError
@@ -21,19 +27,13 @@ User = get_user_model()
 
 def admin_dashboard(request):
     from dashboard.models import ActividadReciente
-    from django.core.cache import cache
     
-    # Cachear estadísticas por 2 minutos
-    cache_key = 'admin_dashboard_stats'
-    stats = cache.get(cache_key)
-    
-    if stats is None:
-        stats = {
-            'total_usuarios': UsuarioPersonalizado.objects.count(),
-            'total_productos': Producto.objects.count(),
-            'total_pedidos': Pedido.objects.count(),
-        }
-        cache.set(cache_key, stats, 120)
+    # Los contadores se invalidan al crear/eliminar usuarios, productos o pedidos
+    stats = cache_por_generacion('admin_dashboard_stats', [UsuarioPersonalizado, Producto, Pedido], lambda: {
+        'total_usuarios': UsuarioPersonalizado.objects.count(),
+        'total_productos': Producto.objects.count(),
+        'total_pedidos': Pedido.objects.count(),
+    }, timeout_local=120)
     
     # Optimizar consultas con only()
     ultimos_usuarios = UsuarioPersonalizado.objects.only(
@@ -184,9 +184,9 @@ def gestion_productos(request):
             producto_id = request.POST.get('producto_id')
             producto = get_object_or_404(Producto, id=producto_id)
             
-            # Verificar si el producto tiene pedidos asociados
-            from carrito.models import Pedido
-            pedidos_count = Pedido.objects.filter(producto=producto).count()
+            # Verificar si el producto tiene pedidos asociados (índice producto+pedido de las líneas)
+            from carrito.models import PedidoLinea
+            pedidos_count = PedidoLinea.objects.filter(producto=producto).values('pedido').distinct().count()
             
             if pedidos_count > 0:
                 messages.error(request, f'No se puede eliminar "{producto.nombre}" porque tiene {pedidos_count} pedido(s) asociado(s).')
@@ -227,13 +227,15 @@ def editar_producto(request, pk):
 
 def gestion_pedidos(request):
     """Vista principal de gestión de pedidos con filtros y búsqueda"""
-    pedidos = Pedido.objects.select_related('usuario', 'producto').all()
+    pedidos = Pedido.objects.select_related('usuario').all()
     
     # Filtro por búsqueda
     search = request.GET.get('search', '')
     if search:
         pedidos = pedidos.filter(
             Q(numero__icontains=search) |
+            # Números de pedidos anteriores agrupados en este (carrito 0018)
+            Q(notas__icontains=search) |
             Q(usuario__username__icontains=search) |
             Q(usuario__email__icontains=search) |
             Q(usuario__first_name__icontains=search) |
@@ -245,18 +247,20 @@ def gestion_pedidos(request):
     if estado and estado != 'todos':
         pedidos = pedidos.filter(estado=estado)
     
-    # Estadísticas
-    total_pedidos = Pedido.objects.count()
-    pedidos_pendientes = Pedido.objects.filter(estado='pendiente').count()
-    pedidos_procesando = Pedido.objects.filter(estado='procesando').count()
-    pedidos_completados = Pedido.objects.filter(estado='completado').count()
+    # Estadísticas en una sola consulta agregada
+    estadisticas = Pedido.objects.aggregate(
+        total=Count('id'),
+        pendientes=Count('id', filter=Q(estado='pendiente')),
+        procesando=Count('id', filter=Q(estado='procesando')),
+        completados=Count('id', filter=Q(estado='completado')),
+    )
     
     context = {
         'pedidos': pedidos,
-        'total_pedidos': total_pedidos,
-        'pedidos_pendientes': pedidos_pendientes,
-        'pedidos_procesando': pedidos_procesando,
-        'pedidos_completados': pedidos_completados,
+        'total_pedidos': estadisticas['total'],
+        'pedidos_pendientes': estadisticas['pendientes'],
+        'pedidos_procesando': estadisticas['procesando'],
+        'pedidos_completados': estadisticas['completados'],
         'search_query': search,
         'estado_filtro': estado,
     }
@@ -645,7 +649,7 @@ def dashboardCliente(request):
 
     # 2. Buscar el historial de pedidos del usuario
     #    Filtramos los pedidos que pertenecen al usuario logueado
-    pedidos_del_usuario = Pedido.objects.filter(usuario=request.user).order_by('-fecha')
+    pedidos_del_usuario = Pedido.objects.filter(usuario=request.user).con_lineas().order_by('-fecha')
 
     # 3. Buscar los productos marcados como destacados
     productos_destacados = Producto.objects.filter(destacado=True)
@@ -1115,8 +1119,17 @@ def generar_imagen_color(request, variante_id):
     })
 
 
+# ==================== Caché de páginas ====================
+
+@staff_member_required
+def obtener_estadisticas_cache_paginas(request):
+    """Aciertos y fallos de la caché de páginas anónimas (core/middleware.py)"""
+    return JsonResponse(estadisticas_cache_paginas())
+
+
 # ==================== API para obtener variantes ====================
 
+@condition(etag_func=etag_producto, last_modified_func=ultima_modificacion_producto)
 def obtener_variantes_producto(request, producto_id):
     """API endpoint para obtener variantes de un producto (usado en frontend)"""
     variantes = ProductoVariante.objects.filter(producto_id=producto_id).values(
@@ -1125,6 +1138,7 @@ def obtener_variantes_producto(request, producto_id):
     return JsonResponse(list(variantes), safe=False)
 
 
+@condition(etag_func=etag_producto, last_modified_func=ultima_modificacion_producto)
 def obtener_producto_detalle(request, producto_id):
     """API endpoint para obtener información completa de un producto"""
     try:
@@ -1152,6 +1166,81 @@ def obtener_producto_detalle(request, producto_id):
         return JsonResponse({'error': 'Producto no encontrado'}, status=404)
 
 
+MAX_PRODUCTOS_LOTE = 100
+
+
+def _variantes_por_producto(producto_ids):
+    """Productos con sus variantes y matriz talla/color en una sola consulta (LEFT JOIN)"""
+    filas = Producto.objects.filter(id__in=producto_ids).order_by('id', 'variantes__talla', 'variantes__color').values(
+        'id', 'nombre', 'precio', 'imagen_url', 'imagen', 'stock',
+        'variantes__id', 'variantes__talla', 'variantes__color', 'variantes__stock',
+        'variantes__imagen_url', 'variantes__tipo_producto', 'variantes__imagen_generada_ia',
+    )
+    
+    productos = {}
+    for fila in filas:
+        producto = productos.get(fila['id'])
+        if producto is None:
+            imagen = fila['imagen_url'] or (default_storage.url(fila['imagen']) if fila['imagen'] else None)
+            producto = productos[fila['id']] = {
+                'id': fila['id'],
+                'nombre': fila['nombre'],
+                'precio': str(fila['precio']),
+                'imagen_url': imagen,
+                'stock': fila['stock'],
+                'variantes': [],
+                'matriz': {},
+            }
+        if fila['variantes__id'] is None:
+            continue
+        
+        producto['variantes'].append({
+            'id': fila['variantes__id'],
+            'talla': fila['variantes__talla'],
+            'color': fila['variantes__color'],
+            'stock': fila['variantes__stock'],
+            'imagen_url': fila['variantes__imagen_url'],
+            'tipo_producto': fila['variantes__tipo_producto'],
+            'imagen_generada_ia': fila['variantes__imagen_generada_ia'],
+        })
+        # matriz[talla][color] = stock
+        producto['matriz'].setdefault(fila['variantes__talla'], {})[fila['variantes__color']] = fila['variantes__stock']
+    
+    for producto in productos.values():
+        if producto['variantes']:
+            producto['stock'] = sum(v['stock'] for v in producto['variantes'])
+        producto['tallas_disponibles'] = list(producto['matriz'])
+        producto['colores_disponibles'] = sorted({v['color'] for v in producto['variantes']})
+    
+    return productos
+
+
+def obtener_variantes_lote(request):
+    """
+    API endpoint con las variantes de varios productos a la vez.
+    
+    GET: ids=1,2,3 (máximo MAX_PRODUCTOS_LOTE). Permite que un listado cargue los
+    datos de todos sus modales en una petición. Se cachea por generación del catálogo.
+    """
+    try:
+        producto_ids = sorted({int(i) for i in request.GET.get('ids', '').split(',') if i.strip()})
+    except ValueError:
+        return JsonResponse({'error': 'ids debe ser una lista de números separados por comas'}, status=400)
+    
+    if not producto_ids:
+        return JsonResponse({'productos': {}})
+    if len(producto_ids) > MAX_PRODUCTOS_LOTE:
+        return JsonResponse({'error': f'Máximo {MAX_PRODUCTOS_LOTE} productos por petición'}, status=400)
+    
+    productos = cache_por_generacion(
+        # Hasta 100 ids no caben en una clave de memcached/DatabaseCache (250 caracteres)
+        'variantes_lote:' + hashlib.md5(','.join(map(str, producto_ids)).encode()).hexdigest(),
+        [Producto, ProductoVariante],
+        lambda: _variantes_por_producto(producto_ids),
+    )
+    return JsonResponse({'productos': productos})
+
+
 def obtener_inventario_completo(request):
     """API endpoint para obtener el inventario completo de todos los productos"""
     productos = Producto.objects.all().prefetch_related('variantes')
@@ -1195,7 +1284,7 @@ def obtener_inventario_completo(request):
 @login_required
 def detalle_pedido(request, pedido_id):
     """Vista para ver los detalles completos de un pedido"""
-    pedido = get_object_or_404(Pedido, id=pedido_id)
+    pedido = get_object_or_404(Pedido.objects.select_related('usuario').con_lineas(), id=pedido_id)
     
     context = {
         'pedido': pedido,
@@ -1211,12 +1300,16 @@ def detalle_pedido(request, pedido_id):
             'direccion': pedido.direccion or 'No especificada',
             'ciudad': pedido.ciudad or 'No especificada',
             'codigo_postal': pedido.codigo_postal or 'No especificado',
-            'producto': {
-                'nombre': pedido.producto.nombre,
-                'imagen': pedido.producto.imagen_url or (pedido.producto.imagen.url if pedido.producto.imagen else None),
-                'precio': str(pedido.producto.precio),
-            },
-            'cantidad': pedido.cantidad,
+            'lineas': [{
+                'nombre': linea.producto.nombre,
+                'imagen': linea.producto.imagen_url or (linea.producto.imagen.url if linea.producto.imagen else None),
+                'precio': str(linea.precio_unitario),
+                'cantidad': linea.cantidad,
+                'talla': linea.talla,
+                'color': linea.color,
+                'subtotal': str(linea.subtotal),
+            } for linea in pedido.lineas.all()],
+            'cantidad': pedido.unidades or 0,
             'total': str(pedido.total),
             'estado': pedido.get_estado_display(),
             'estado_valor': pedido.estado,
@@ -35,14 +35,15 @@ else:
 # 2. Verificar pedidos
 print("\n\n📦 PEDIDOS EN LA BASE DE DATOS:")
 print("-" * 80)
-pedidos = Pedido.objects.all().order_by('-fecha')
+pedidos = Pedido.objects.con_lineas().order_by('-fecha')
 if pedidos.exists():
     print(f"Total de pedidos: {pedidos.count()}\n")
     for i, p in enumerate(pedidos[:10], 1):
         print(f"{i}. Pedido: {p.numero}")
         print(f"   Usuario: {p.usuario.username}")
-        print(f"   Producto: {p.producto.nombre}")
-        print(f"   Cantidad: {p.cantidad}")
+        for linea in p.lineas.all():
+            print(f"   Producto: {linea.producto.nombre} x{linea.cantidad}")
+        print(f"   Unidades: {p.unidades}")
         print(f"   Total: ${p.total}")
         print(f"   Estado: {p.get_estado_display()}")
         print(f"   Fecha: {p.fecha}")
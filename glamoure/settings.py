@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.humanize',
     'django.contrib.sitemaps',  # Para SEO - generación de sitemap
     'django.contrib.sites',  # Requerido para sitemaps
+    'django.contrib.postgres',  # Búsqueda de texto completo y trigramas
     'core',
     'carrito',
     'dashboard.apps.DashboardConfig',
@@ -61,8 +62,10 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.gzip.GZipMiddleware',  # Compresión GZip para respuestas
     'django.middleware.common.CommonMiddleware',
+    'core.middleware.CachePaginasAnonimasMiddleware',  # HTML cacheado para visitantes anónimos
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'carrito.middleware.CarritoAnonimoMiddleware',  # Cookie firmada del carrito anónimo
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -80,6 +83,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.favoritos',
+                'carrito.context_processors.carrito',
             ],
         },
     },
@@ -170,16 +175,32 @@ SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
 SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "media")
 
 # Configuración de caché (mejora rendimiento significativamente)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-        'TIMEOUT': 300,  # 5 minutos
-        'OPTIONS': {
-            'MAX_ENTRIES': 2000  # Aumentado de 1000 a 2000
+# Con REDIS_URL la caché (y los contadores de core/generaciones.py) se comparte
+# entre los workers de gunicorn y los comandos (procesar_webhooks,
+# reconciliar_transacciones...). Sin ella cada proceso tiene su propia LocMem y
+# las invalidaciones no llegan a los demás: los TTL se mantienen cortos.
+REDIS_URL = os.getenv('REDIS_URL', '')
+CACHE_COMPARTIDA = bool(REDIS_URL)
+
+if CACHE_COMPARTIDA:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'TIMEOUT': 300,  # 5 minutos
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+            'TIMEOUT': 300,  # 5 minutos
+            'OPTIONS': {
+                'MAX_ENTRIES': 2000  # Aumentado de 1000 a 2000
+            }
         }
     }
-}
 
 # Configuración de sesiones (usa caché en lugar de DB)
 SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
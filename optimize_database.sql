@@ -2,8 +2,7 @@
 -- Ejecutar después de hacer las migraciones
 
 -- 1. Crear índices adicionales en tabla carrito_producto
-CREATE INDEX IF NOT EXISTS idx_producto_nombre_trgm ON carrito_producto USING gin(nombre gin_trgm_ops);
-CREATE INDEX IF NOT EXISTS idx_producto_descripcion_trgm ON carrito_producto USING gin(descripcion gin_trgm_ops);
+-- (Los índices de búsqueda GIN/trigramas ahora se crean en la migración carrito 0012)
 CREATE INDEX IF NOT EXISTS idx_producto_destacado_oferta ON carrito_producto(destacado, en_oferta);
 
 -- 2. Crear índices en tabla carrito_pedido
@@ -28,10 +27,7 @@ ANALYZE carrito_carrito;
 VACUUM ANALYZE carrito_producto;
 VACUUM ANALYZE carrito_pedido;
 
--- 7. Habilitar extensión pg_trgm para búsquedas de texto más rápidas
-CREATE EXTENSION IF NOT EXISTS pg_trgm;
-
--- 8. Ver el tamaño de las tablas (opcional, para monitoreo)
+-- 7. Ver el tamaño de las tablas (opcional, para monitoreo)
 SELECT 
     schemaname AS schema,
     tablename AS table,
@@ -43,5 +39,4 @@ LIMIT 10;
 
 -- Notas:
 -- - Este script debe ejecutarse con permisos de superusuario en PostgreSQL
--- - Los índices TRGM mejoran significativamente las búsquedas de texto
 -- - VACUUM y ANALYZE deben ejecutarse regularmente (semanalmente)
@@ -1,10 +1,11 @@
 from django.contrib import admin
-from .models import Transaccion
+from django.utils import timezone
+from .models import EventoWebhook, ReservaStock, Transaccion
 
 @admin.register(Transaccion)
 class TransaccionAdmin(admin.ModelAdmin):
-    list_display = ['referencia', 'usuario', 'monto', 'estado', 'creado']
-    list_filter = ['estado', 'creado', 'moneda']
+    list_display = ['referencia', 'usuario', 'monto', 'estado', 'cumplimiento', 'creado']
+    list_filter = ['estado', 'cumplimiento', 'creado', 'moneda']
     search_fields = ['referencia', 'wompi_transaction_id', 'email']
     readonly_fields = ['referencia', 'signature', 'creado', 'actualizado', 'respuesta_completa']
     
@@ -22,4 +23,26 @@ class TransaccionAdmin(admin.ModelAdmin):
             'fields': ('creado', 'actualizado', 'respuesta_completa'),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(ReservaStock)
+class ReservaStockAdmin(admin.ModelAdmin):
+    list_display = ['transaccion', 'variante', 'cantidad', 'estado', 'expira']
+    list_filter = ['estado']
+    search_fields = ['transaccion__referencia']
+    raw_id_fields = ['variante', 'transaccion']
+
+@admin.register(EventoWebhook)
+class EventoWebhookAdmin(admin.ModelAdmin):
+    list_display = ['evento_id', 'tipo', 'estado', 'intentos', 'recibido', 'procesado']
+    list_filter = ['estado', 'tipo']
+    search_fields = ['evento_id']
+    readonly_fields = ['evento_id', 'tipo', 'payload', 'recibido', 'procesado', 'ultimo_error']
+    actions = ['reintentar']
+
+    @admin.action(description='Reintentar los eventos seleccionados')
+    def reintentar(self, request, queryset):
+        reintentados = queryset.exclude(estado=EventoWebhook.PROCESADO).update(
+            estado=EventoWebhook.PENDIENTE, intentos=0, disponible_desde=timezone.now()
+        )
+        self.message_user(request, f'{reintentados} evento(s) vuelven a la bandeja')
@@ -0,0 +1,138 @@
+"""
+Procesamiento asíncrono de los webhooks de Wompi.
+
+El webhook verifica la firma, guarda el evento en ``EventoWebhook`` con
+``registrar_evento`` y responde 200 de inmediato: Wompi no espera a que se
+creen los pedidos ni reintenta por respuestas lentas.
+
+El comando ``procesar_webhooks`` (se pueden correr varios procesos) llama a
+``procesar_lote``: toma eventos pendientes con ``SELECT ... FOR UPDATE SKIP
+LOCKED``, de modo que cada worker recibe filas distintas, y aplica cada evento
+y lo marca como procesado en la misma transacción. Si el worker muere a mitad
+de camino no queda nada aplicado ni marcado y otro lo retoma: cada evento
+surte efecto una sola vez.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .cumplimiento import cumplir_transaccion
+from .models import EventoWebhook, Transaccion
+from .reservas import liberar_reservas
+
+MAX_INTENTOS = 8
+# Espera antes del reintento n: 2, 4, 8... segundos, hasta una hora
+ESPERA_MAXIMA = timedelta(hours=1)
+
+
+def registrar_evento(evento, checksum):
+    """
+    Guarda un evento ya verificado. Retorna False si era un reintento de Wompi
+    (mismo checksum): lo detecta el índice único, sin consultar antes.
+    """
+    try:
+        with transaction.atomic():
+            EventoWebhook.objects.create(evento_id=checksum.upper(), tipo=evento.get('event', ''), payload=evento)
+    except IntegrityError:
+        return False
+    return True
+
+
+def procesar_evento(evento):
+    """Aplica un evento ``transaction.updated``; los demás tipos se ignoran"""
+    if evento.get('event') != 'transaction.updated':
+        return
+
+    datos_transaccion = evento['data']['transaction']
+    transaccion = Transaccion.objects.select_related('usuario').get(referencia=datos_transaccion['reference'])
+
+    transaccion.wompi_transaction_id = datos_transaccion['id']
+    transaccion.wompi_status = datos_transaccion['status']
+    transaccion.metodo_pago = datos_transaccion.get('payment_method_type', '')
+    transaccion.respuesta_completa = datos_transaccion
+
+    if datos_transaccion['status'] == 'APPROVED':
+        # Un segundo evento APPROVED (otro checksum) o la redirección no repiten los pedidos
+        cumplir_transaccion(transaccion)
+    elif datos_transaccion['status'] in ('DECLINED', 'VOIDED') and transaccion.estado != 'APPROVED':
+        transaccion.estado = datos_transaccion['status']
+        liberar_reservas(transaccion)
+
+    transaccion.save()
+
+
+def _espera(intentos):
+    return min(timedelta(seconds=2 ** intentos), ESPERA_MAXIMA)
+
+
+def procesar_lote(lote=50, max_intentos=MAX_INTENTOS):
+    """
+    Procesa hasta ``lote`` eventos pendientes. Retorna (procesados, fallidos).
+    Cada evento corre en su propio savepoint: un fallo solo reprograma ese
+    evento y los demás del lote se confirman igual.
+    """
+    procesados = fallidos = 0
+    with transaction.atomic():
+        eventos = list(
+            EventoWebhook.objects.filter(estado=EventoWebhook.PENDIENTE, disponible_desde__lte=timezone.now())
+            .select_for_update(skip_locked=True)
+            .order_by('disponible_desde', 'id')[:lote]
+        )
+        for evento in eventos:
+            try:
+                with transaction.atomic():
+                    procesar_evento(evento.payload)
+            except Exception as e:
+                fallidos += 1
+                evento.intentos += 1
+                evento.ultimo_error = f'{type(e).__name__}: {e}'
+                if evento.intentos >= max_intentos:
+                    evento.estado = EventoWebhook.ERROR
+                else:
+                    evento.disponible_desde = timezone.now() + _espera(evento.intentos)
+                evento.save(update_fields=['intentos', 'ultimo_error', 'estado', 'disponible_desde'])
+                continue
+            procesados += 1
+            evento.estado = EventoWebhook.PROCESADO
+            evento.procesado = timezone.now()
+            evento.save(update_fields=['estado', 'procesado'])
+    return procesados, fallidos
+
+
+def _percentil(valores, p):
+    if not valores:
+        return None
+    valores = sorted(valores)
+    return valores[min(int(len(valores) * p), len(valores) - 1)]
+
+
+def metricas_bandeja(ventana=timedelta(minutes=15)):
+    """
+    Backlog y latencia de la bandeja:
+
+    - ``pendientes``/``errores``: eventos por aplicar y eventos descartados.
+    - ``antiguedad_s``: edad del pendiente más viejo (cuánto va atrasado el worker).
+    - ``latencia_p50_s``/``latencia_p95_s``: de recibido a procesado, en la ventana.
+    """
+    ahora = timezone.now()
+    conteos = dict(
+        EventoWebhook.objects.filter(estado__in=[EventoWebhook.PENDIENTE, EventoWebhook.ERROR])
+        .values('estado').annotate(total=Count('id')).values_list('estado', 'total')
+    )
+    mas_viejo = EventoWebhook.objects.filter(estado=EventoWebhook.PENDIENTE).aggregate(m=Min('recibido'))['m']
+    latencias = [
+        (procesado - recibido).total_seconds()
+        for recibido, procesado in EventoWebhook.objects.filter(
+            estado=EventoWebhook.PROCESADO, procesado__gte=ahora - ventana
+        ).values_list('recibido', 'procesado')
+    ]
+    return {
+        'pendientes': conteos.get(EventoWebhook.PENDIENTE, 0),
+        'errores': conteos.get(EventoWebhook.ERROR, 0),
+        'antiguedad_s': (ahora - mas_viejo).total_seconds() if mas_viejo else 0,
+        'procesados_ventana': len(latencias),
+        'latencia_p50_s': _percentil(latencias, 0.5),
+        'latencia_p95_s': _percentil(latencias, 0.95),
+    }
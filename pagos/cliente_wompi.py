@@ -0,0 +1,199 @@
+"""
+Cliente HTTP de la API de Wompi.
+
+Antes cada página de confirmación hacía un ``requests.get`` suelto: conexión
+TLS nueva por consulta, sin timeout (un Wompi lento colgaba el worker de
+Django) y sin reintentos. ``ClienteWompi`` agrega:
+
+- Una ``requests.Session`` por proceso con pool de conexiones keep-alive.
+- Timeouts explícitos de conexión y de lectura.
+- Reintentos acotados con backoff exponencial y jitter, solo para errores de
+  red, 429, 5xx y respuestas que no son JSON. Un 404 o 401 no se reintenta.
+  Cualquier otro error de ``requests`` también se convierte en ErrorWompi.
+- Un circuit breaker: tras ``umbral_fallos`` consultas fallidas seguidas deja
+  de llamar a Wompi durante ``enfriamiento`` segundos y falla de inmediato.
+  Pasado ese tiempo deja pasar una consulta de prueba.
+- Caché corta de las transacciones en estado final (APPROVED, DECLINED...):
+  ya no cambian y la redirección, el webhook y los reintentos del navegador
+  consultan la misma transacción varias veces seguidas.
+
+Para pruebas y benchmarks, ``pagos/stub_wompi.py`` levanta un Wompi falso en
+el mismo proceso; ``WOMPI_BASE_URL`` apunta el cliente hacia él.
+"""
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+ESTADOS_FINALES = {'APPROVED', 'DECLINED', 'VOIDED', 'ERROR'}
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+class ErrorWompi(Exception):
+    """La consulta a Wompi falló (red, timeout o respuesta de error)"""
+
+
+class CircuitoAbierto(ErrorWompi):
+    """El circuit breaker está abierto: no se llamó a Wompi"""
+
+
+class ClienteWompi:
+    """Cliente con pool de conexiones, reintentos, circuit breaker y caché"""
+
+    def __init__(self, base_url, llave_publica, llave_privada='', timeout_conexion=3.05, timeout_lectura=10,
+                 reintentos=2, backoff=0.25, umbral_fallos=5, enfriamiento=30,
+                 cache_segundos=60, tamano_pool=10):
+        self.base_url = base_url.rstrip('/')
+        self.llave_privada = llave_privada
+        self.timeout = (timeout_conexion, timeout_lectura)
+        self.reintentos = reintentos
+        self.backoff = backoff
+        self.umbral_fallos = umbral_fallos
+        self.enfriamiento = enfriamiento
+        self.cache_segundos = cache_segundos
+
+        self.sesion = requests.Session()
+        self.sesion.headers['Authorization'] = f'Bearer {llave_publica}'
+        # Los reintentos los maneja el cliente para que cuenten en el circuit breaker
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tamano_pool, max_retries=0)
+        self.sesion.mount('http://', adaptador)
+        self.sesion.mount('https://', adaptador)
+
+        self._lock = threading.Lock()
+        self._fallos = 0
+        self._abierto_hasta = 0.0
+        self._prueba_en_curso = False
+
+    # --- Circuit breaker -------------------------------------------------
+
+    @property
+    def circuito_abierto(self):
+        return self._fallos >= self.umbral_fallos
+
+    def _permitir(self):
+        """Cerrado: pasa. Abierto: falla. Vencido el enfriamiento: pasa una sola prueba"""
+        with self._lock:
+            if not self.circuito_abierto:
+                return
+            if time.monotonic() < self._abierto_hasta or self._prueba_en_curso:
+                raise CircuitoAbierto('Wompi no responde; circuito abierto')
+            self._prueba_en_curso = True
+
+    def _registrar_exito(self):
+        with self._lock:
+            self._fallos = 0
+            self._prueba_en_curso = False
+
+    def _registrar_fallo(self):
+        with self._lock:
+            self._fallos += 1
+            self._prueba_en_curso = False
+            if self.circuito_abierto:
+                self._abierto_hasta = time.monotonic() + self.enfriamiento
+
+    # --- HTTP ------------------------------------------------------------
+
+    def _espera(self, intento):
+        return self.backoff * (2 ** intento) * random.uniform(0.5, 1.5)
+
+    def _get(self, ruta, params=None, headers=None):
+        self._permitir()
+        ultimo_error = None
+        for intento in range(self.reintentos + 1):
+            if intento:
+                time.sleep(self._espera(intento - 1))
+            try:
+                respuesta = self.sesion.get(f'{self.base_url}{ruta}', params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                ultimo_error = e
+                continue
+            except requests.RequestException as e:
+                # Redirecciones infinitas, URL inválida...: reintentar no lo arregla
+                self._registrar_fallo()
+                raise ErrorWompi(f'{ruta}: {e}') from e
+            if respuesta.status_code in CODIGOS_REINTENTABLES:
+                ultimo_error = f'HTTP {respuesta.status_code}'
+                continue
+            if respuesta.status_code >= 400:
+                # Wompi respondió: el servicio está arriba aunque la respuesta sea un 4xx
+                self._registrar_exito()
+                raise ErrorWompi(f'HTTP {respuesta.status_code} en {ruta}')
+            try:
+                datos = respuesta.json()
+            except ValueError as e:
+                # Un cuerpo que no es JSON (p. ej. la página de error de un proxy)
+                ultimo_error = e
+                continue
+            self._registrar_exito()
+            return datos
+
+        self._registrar_fallo()
+        raise ErrorWompi(f'{ruta}: {ultimo_error} tras {self.reintentos + 1} intento(s)')
+
+    def consultar_transaccion(self, transaction_id):
+        """Retorna la respuesta de ``GET /transactions/<id>``; lanza ErrorWompi si falla"""
+        clave = f'wompi:transaccion:{transaction_id}'
+        datos = cache.get(clave)
+        if datos is not None:
+            return datos
+
+        datos = self._get(f'/transactions/{transaction_id}')
+        if datos.get('data', {}).get('status') in ESTADOS_FINALES:
+            cache.set(clave, datos, self.cache_segundos)
+        return datos
+
+    def consultar_por_referencia(self, referencia):
+        """
+        Transacciones de Wompi con nuestra ``referencia`` (lista, vacía si el
+        comprador nunca pagó). Este endpoint exige la llave privada.
+        """
+        datos = self._get(
+            '/transactions', params={'reference': referencia},
+            headers={'Authorization': f'Bearer {self.llave_privada}'},
+        )
+        return datos.get('data', [])
+
+
+def crear_cliente(**opciones):
+    """Un ClienteWompi configurado desde settings; ``opciones`` pisa los valores"""
+    from .utils import WompiUtils
+    configuracion = {
+        'llave_privada': settings.WOMPI_PRIVATE_KEY,
+        'timeout_conexion': getattr(settings, 'WOMPI_TIMEOUT_CONEXION', 3.05),
+        'timeout_lectura': getattr(settings, 'WOMPI_TIMEOUT_LECTURA', 10),
+        'reintentos': getattr(settings, 'WOMPI_REINTENTOS', 2),
+        'cache_segundos': getattr(settings, 'WOMPI_CACHE_SEGUNDOS', 60),
+    }
+    configuracion.update(opciones)
+    return ClienteWompi(
+        getattr(settings, 'WOMPI_BASE_URL', None) or WompiUtils.get_base_url(),
+        settings.WOMPI_PUBLIC_KEY,
+        **configuracion,
+    )
+
+
+_cliente = None
+_cliente_lock = threading.Lock()
+
+
+def obtener_cliente():
+    """El cliente compartido del proceso (una sola Session y un solo breaker)"""
+    global _cliente
+    if _cliente is None:
+        with _cliente_lock:
+            if _cliente is None:
+                _cliente = crear_cliente()
+    return _cliente
+
+
+def reiniciar_cliente():
+    """Descarta el cliente compartido (tras cambiar settings, p. ej. en pruebas)"""
+    global _cliente
+    with _cliente_lock:
+        if _cliente is not None:
+            _cliente.sesion.close()
+        _cliente = None
@@ -0,0 +1,117 @@
+"""
+Cumplimiento de un pago aprobado: crear el pedido, descontar el stock y
+vaciar el carrito. Lo llaman tanto el worker de webhooks (pagos/bandeja.py)
+como la redirección de Wompi (``confirmar_pago_carrito``), a menudo para la
+misma transacción y casi al mismo tiempo.
+
+La exclusión la da un UPDATE condicional sobre ``Transaccion.cumplimiento``::
+
+    UPDATE pagos_transaccion SET cumplimiento = 'cumplida'
+     WHERE id = X AND cumplimiento = 'pendiente'
+
+Solo una llamada actualiza la fila; la otra espera el bloqueo de la fila,
+vuelve a evaluar el WHERE tras el commit de la primera y no actualiza nada.
+Como todo ocurre en la misma transacción, si algo falla la marca se deshace y
+el siguiente intento vuelve a cumplir. Una llamada repetida cuesta un UPDATE.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from carrito.almacen import invalidar_resumen
+from carrito.models import ItemCarrito, Pedido, PedidoLinea, Producto, ProductoVariante
+from .models import Transaccion
+from .reservas import convertir_reservas
+from .utils import actualizar_stock_productos
+
+
+def _notas_pedido(transaccion, direccion_envio, telefono_contacto):
+    notas = f'Pedido realizado mediante Wompi - Referencia: {transaccion.referencia}'
+    if direccion_envio:
+        notas += f'\nDirección de envío: {direccion_envio}'
+    if telefono_contacto:
+        notas += f'\nTeléfono de contacto: {telefono_contacto}'
+    return notas
+
+
+def _crear_pedido(transaccion):
+    """Una cabecera y todas sus líneas en un bulk_create; retorna el pedido"""
+    detalle = transaccion.detalle_pedido
+    productos = detalle.get('productos', [])
+    direccion_envio = detalle.get('direccion_envio', '')
+    telefono_contacto = detalle.get('telefono_contacto', '')
+
+    encontrados = Producto.objects.only('id', 'precio').in_bulk({p['producto_id'] for p in productos})
+    # Una variante eliminada después del checkout deja la línea sin variante
+    variantes = set(ProductoVariante.objects.filter(
+        id__in={p['variante_id'] for p in productos if p.get('variante_id')}
+    ).values_list('id', flat=True))
+    lineas = []
+    for prod_data in productos:
+        producto = encontrados.get(prod_data['producto_id'])
+        if producto is None:
+            print(f"❌ Producto {prod_data['producto_id']} no encontrado")
+            continue
+        # El precio cobrado en el checkout, no el actual del catálogo
+        precio = Decimal(str(prod_data['precio'])) if 'precio' in prod_data else producto.precio
+        lineas.append(PedidoLinea(
+            producto=producto,
+            variante_id=prod_data.get('variante_id') if prod_data.get('variante_id') in variantes else None,
+            talla=prod_data.get('talla') or '',
+            color=prod_data.get('color') or '',
+            cantidad=prod_data['cantidad'],
+            precio_unitario=precio,
+            subtotal=precio * prod_data['cantidad'],
+        ))
+
+    # La cabecera se guarda con save(): número, actividad reciente y caché por señales
+    pedido = Pedido.objects.create(
+        usuario=transaccion.usuario,
+        referencia=transaccion.referencia,
+        total=sum((linea.subtotal for linea in lineas), Decimal('0')),
+        estado='pendiente',
+        direccion=direccion_envio,
+        telefono=telefono_contacto or transaccion.usuario.telefono or '',
+        notas=_notas_pedido(transaccion, direccion_envio, telefono_contacto),
+    )
+    for linea in lineas:
+        linea.pedido = pedido
+    PedidoLinea.objects.bulk_create(lineas)
+    return pedido
+
+
+def cumplir_transaccion(transaccion):
+    """
+    Marca la transacción como aprobada y cumple su pedido si nadie lo hizo
+    antes. Retorna None si otra llamada ya la cumplió; si no, el
+    ``(exitoso, mensajes)`` del descuento de stock.
+    """
+    # Aunque otra llamada gane, el save() posterior del llamador no debe
+    # devolver la fila a PENDING con la instancia leída antes de la carrera
+    transaccion.estado = 'APPROVED'
+    with transaction.atomic():
+        ganada = Transaccion.objects.filter(pk=transaccion.pk, cumplimiento=Transaccion.SIN_CUMPLIR).update(
+            cumplimiento=Transaccion.CUMPLIDA, cumplida=timezone.now(), estado='APPROVED'
+        )
+        if not ganada:
+            return None
+
+        exitoso, mensajes = True, []
+        convertir_reservas(transaccion)
+        if transaccion.detalle_pedido and transaccion.usuario:
+            pedido = _crear_pedido(transaccion)
+
+            exitoso, mensajes = actualizar_stock_productos(transaccion.detalle_pedido, transaccion.usuario)
+            if not exitoso:
+                print(f"⚠️ {transaccion.referencia}: algunos productos no pudieron actualizar su stock")
+                for mensaje in mensajes:
+                    print(mensaje)
+
+            # Un solo DELETE sin señales (nada referencia a ItemCarrito): la señal
+            # post_delete buscaría el carrito de cada item para invalidar el resumen
+            items = ItemCarrito.objects.filter(carrito__usuario=transaccion.usuario)
+            items._raw_delete(items.db)
+            invalidar_resumen(transaccion.usuario.pk)
+            print(f"✅ {transaccion.referencia}: pedido {pedido.numero} creado")
+    return exitoso, mensajes
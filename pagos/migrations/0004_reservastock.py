@@ -0,0 +1,32 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0015_productovariante_stock_reservado'),
+        ('pagos', '0003_transaccion_detalle_pedido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('estado', models.CharField(choices=[('activa', 'Activa'), ('convertida', 'Convertida en venta'), ('liberada', 'Liberada')], default='activa', max_length=20)),
+                ('expira', models.DateTimeField()),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('transaccion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='pagos.transaccion')),
+                ('variante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='carrito.productovariante')),
+            ],
+            options={
+                'verbose_name': 'Reserva de stock',
+                'verbose_name_plural': 'Reservas de stock',
+                'indexes': [models.Index(condition=models.Q(('estado', 'activa')), fields=['variante', 'expira'], name='reserva_activa_variante_idx'), models.Index(condition=models.Q(('estado', 'activa')), fields=['expira'], name='reserva_activa_expira_idx')],
+            },
+        ),
+    ]
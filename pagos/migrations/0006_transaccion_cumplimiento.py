@@ -0,0 +1,31 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:56
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def marcar_aprobadas(apps, schema_editor):
+    # Las transacciones aprobadas antes de este cambio ya crearon sus pedidos
+    Transaccion = apps.get_model('pagos', 'Transaccion')
+    Transaccion.objects.filter(estado='APPROVED').update(cumplimiento='cumplida', cumplida=F('actualizado'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagos', '0005_eventowebhook'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaccion',
+            name='cumplida',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaccion',
+            name='cumplimiento',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('cumplida', 'Pedidos creados')], default='pendiente', editable=False, max_length=20),
+        ),
+        migrations.RunPython(marcar_aprobadas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagos', '0006_transaccion_cumplimiento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(condition=models.Q(('estado', 'PENDING')), fields=['creado', 'id'], name='transaccion_pendiente_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagos', '0007_transaccion_pendiente_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransaccionArchivo',
+            fields=[
+                ('transaccion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archivo', serialize=False, to='pagos.transaccion')),
+                ('detalle_pedido', models.BinaryField(blank=True, null=True)),
+                ('respuesta_completa', models.BinaryField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Archivo de transacción',
+                'verbose_name_plural': 'Archivos de transacciones',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(fields=['usuario', '-creado'], name='transaccion_usuario_idx'),
+        ),
+    ]
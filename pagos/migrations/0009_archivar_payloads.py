@@ -0,0 +1,67 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:09
+
+import gzip
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations
+
+LOTE = 500
+
+
+def _comprimir(valor):
+    if valor is None:
+        return None
+    return gzip.compress(json.dumps(valor, cls=DjangoJSONEncoder).encode('utf-8'), compresslevel=6)
+
+
+def archivar_payloads(apps, schema_editor):
+    """Copia detalle_pedido y respuesta_completa de cada transacción a TransaccionArchivo, por lotes"""
+    Transaccion = apps.get_model('pagos', 'Transaccion')
+    TransaccionArchivo = apps.get_model('pagos', 'TransaccionArchivo')
+
+    filas = Transaccion.objects.exclude(
+        detalle_pedido__isnull=True, respuesta_completa__isnull=True
+    ).order_by('id').values_list('id', 'detalle_pedido', 'respuesta_completa')
+    lote = []
+    for transaccion_id, detalle, respuesta in filas.iterator(chunk_size=LOTE):
+        lote.append(TransaccionArchivo(
+            transaccion_id=transaccion_id,
+            detalle_pedido=_comprimir(detalle),
+            respuesta_completa=_comprimir(respuesta),
+        ))
+        if len(lote) == LOTE:
+            TransaccionArchivo.objects.bulk_create(lote)
+            lote = []
+    TransaccionArchivo.objects.bulk_create(lote)
+
+
+def restaurar_payloads(apps, schema_editor):
+    Transaccion = apps.get_model('pagos', 'Transaccion')
+    TransaccionArchivo = apps.get_model('pagos', 'TransaccionArchivo')
+
+    def descomprimir(datos):
+        return None if datos is None else json.loads(gzip.decompress(bytes(datos)))
+
+    lote = []
+    for archivo in TransaccionArchivo.objects.order_by('pk').iterator(chunk_size=LOTE):
+        lote.append(Transaccion(
+            id=archivo.transaccion_id,
+            detalle_pedido=descomprimir(archivo.detalle_pedido),
+            respuesta_completa=descomprimir(archivo.respuesta_completa),
+        ))
+        if len(lote) == LOTE:
+            Transaccion.objects.bulk_update(lote, ['detalle_pedido', 'respuesta_completa'])
+            lote = []
+    Transaccion.objects.bulk_update(lote, ['detalle_pedido', 'respuesta_completa'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagos', '0008_transaccionarchivo'),
+    ]
+
+    operations = [
+        migrations.RunPython(archivar_payloads, restaurar_payloads),
+    ]
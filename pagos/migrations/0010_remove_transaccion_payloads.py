@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:09
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagos', '0009_archivar_payloads'),
+        # 0018 agrupa los pedidos leyendo Transaccion.detalle_pedido
+        ('carrito', '0018_agrupar_pedidos_por_referencia'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='transaccion',
+            name='detalle_pedido',
+        ),
+        migrations.RemoveField(
+            model_name='transaccion',
+            name='respuesta_completa',
+        ),
+    ]
@@ -1,7 +1,39 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+import gzip
 import json
 
+# Payloads guardados en TransaccionArchivo en vez de la fila de Transaccion
+CAMPOS_ARCHIVADOS = ('detalle_pedido', 'respuesta_completa')
+
+
+def comprimir_json(valor):
+    if valor is None:
+        return None
+    return gzip.compress(json.dumps(valor, cls=DjangoJSONEncoder).encode('utf-8'), compresslevel=6)
+
+
+def descomprimir_json(datos):
+    if datos is None:
+        return None
+    return json.loads(gzip.decompress(bytes(datos)))
+
+
+def _campo_archivado(nombre):
+    """Propiedad que lee y escribe ``nombre`` en TransaccionArchivo (ver Transaccion.save)"""
+    def obtener(self):
+        if nombre in self._archivo_asignado:
+            return self._archivo_asignado[nombre]
+        return self._cargar_archivo()[nombre]
+
+    def asignar(self, valor):
+        self._archivo_asignado[nombre] = valor
+
+    return property(obtener, asignar)
+
+
 class Transaccion(models.Model):
     ESTADOS = [
         ('PENDING', 'Pendiente'),
@@ -31,8 +63,10 @@ class Transaccion(models.Model):
     email = models.EmailField(blank=True, null=True)
     nombre_completo = models.CharField(max_length=200, blank=True, null=True)
     
-    # 🆕 NUEVO: Datos del pedido (productos del carrito)
-    detalle_pedido = models.JSONField(blank=True, null=True)
+    # Datos del pedido (productos del carrito) y respuesta cruda de Wompi: viven
+    # comprimidos en TransaccionArchivo y solo se leen al usarlos
+    detalle_pedido = _campo_archivado('detalle_pedido')
+    respuesta_completa = _campo_archivado('respuesta_completa')
     
     # Firma de integridad
     signature = models.CharField(max_length=255, blank=True, null=True)
@@ -40,17 +74,86 @@ class Transaccion(models.Model):
     # Timestamps
     creado = models.DateTimeField(auto_now_add=True)
     actualizado = models.DateTimeField(auto_now=True)
-    
-    # Respuesta completa de Wompi (JSON)
-    respuesta_completa = models.JSONField(blank=True, null=True)
+
+    # Pedidos, stock y carrito de un pago aprobado se aplican una sola vez
+    # (pagos/cumplimiento.py); solo cambia con un UPDATE condicional
+    SIN_CUMPLIR = 'pendiente'
+    CUMPLIDA = 'cumplida'
+    ESTADOS_CUMPLIMIENTO = [
+        (SIN_CUMPLIR, 'Pendiente'),
+        (CUMPLIDA, 'Pedidos creados'),
+    ]
+    cumplimiento = models.CharField(max_length=20, choices=ESTADOS_CUMPLIMIENTO, default=SIN_CUMPLIR, editable=False)
+    cumplida = models.DateTimeField(blank=True, null=True, editable=False)
     
     class Meta:
         ordering = ['-creado']
         verbose_name = 'Transacción'
         verbose_name_plural = 'Transacciones'
+        indexes = [
+            # Historial del cliente: sus transacciones de la más reciente a la más vieja
+            models.Index(fields=['usuario', '-creado'], name='transaccion_usuario_idx'),
+            # reconciliar_transacciones recorre las pendientes viejas en orden (creado, id)
+            models.Index(fields=['creado', 'id'], condition=models.Q(estado='PENDING'), name='transaccion_pendiente_idx'),
+        ]
     
     def __str__(self):
         return f"{self.referencia} - {self.get_estado_display()}"
+
+    @property
+    def _archivo_asignado(self):
+        return self.__dict__.setdefault('_archivo_valores', {})
+
+    def _cargar_archivo(self):
+        """Lee el archivo una vez por instancia (una consulta, solo si se usa)"""
+        if '_archivo_cargado' not in self.__dict__:
+            fila = None
+            if self.pk:
+                fila = TransaccionArchivo.objects.filter(pk=self.pk).values_list(*CAMPOS_ARCHIVADOS).first()
+            self._archivo_cargado = dict(zip(CAMPOS_ARCHIVADOS, map(descomprimir_json, fila or (None, None))))
+            # Para detectar cambios hechos sobre el dict leído (p. ej. append a productos)
+            self._archivo_original = {c: json.dumps(v, cls=DjangoJSONEncoder) for c, v in self._archivo_cargado.items()}
+        return self._archivo_cargado
+
+    def _campos_archivo_modificados(self):
+        modificados = set(self._archivo_asignado)
+        if '_archivo_cargado' in self.__dict__:
+            modificados |= {
+                c for c, v in self._archivo_cargado.items()
+                if json.dumps(v, cls=DjangoJSONEncoder) != self._archivo_original[c]
+            }
+        return modificados
+
+    def _guardar_archivo(self, campos):
+        valores = {c: getattr(self, c) for c in campos}
+        TransaccionArchivo.guardar({self.pk: valores}, campos)
+        self.__dict__.pop('_archivo_valores', None)
+        self._archivo_cargado = {**self.__dict__.get('_archivo_cargado', dict.fromkeys(CAMPOS_ARCHIVADOS)), **valores}
+        self._archivo_original = {c: json.dumps(v, cls=DjangoJSONEncoder) for c, v in self._archivo_cargado.items()}
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        if fields is None:
+            for atributo in ('_archivo_valores', '_archivo_cargado', '_archivo_original'):
+                self.__dict__.pop(atributo, None)
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        archivados = self._campos_archivo_modificados()
+        if update_fields is not None:
+            # detalle_pedido/respuesta_completa no son columnas: se escriben aparte
+            archivados &= set(update_fields)
+            kwargs['update_fields'] = update_fields = [c for c in update_fields if c not in CAMPOS_ARCHIVADOS]
+        if update_fields is None and self.pk and not self._state.adding and not kwargs.get('force_insert'):
+            # Un save completo con la instancia leída antes del cumplimiento no debe deshacerlo
+            excluidos = {'cumplimiento', 'cumplida'} | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in excluidos and f.name not in excluidos
+            ]
+        super().save(*args, **kwargs)
+        if archivados:
+            self._guardar_archivo(sorted(archivados))
     
     def get_productos(self):
         """Devuelve la lista de productos del pedido"""
@@ -62,4 +165,113 @@ class Transaccion(models.Model):
         """Devuelve el número total de productos"""
         if self.detalle_pedido:
             return sum(p['cantidad'] for p in self.detalle_pedido.get('productos', []))
-        return 0
\ No newline at end of file
+        return 0
+
+class TransaccionArchivo(models.Model):
+    """
+    Payloads de una transacción (detalle del carrito y respuesta de Wompi)
+    como JSON comprimido con gzip. Los listados de transacciones no los
+    necesitan y así no viajan con cada fila; ``Transaccion.detalle_pedido`` y
+    ``Transaccion.respuesta_completa`` los leen y escriben de forma transparente.
+    """
+    transaccion = models.OneToOneField(Transaccion, on_delete=models.CASCADE, primary_key=True, related_name='archivo')
+    detalle_pedido = models.BinaryField(blank=True, null=True)
+    respuesta_completa = models.BinaryField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Archivo de transacción'
+        verbose_name_plural = 'Archivos de transacciones'
+
+    def __str__(self):
+        return f"Archivo {self.transaccion_id}"
+
+    @classmethod
+    def guardar(cls, valores, campos):
+        """
+        Escribe ``campos`` de varias transacciones en una sola consulta
+        (INSERT ... ON CONFLICT DO UPDATE). ``valores``: {transaccion_id: {campo: dict}}
+        """
+        cls.objects.bulk_create(
+            [
+                cls(transaccion_id=transaccion_id, **{c: comprimir_json(datos.get(c)) for c in campos})
+                for transaccion_id, datos in valores.items()
+            ],
+            update_conflicts=True, unique_fields=['transaccion'], update_fields=list(campos),
+        )
+
+
+class ReservaStock(models.Model):
+    """
+    Unidades de una variante apartadas por un checkout mientras se espera la
+    confirmación del pago. Se crean junto con el incremento condicional de
+    ``ProductoVariante.stock_reservado`` (pagos/reservas.py), se convierten en
+    venta al aprobarse el pago y se liberan al rechazarse o al vencer.
+    """
+    ACTIVA = 'activa'
+    CONVERTIDA = 'convertida'
+    LIBERADA = 'liberada'
+    ESTADOS = [
+        (ACTIVA, 'Activa'),
+        (CONVERTIDA, 'Convertida en venta'),
+        (LIBERADA, 'Liberada'),
+    ]
+
+    variante = models.ForeignKey('carrito.ProductoVariante', on_delete=models.CASCADE, related_name='reservas')
+    transaccion = models.ForeignKey(Transaccion, on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=ACTIVA)
+    expira = models.DateTimeField()
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Reserva de stock'
+        verbose_name_plural = 'Reservas de stock'
+        indexes = [
+            # Índices parciales: solo las reservas activas interesan para el
+            # stock disponible y para el barrido de vencidas
+            models.Index(fields=['variante', 'expira'], condition=models.Q(estado='activa'), name='reserva_activa_variante_idx'),
+            models.Index(fields=['expira'], condition=models.Q(estado='activa'), name='reserva_activa_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.transaccion.referencia} - {self.variante_id} x{self.cantidad} ({self.get_estado_display()})"
+
+
+class EventoWebhook(models.Model):
+    """
+    Bandeja de entrada de los eventos de Wompi. El webhook solo verifica la
+    firma y guarda el evento; ``procesar_webhooks`` lo aplica después
+    (pagos/bandeja.py). ``evento_id`` es el checksum del evento, así que los
+    reintentos de Wompi no se guardan dos veces.
+    """
+    PENDIENTE = 'pendiente'
+    PROCESADO = 'procesado'
+    ERROR = 'error'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (PROCESADO, 'Procesado'),
+        (ERROR, 'Error'),
+    ]
+
+    evento_id = models.CharField(max_length=64, unique=True)
+    tipo = models.CharField(max_length=50)
+    payload = models.JSONField()
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveIntegerField(default=0)
+    ultimo_error = models.TextField(blank=True)
+    # Tras un fallo el evento espera (backoff exponencial) antes de reintentarse
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    recibido = models.DateTimeField(auto_now_add=True)
+    procesado = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Evento de webhook'
+        verbose_name_plural = 'Eventos de webhook'
+        indexes = [
+            # Los workers solo leen pendientes: el índice parcial se mantiene pequeño
+            models.Index(fields=['disponible_desde', 'id'], condition=models.Q(estado='pendiente'), name='evento_pendiente_idx'),
+            models.Index(fields=['procesado'], condition=models.Q(estado='procesado'), name='evento_procesado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} {self.evento_id[:12]} ({self.get_estado_display()})"
@@ -0,0 +1,146 @@
+"""
+Reconciliación de transacciones que quedaron en PENDING.
+
+Si se pierde el webhook y el comprador no vuelve a ``confirmar_pago_carrito``
+la transacción queda pendiente para siempre (y sus reservas hasta que
+vencen). El comando ``reconciliar_transacciones`` las recorre por lotes:
+
+1. ``transacciones_estancadas`` lee las pendientes más viejas que cierta
+   antigüedad con keyset sobre (creado, id) y el índice parcial
+   ``transaccion_pendiente_idx``.
+2. ``consultar_estados`` pregunta a Wompi por cada una desde un pool de hilos
+   acotado. Todos los hilos comparten un ClienteWompi (una Session) y un
+   ``LimitadorTasa``. Los hilos no tocan la base de datos.
+3. ``aplicar_estados`` guarda el resultado por lote: un ``bulk_update`` con los
+   datos de Wompi, un upsert de sus respuestas en TransaccionArchivo y un
+   UPDATE condicional por estado final. Los rechazos liberan sus reservas
+   juntas. Cada aprobada pasa por ``cumplir_transaccion``, así que el webhook
+   o la redirección no duplican pedidos.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cliente_wompi import ErrorWompi
+from .cumplimiento import cumplir_transaccion
+from .models import Transaccion, TransaccionArchivo
+from .reservas import liberar_reservas_transacciones
+
+ESTADOS_RECHAZO = ('DECLINED', 'VOIDED', 'ERROR')
+
+
+class LimitadorTasa:
+    """Reparte turnos cada ``1 / por_segundo`` segundos entre todos los hilos"""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo if por_segundo else 0
+        self._siguiente = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        if not self.intervalo:
+            return
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(self._siguiente, ahora)
+            self._siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+def transacciones_estancadas(antiguedad, ventana, lote=200):
+    """
+    Genera listas de hasta ``lote`` transacciones PENDING creadas entre hace
+    ``ventana`` y hace ``antiguedad`` (timedelta), de la más vieja a la más nueva
+    """
+    ahora = timezone.now()
+    pendientes = Transaccion.objects.filter(
+        estado='PENDING', creado__gte=ahora - ventana, creado__lte=ahora - antiguedad
+    ).only('id', 'referencia', 'wompi_transaction_id', 'creado').order_by('creado', 'id')
+
+    ultima = None
+    while True:
+        consulta = pendientes
+        if ultima is not None:
+            consulta = consulta.filter(Q(creado__gt=ultima.creado) | Q(creado=ultima.creado, id__gt=ultima.id))
+        filas = list(consulta[:lote])
+        if filas:
+            yield filas
+        if len(filas) < lote:
+            return
+        ultima = filas[-1]
+
+
+def estado_en_wompi(cliente, transaccion):
+    """Datos de la transacción en Wompi, o None si el comprador nunca llegó a pagar"""
+    if transaccion.wompi_transaction_id:
+        return cliente.consultar_transaccion(transaccion.wompi_transaction_id)['data']
+    intentos = cliente.consultar_por_referencia(transaccion.referencia)
+    if not intentos:
+        return None
+    # Una referencia puede tener varios intentos: manda el aprobado, si no el más reciente
+    aprobados = [t for t in intentos if t['status'] == 'APPROVED']
+    return aprobados[0] if aprobados else max(intentos, key=lambda t: t.get('created_at', ''))
+
+
+def consultar_estados(cliente, transacciones, hilos=8, limitador=None):
+    """
+    Consulta en paralelo. Retorna una lista de (transaccion, datos, error,
+    segundos) en el mismo orden de ``transacciones``.
+    """
+    def consultar(transaccion):
+        if limitador:
+            limitador.esperar()
+        inicio = time.perf_counter()
+        try:
+            datos, error = estado_en_wompi(cliente, transaccion), None
+        except ErrorWompi as e:
+            datos, error = None, e
+        return transaccion, datos, error, time.perf_counter() - inicio
+
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        return list(pool.map(consultar, transacciones))
+
+
+def aplicar_estados(resultados):
+    """
+    Guarda ``resultados`` ([(transaccion, datos)], solo los que Wompi conoce).
+    Retorna un Counter con las transacciones aprobadas y rechazadas por estado,
+    más ``REPARADAS``: ya cumplidas que seguían en PENDING.
+    """
+    aplicados = Counter()
+    por_estado = defaultdict(list)
+    for transaccion, datos in resultados:
+        transaccion.wompi_transaction_id = datos['id']
+        transaccion.wompi_status = datos['status']
+        transaccion.metodo_pago = datos.get('payment_method_type', '')
+        por_estado[datos['status']].append(transaccion.id)
+
+    with transaction.atomic():
+        Transaccion.objects.bulk_update([t for t, _ in resultados], ['wompi_transaction_id', 'wompi_status', 'metodo_pago'])
+        TransaccionArchivo.guardar({t.id: {'respuesta_completa': datos} for t, datos in resultados}, ['respuesta_completa'])
+        rechazadas = []
+        for estado in ESTADOS_RECHAZO:
+            if not por_estado[estado]:
+                continue
+            # Condicional: no pisa una transacción que el webhook resolvió mientras tanto
+            aplicados[estado] = Transaccion.objects.filter(id__in=por_estado[estado], estado='PENDING').update(estado=estado)
+            rechazadas += por_estado[estado]
+        if rechazadas:
+            liberar_reservas_transacciones(rechazadas)
+
+    if por_estado['APPROVED']:
+        for transaccion in Transaccion.objects.select_related('usuario').filter(id__in=por_estado['APPROVED']):
+            if cumplir_transaccion(transaccion) is not None:
+                aplicados['APPROVED'] += 1
+        # Las ya cumplidas que quedaron en PENDING no pasan por cumplir_transaccion:
+        # sin esto se consultarían en Wompi en cada corrida
+        aplicados['REPARADAS'] = Transaccion.objects.filter(
+            id__in=por_estado['APPROVED'], estado='PENDING'
+        ).update(estado='APPROVED')
+    return aplicados
@@ -0,0 +1,147 @@
+"""
+Reservas de stock entre el checkout y la confirmación del pago.
+
+Al iniciar el pago, ``reservar_stock`` aparta las unidades de cada variante con
+un UPDATE condicional::
+
+    UPDATE productovariante SET stock_reservado = stock_reservado + n
+     WHERE id = X AND stock >= stock_reservado + n
+
+Si no se actualiza ninguna fila no hay stock suficiente y se deshace todo el
+checkout. Dos compradores no pueden reservar la última unidad a la vez porque
+la base de datos serializa los UPDATE sobre la misma fila.
+
+Las reservas (ReservaStock) se convierten en venta al aprobarse el pago, se
+liberan si se rechaza y el comando ``liberar_reservas_vencidas`` libera las que
+vencen sin respuesta. El stock vendible es ``stock - stock_reservado``.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from carrito.models import ProductoVariante
+from .models import ReservaStock
+
+DURACION_RESERVA = timedelta(minutes=getattr(settings, 'RESERVA_STOCK_MINUTOS', 30))
+
+
+class StockInsuficiente(Exception):
+    """No hay stock disponible para reservar una variante"""
+
+    def __init__(self, variante_id):
+        self.variante_id = variante_id
+        super().__init__(f'Stock insuficiente para la variante {variante_id}')
+
+
+def reservar_stock(transaccion, lineas):
+    """
+    Aparta ``lineas`` ([(variante_id, cantidad), ...]) para ``transaccion``.
+    Lanza StockInsuficiente (y no deja nada reservado) si alguna no alcanza.
+    """
+    cantidades = defaultdict(int)
+    for variante_id, cantidad in lineas:
+        cantidades[variante_id] += cantidad
+    if not cantidades:
+        return []
+
+    with transaction.atomic():
+        # Orden fijo por id: dos checkouts con las mismas variantes no se bloquean mutuamente
+        for variante_id in sorted(cantidades):
+            cantidad = cantidades[variante_id]
+            apartadas = ProductoVariante.objects.filter(
+                pk=variante_id, stock__gte=F('stock_reservado') + cantidad
+            ).update(stock_reservado=F('stock_reservado') + cantidad)
+            if not apartadas:
+                raise StockInsuficiente(variante_id)
+
+        expira = timezone.now() + DURACION_RESERVA
+        return ReservaStock.objects.bulk_create([
+            ReservaStock(variante_id=variante_id, transaccion=transaccion, cantidad=cantidad, expira=expira)
+            for variante_id, cantidad in sorted(cantidades.items())
+        ])
+
+
+def _cerrar_reservas(filtro, estado, limite=None):
+    """
+    Pasa a ``estado`` las reservas activas que cumplen ``filtro`` y devuelve sus
+    unidades a la variante. Las filas se bloquean (saltando las que ya tiene
+    otro proceso), así que cada reserva se cierra una sola vez aunque el webhook
+    y la redirección de Wompi lleguen a la vez.
+    """
+    with transaction.atomic():
+        activas = ReservaStock.objects.filter(filtro, estado=ReservaStock.ACTIVA).select_for_update(
+            skip_locked=True
+        ).order_by('expira')
+        if limite is not None:
+            activas = activas[:limite]
+        filas = list(activas.values_list('id', 'variante_id', 'cantidad'))
+        if not filas:
+            return 0
+
+        ReservaStock.objects.filter(id__in=[fila[0] for fila in filas]).update(estado=estado)
+        por_variante = defaultdict(int)
+        for _, variante_id, cantidad in filas:
+            por_variante[variante_id] += cantidad
+        for variante_id in sorted(por_variante):
+            ProductoVariante.objects.filter(pk=variante_id).update(
+                stock_reservado=Greatest(F('stock_reservado') - por_variante[variante_id], 0)
+            )
+    return len(filas)
+
+
+def convertir_reservas(transaccion):
+    """Pago aprobado: las reservas dejan de apartar stock (el descuento real lo hace actualizar_stock_productos)"""
+    return _cerrar_reservas(Q(transaccion=transaccion), ReservaStock.CONVERTIDA)
+
+
+def liberar_reservas(transaccion):
+    """Pago rechazado o anulado: devuelve las unidades apartadas"""
+    return _cerrar_reservas(Q(transaccion=transaccion), ReservaStock.LIBERADA)
+
+
+def liberar_reservas_transacciones(transaccion_ids):
+    """Varias transacciones rechazadas a la vez (reconciliación por lotes)"""
+    return _cerrar_reservas(Q(transaccion_id__in=transaccion_ids), ReservaStock.LIBERADA)
+
+
+def liberar_reservas_reemplazadas(usuario, lineas):
+    """
+    Un checkout nuevo del mismo carrito reemplaza al que el usuario dejó sin
+    pagar: libera las reservas de sus transacciones PENDING que apartan
+    exactamente ``lineas`` ([(variante_id, cantidad), ...]). Las de otro
+    carrito (otra pestaña, un pago que Wompi todavía puede aprobar) siguen
+    apartando stock hasta que Wompi responda o venzan.
+    """
+    buscadas = defaultdict(int)
+    for variante_id, cantidad in lineas:
+        buscadas[variante_id] += cantidad
+    if not buscadas:
+        return 0
+
+    por_transaccion = defaultdict(dict)
+    for transaccion_id, variante_id, cantidad in ReservaStock.objects.filter(
+        transaccion__usuario=usuario, transaccion__estado='PENDING', estado=ReservaStock.ACTIVA
+    ).values_list('transaccion_id', 'variante_id', 'cantidad'):
+        por_transaccion[transaccion_id][variante_id] = por_transaccion[transaccion_id].get(variante_id, 0) + cantidad
+    reemplazadas = [t for t, reservadas in por_transaccion.items() if reservadas == buscadas]
+    if not reemplazadas:
+        return 0
+    return _cerrar_reservas(Q(transaccion_id__in=reemplazadas), ReservaStock.LIBERADA)
+
+
+def liberar_reservas_vencidas(limite=1000):
+    """Libera hasta ``limite`` reservas vencidas (índice parcial sobre expira)"""
+    return _cerrar_reservas(Q(expira__lte=timezone.now()), ReservaStock.LIBERADA, limite)
+
+
+def stock_reservado_activo(variante_ids=None):
+    """{variante_id: unidades} de las reservas activas, desde el índice parcial"""
+    activas = ReservaStock.objects.filter(estado=ReservaStock.ACTIVA)
+    if variante_ids is not None:
+        activas = activas.filter(variante_id__in=variante_ids)
+    return dict(activas.values('variante_id').annotate(total=Sum('cantidad')).values_list('variante_id', 'total'))
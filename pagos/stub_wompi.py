@@ -0,0 +1,132 @@
+"""
+Wompi falso en el mismo proceso, para pruebas y benchmarks de confirmación.
+
+Atiende ``GET /v1/transactions/<id>`` y ``GET /v1/transactions?reference=``
+(este último solo con una llave ``prv_``) con HTTP/1.1 keep-alive desde un
+hilo en segundo plano. Se le pueden inyectar latencia y fallos::
+
+    with ServidorWompiStub(latencia=0.05) as stub:
+        stub.agregar_transaccion('tx-1', 'REF_1', 'APPROVED')
+        stub.fallar(2)  # Las dos próximas respuestas son 503
+        stub.fallar(1, html=True)  # La próxima es un 200 con HTML, como un proxy
+        cliente = ClienteWompi(stub.base_url, 'pub_test')
+        cliente.consultar_transaccion('tx-1')
+        stub.peticiones, stub.conexiones  # Consultas atendidas y conexiones TCP abiertas
+"""
+import json
+import re
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+RUTA_TRANSACCION = re.compile(r'^/v1/transactions/([^/?]+)$')
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, como la API real
+
+    def setup(self):
+        super().setup()
+        # Cabeceras y cuerpo van en dos escrituras: sin esto Nagle + ACK retardado
+        # suman ~40 ms por respuesta en conexiones keep-alive
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.stub._lock:
+            self.server.stub.conexiones += 1
+
+    def do_GET(self):
+        stub = self.server.stub
+        with stub._lock:
+            stub.peticiones += 1
+            fallar = stub._fallos_pendientes > 0
+            if fallar:
+                stub._fallos_pendientes -= 1
+            html = fallar and stub._fallos_html
+        if stub.latencia:
+            time.sleep(stub.latencia)
+
+        url = urlsplit(self.path)
+        encontrada = RUTA_TRANSACCION.match(url.path)
+        if html:
+            self._responder(200, '<html><body>Bad gateway</body></html>', 'text/html')
+        elif fallar:
+            self._responder(503, {'error': {'type': 'SERVICE_UNAVAILABLE'}})
+        elif url.path == '/v1/transactions':
+            if not self.headers.get('Authorization', '').startswith('Bearer prv_'):
+                self._responder(401, {'error': {'type': 'INVALID_ACCESS_TOKEN'}})
+                return
+            referencia = parse_qs(url.query).get('reference', [''])[0]
+            self._responder(200, {'data': [t for t in stub.transacciones.values() if t['reference'] == referencia]})
+        elif encontrada and encontrada.group(1) in stub.transacciones:
+            self._responder(200, {'data': stub.transacciones[encontrada.group(1)]})
+        else:
+            self._responder(404, {'error': {'type': 'NOT_FOUND_ERROR'}})
+
+    def _responder(self, codigo, cuerpo, tipo='application/json'):
+        contenido = (cuerpo if isinstance(cuerpo, str) else json.dumps(cuerpo)).encode()
+        self.send_response(codigo)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(contenido)))
+        self.end_headers()
+        self.wfile.write(contenido)
+
+    def log_message(self, *args):
+        pass
+
+
+class ServidorWompiStub:
+    """Servidor HTTP local que imita la consulta de transacciones de Wompi"""
+
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self.transacciones = {}
+        self.peticiones = 0
+        self.conexiones = 0
+        self._fallos_pendientes = 0
+        self._fallos_html = False
+        self._lock = threading.Lock()
+        self._servidor = None
+        self._hilo = None
+
+    @property
+    def base_url(self):
+        host, puerto = self._servidor.server_address[:2]
+        return f'http://{host}:{puerto}/v1'
+
+    def agregar_transaccion(self, transaction_id, referencia, estado='APPROVED', metodo='CARD', monto_en_centavos=0):
+        self.transacciones[transaction_id] = {
+            'id': transaction_id,
+            'reference': referencia,
+            'status': estado,
+            'payment_method_type': metodo,
+            'amount_in_cents': monto_en_centavos,
+            'currency': 'COP',
+            'created_at': datetime.now(timezone.utc).isoformat(),
+        }
+
+    def fallar(self, veces, html=False):
+        """Las próximas ``veces`` peticiones responden 503 (o 200 con HTML si ``html``)"""
+        with self._lock:
+            self._fallos_pendientes = veces
+            self._fallos_html = html
+
+    def iniciar(self):
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', 0), _Manejador)
+        self._servidor.daemon_threads = True
+        self._servidor.stub = self
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+        self._hilo.join()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
@@ -1,3 +1,480 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test.utils import CaptureQueriesContext
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from carrito.almacen import resumen_carrito_usuario
+from carrito.models import Carrito, Inventario, ItemCarrito, Pedido, Producto, ProductoVariante
+from .cliente_wompi import CircuitoAbierto, ClienteWompi, ErrorWompi
+from .models import EventoWebhook, ReservaStock, Transaccion, TransaccionArchivo
+from .reservas import convertir_reservas, liberar_reservas_reemplazadas, reservar_stock
+from .stub_wompi import ServidorWompiStub
+from .utils import actualizar_stock_productos
+
+User = get_user_model()
+
+
+class ReservasConcurrentesTests(TransactionTestCase):
+    def test_checkouts_en_paralelo_no_sobrevenden(self):
+        cache.clear()
+        producto = Producto.objects.create(nombre='Chaqueta', precio=100)
+        variante = ProductoVariante.objects.create(producto=producto, talla='M', color='Negro', stock=3)
+        compradores = 8
+        usuarios = []
+        for i in range(compradores):
+            usuario = User.objects.create_user(username=f'comprador{i}', password='pass1234', direccion='Calle 1')
+            carrito = Carrito.objects.create(usuario=usuario)
+            ItemCarrito.objects.create(
+                carrito=carrito, producto=producto, variante=variante, talla='M', color='Negro', cantidad=1
+            )
+            usuarios.append(usuario)
+
+        clientes = []
+        for usuario in usuarios:
+            cliente = Client()
+            cliente.force_login(usuario)
+            clientes.append(cliente)
+        url = reverse('pagos:checkout_carrito')
+        barrera = threading.Barrier(compradores, timeout=30)
+        resultados = []
+
+        def checkout(cliente):
+            barrera.wait()
+            try:
+                for _ in range(50):
+                    try:
+                        respuesta = cliente.get(url)
+                        break
+                    except OperationalError:
+                        # SQLite bloquea la tabla completa; reintentar equivale a un checkout nuevo
+                        continue
+                resultados.append(respuesta.status_code == 200)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=checkout, args=(c,)) for c in clientes]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join(timeout=120)
+
+        variante.refresh_from_db()
+        self.assertEqual(len(resultados), compradores)
+        self.assertEqual(resultados.count(True), 3)
+        self.assertEqual(variante.stock_reservado, 3)
+        activas = ReservaStock.objects.filter(estado=ReservaStock.ACTIVA)
+        self.assertEqual(activas.count(), 3)
+        self.assertEqual(len(set(activas.values_list('transaccion__usuario', flat=True))), 3)
+
+
+class CicloReservasTests(TestCase):
+    def setUp(self):
+        producto = Producto.objects.create(nombre='Bolso', precio=50)
+        self.variante = ProductoVariante.objects.create(producto=producto, talla='U', color='Café', stock=2)
+
+    def transaccion(self, referencia):
+        return Transaccion.objects.create(referencia=referencia, monto=50)
+
+    def test_conversion_idempotente_y_barrido_de_vencidas(self):
+        pagada, abandonada = self.transaccion('REF_1'), self.transaccion('REF_2')
+        reservar_stock(pagada, [(self.variante.id, 1)])
+        reservar_stock(abandonada, [(self.variante.id, 1)])
+        self.variante.refresh_from_db()
+        self.assertEqual(self.variante.stock_disponible, 0)
+
+        # Un save completo de la variante no pisa lo reservado
+        self.variante.stock_reservado = 0
+        self.variante.save()
+        self.variante.refresh_from_db()
+        self.assertEqual(self.variante.stock_reservado, 2)
+
+        # Webhook y redirección aprueban la misma transacción: se convierte una sola vez
+        self.assertEqual(convertir_reservas(pagada), 1)
+        self.assertEqual(convertir_reservas(pagada), 0)
+
+        abandonada.reservas.update(expira=timezone.now() - timedelta(minutes=1))
+        call_command('liberar_reservas_vencidas', stdout=open('/dev/null', 'w'))
+        self.variante.refresh_from_db()
+        self.assertEqual(self.variante.stock_reservado, 0)
+        self.assertEqual(abandonada.reservas.get().estado, ReservaStock.LIBERADA)
+
+    def test_checkout_nuevo_solo_libera_el_mismo_carrito(self):
+        usuario = User.objects.create_user(username='compradora', password='x')
+        otra = ProductoVariante.objects.create(producto=self.variante.producto, talla='U', color='Negro', stock=2)
+        reintento = Transaccion.objects.create(referencia='REF_1', monto=50, usuario=usuario)
+        otra_pestana = Transaccion.objects.create(referencia='REF_2', monto=50, usuario=usuario)
+        reservar_stock(reintento, [(self.variante.id, 1)])
+        reservar_stock(otra_pestana, [(otra.id, 1)])
+
+        self.assertEqual(liberar_reservas_reemplazadas(usuario, [(self.variante.id, 1)]), 1)
+        self.assertEqual(reintento.reservas.get().estado, ReservaStock.LIBERADA)
+        self.assertEqual(otra_pestana.reservas.get().estado, ReservaStock.ACTIVA)
+        otra.refresh_from_db()
+        self.assertEqual(otra.stock_reservado, 1)
+
+
+def evento_firmado(referencia, estado, timestamp=1700000000):
+    """Evento transaction.updated con la firma que calcularía Wompi"""
+    datos = {'id': f'WOMPI-{referencia}', 'reference': referencia, 'status': estado, 'amount_in_cents': 10000}
+    propiedades = ['transaction.id', 'transaction.status', 'transaction.amount_in_cents']
+    cadena = f"{datos['id']}{estado}{datos['amount_in_cents']}{timestamp}{settings.WOMPI_EVENTS_SECRET}"
+    checksum = hashlib.sha256(cadena.encode('utf-8')).hexdigest().upper()
+    return {
+        'event': 'transaction.updated',
+        'data': {'transaction': datos},
+        'signature': {'properties': propiedades, 'checksum': checksum},
+        'timestamp': timestamp,
+    }, checksum
+
+
+class BandejaWebhookTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='cliente', password='pass1234', telefono='3001234567')
+        carrito = Carrito.objects.create(usuario=self.usuario)
+        producto = Producto.objects.create(nombre='Vestido', precio=100, stock=5)
+        self.variante = ProductoVariante.objects.create(producto=producto, talla='S', color='Rojo', stock=5)
+        ItemCarrito.objects.create(carrito=carrito, producto=producto, variante=self.variante, talla='S', color='Rojo')
+        self.transaccion = Transaccion.objects.create(
+            usuario=self.usuario, referencia='REF_BANDEJA', monto=100,
+            detalle_pedido={'productos': [{
+                'producto_id': producto.id, 'variante_id': self.variante.id, 'nombre': 'Vestido',
+                'precio': 100.0, 'cantidad': 1, 'talla': 'S', 'color': 'Rojo',
+            }]},
+        )
+
+    def enviar(self, evento, checksum):
+        return self.client.post(
+            reverse('pagos:webhook'), json.dumps(evento), content_type='application/json',
+            HTTP_X_EVENT_CHECKSUM=checksum,
+        )
+
+    def procesar(self):
+        call_command('procesar_webhooks', '--una-vez', stdout=io.StringIO())
+
+    def test_webhook_solo_encola_y_el_worker_aplica_una_vez(self):
+        evento, checksum = evento_firmado('REF_BANDEJA', 'APPROVED')
+        self.assertEqual(self.enviar(evento, 'MALA').status_code, 400)
+
+        # La respuesta no crea pedidos: solo un INSERT en la bandeja
+        with self.assertNumQueries(3):
+            self.assertEqual(self.enviar(evento, checksum).json(), {'status': 'ok', 'duplicado': False})
+        self.assertTrue(self.enviar(evento, checksum).json()['duplicado'])
+        self.assertEqual(EventoWebhook.objects.count(), 1)
+        self.assertFalse(Pedido.objects.exists())
+
+        self.procesar()
+        # Otro evento APPROVED de la misma transacción (Wompi cambió el timestamp)
+        self.enviar(*evento_firmado('REF_BANDEJA', 'APPROVED', timestamp=1700000099))
+        self.procesar()
+
+        self.transaccion.refresh_from_db()
+        self.variante.refresh_from_db()
+        self.assertEqual(self.transaccion.estado, 'APPROVED')
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(self.variante.stock, 4)
+        self.assertFalse(ItemCarrito.objects.exists())
+        self.assertEqual(EventoWebhook.objects.filter(estado=EventoWebhook.PROCESADO).count(), 2)
+
+    def test_webhook_y_redireccion_cumplen_una_sola_vez(self):
+        from .cumplimiento import cumplir_transaccion
+
+        # La redirección de Wompi y el worker leen la transacción antes de que el otro la cumpla
+        desde_redireccion = Transaccion.objects.get(pk=self.transaccion.pk)
+        desde_webhook = Transaccion.objects.get(pk=self.transaccion.pk)
+        self.assertTrue(cumplir_transaccion(desde_redireccion)[0])
+        desde_redireccion.save()
+        # La llamada repetida es un solo UPDATE que no afecta filas (más SAVEPOINT/RELEASE)
+        with self.assertNumQueries(3):
+            self.assertIsNone(cumplir_transaccion(desde_webhook))
+        desde_webhook.save()
+
+        self.transaccion.refresh_from_db()
+        self.variante.refresh_from_db()
+        self.assertEqual(self.transaccion.cumplimiento, Transaccion.CUMPLIDA)
+        # El save() de la llamada perdedora no devuelve la transacción a PENDING
+        self.assertEqual(self.transaccion.estado, 'APPROVED')
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(Pedido.objects.get().total, 100)
+        self.assertEqual(self.variante.stock, 4)
+
+    def test_redireccion_avisa_si_no_alcanzo_el_stock(self):
+        cache.clear()
+        stub = ServidorWompiStub().iniciar()
+        self.addCleanup(stub.detener)
+        stub.agregar_transaccion('tx-sin-stock', 'REF_BANDEJA', 'APPROVED')
+        ProductoVariante.objects.filter(pk=self.variante.pk).update(stock=0)
+
+        self.client.force_login(self.usuario)
+        with override_settings(WOMPI_BASE_URL=stub.base_url):
+            respuesta = self.client.get(reverse('pagos:confirmacion_carrito'), {'id': 'tx-sin-stock'})
+        self.assertEqual(
+            [m.message for m in respuesta.context['messages']],
+            ['¡Pago aprobado exitosamente! Tu pedido ha sido registrado.',
+             'Pedido creado pero algunos productos no pudieron actualizar su stock.'],
+        )
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_una_compra_es_un_pedido_con_sus_lineas(self):
+        from .cumplimiento import cumplir_transaccion
+
+        bolso = Producto.objects.create(nombre='Bolso', precio=80, stock=3)
+        ItemCarrito.objects.create(carrito=Carrito.objects.get(usuario=self.usuario), producto=bolso, cantidad=2)
+        self.transaccion.detalle_pedido['productos'].append({
+            'producto_id': bolso.id, 'nombre': 'Bolso', 'precio': 75.0, 'cantidad': 2,
+        })
+        self.transaccion.save()
+        self.assertEqual(resumen_carrito_usuario(self.usuario.pk)['lineas'], 2)
+        with CaptureQueriesContext(connection) as contexto:
+            self.assertTrue(cumplir_transaccion(self.transaccion)[0])
+
+        # El carrito se vacía con un solo DELETE, sin buscar el carrito de cada item
+        sql = [q['sql'] for q in contexto.captured_queries]
+        self.assertEqual(sum(s.startswith('DELETE FROM "carrito_itemcarrito"') for s in sql), 1)
+        self.assertFalse([s for s in sql if s.startswith('SELECT') and 'FROM "carrito_carrito"' in s])
+        self.assertEqual(resumen_carrito_usuario(self.usuario.pk)['lineas'], 0)
+
+        pedido = Pedido.objects.con_lineas().get()
+        self.assertEqual((pedido.referencia, pedido.total, pedido.unidades), ('REF_BANDEJA', 250, 3))
+        # Cada línea conserva el precio cobrado en el checkout y su variante
+        self.assertEqual(
+            [(l.producto_id, l.variante_id, l.precio_unitario, l.subtotal) for l in pedido.lineas.all()],
+            [(self.variante.producto_id, self.variante.id, 100, 100), (bolso.id, None, 75, 150)],
+        )
+
+    def test_evento_fallido_se_reprograma(self):
+        from .bandeja import metricas_bandeja, procesar_lote
+
+        self.enviar(*evento_firmado('REF_DESCONOCIDA', 'APPROVED'))
+        self.assertEqual(procesar_lote(), (0, 1))
+        evento = EventoWebhook.objects.get()
+        self.assertEqual((evento.estado, evento.intentos), (EventoWebhook.PENDIENTE, 1))
+        self.assertIn('DoesNotExist', evento.ultimo_error)
+        self.assertGreater(evento.disponible_desde, timezone.now())
+        # Mientras espera el backoff ningún worker lo toma, pero sigue contando en el backlog
+        self.assertEqual(procesar_lote(), (0, 0))
+        self.assertEqual(metricas_bandeja()['pendientes'], 1)
+
+
+class ClienteWompiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stub = ServidorWompiStub().iniciar()
+        self.addCleanup(self.stub.detener)
+        self.stub.agregar_transaccion('tx-ok', 'REF_OK', 'APPROVED')
+        self.stub.agregar_transaccion('tx-pend', 'REF_PEND', 'PENDING')
+        self.cliente = ClienteWompi(self.stub.base_url, 'pub_test', reintentos=2, backoff=0, umbral_fallos=2)
+        self.addCleanup(self.cliente.sesion.close)
+
+    def test_reintenta_503_y_reutiliza_la_conexion(self):
+        self.stub.fallar(2)
+        self.assertEqual(self.cliente.consultar_transaccion('tx-ok')['data']['reference'], 'REF_OK')
+        self.cliente.consultar_transaccion('tx-pend')
+        self.assertEqual(self.stub.peticiones, 4)
+        self.assertEqual(self.stub.conexiones, 1)
+
+    def test_cachea_solo_estados_finales(self):
+        for _ in range(3):
+            self.cliente.consultar_transaccion('tx-ok')
+            self.cliente.consultar_transaccion('tx-pend')
+        self.assertEqual(self.stub.peticiones, 4)
+
+    def test_404_no_se_reintenta_ni_abre_el_circuito(self):
+        for _ in range(3):
+            with self.assertRaises(ErrorWompi):
+                self.cliente.consultar_transaccion('tx-no-existe')
+        self.assertEqual(self.stub.peticiones, 3)
+        self.assertFalse(self.cliente.circuito_abierto)
+
+    def test_respuesta_que_no_es_json_es_error_wompi(self):
+        self.stub.fallar(1, html=True)
+        self.assertEqual(self.cliente.consultar_transaccion('tx-pend')['data']['status'], 'PENDING')
+
+        self.stub.fallar(3, html=True)
+        with self.assertRaises(ErrorWompi):
+            self.cliente.consultar_transaccion('tx-pend')
+        self.assertEqual(self.stub.peticiones, 5)
+        self.assertEqual(self.cliente._fallos, 1)
+
+        # Cualquier otro error de requests (aquí, un esquema que no soporta) también
+        cliente = ClienteWompi('wompi://sandbox', 'pub_test', backoff=0)
+        with self.assertRaises(ErrorWompi):
+            cliente.consultar_transaccion('tx-ok')
+        self.assertEqual(cliente._fallos, 1)
+
+    def test_circuito_se_abre_y_se_cierra_tras_el_enfriamiento(self):
+        self.stub.fallar(6)
+        for _ in range(2):
+            with self.assertRaises(ErrorWompi):
+                self.cliente.consultar_transaccion('tx-pend')
+        # Abierto: falla sin llamar a Wompi
+        with self.assertRaises(CircuitoAbierto):
+            self.cliente.consultar_transaccion('tx-pend')
+        self.assertEqual(self.stub.peticiones, 6)
+
+        self.cliente._abierto_hasta = 0
+        self.assertEqual(self.cliente.consultar_transaccion('tx-pend')['data']['status'], 'PENDING')
+        self.assertFalse(self.cliente.circuito_abierto)
+
+
+class ReconciliacionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stub = ServidorWompiStub().iniciar()
+        self.addCleanup(self.stub.detener)
+        ajustes = override_settings(WOMPI_BASE_URL=self.stub.base_url)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        usuario = User.objects.create_user(username='cliente', password='pass1234', telefono='3001234567')
+        producto = Producto.objects.create(nombre='Vestido', precio=100, stock=5)
+        self.variante = ProductoVariante.objects.create(producto=producto, talla='S', color='Rojo', stock=5)
+        detalle = {'productos': [{
+            'producto_id': producto.id, 'variante_id': self.variante.id, 'nombre': 'Vestido',
+            'precio': 100.0, 'cantidad': 1, 'talla': 'S', 'color': 'Rojo',
+        }]}
+        for referencia in ('REF_APROBADA', 'REF_RECHAZADA', 'REF_EN_CURSO', 'REF_ABANDONADA', 'REF_RECIENTE'):
+            transaccion = Transaccion.objects.create(usuario=usuario, referencia=referencia, monto=100, detalle_pedido=detalle)
+            reservar_stock(transaccion, [(self.variante.id, 1)])
+        Transaccion.objects.exclude(referencia='REF_RECIENTE').update(creado=timezone.now() - timedelta(hours=1))
+
+        self.stub.agregar_transaccion('tx-1', 'REF_APROBADA', 'DECLINED')
+        self.stub.agregar_transaccion('tx-2', 'REF_APROBADA', 'APPROVED')
+        self.stub.agregar_transaccion('tx-3', 'REF_RECHAZADA', 'DECLINED')
+        self.stub.agregar_transaccion('tx-4', 'REF_EN_CURSO', 'PENDING')
+        self.stub.agregar_transaccion('tx-5', 'REF_RECIENTE', 'APPROVED')
+
+    def reconciliar(self, *args):
+        salida = io.StringIO()
+        call_command('reconciliar_transacciones', '--hilos', '4', '--lote', '2', '--tasa', '0', *args, stdout=salida)
+        return salida.getvalue()
+
+    def estados(self):
+        return dict(Transaccion.objects.values_list('referencia', 'estado'))
+
+    def test_dry_run_no_guarda(self):
+        salida = self.reconciliar('--dry-run')
+        self.assertIn('REF_APROBADA: PENDING → APPROVED', salida)
+        self.assertIn('4 transacción(es) consultada(s)', salida)
+        self.assertEqual(set(self.estados().values()), {'PENDING'})
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_aplica_estados_y_cumple_una_vez(self):
+        self.reconciliar()
+        self.assertEqual(self.estados(), {
+            'REF_APROBADA': 'APPROVED', 'REF_RECHAZADA': 'DECLINED', 'REF_EN_CURSO': 'PENDING',
+            'REF_ABANDONADA': 'PENDING', 'REF_RECIENTE': 'PENDING',
+        })
+        self.assertEqual(Transaccion.objects.get(referencia='REF_EN_CURSO').wompi_transaction_id, 'tx-4')
+        self.assertEqual(Pedido.objects.get().referencia, 'REF_APROBADA')
+        self.variante.refresh_from_db()
+        # Se vendió una unidad y se liberó la reserva rechazada; quedan las tres pendientes
+        self.assertEqual((self.variante.stock, self.variante.stock_reservado), (4, 3))
+
+        # La siguiente corrida ya no ve las resueltas y no repite el pedido
+        self.assertIn('2 transacción(es) consultada(s)', self.reconciliar())
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_repara_cumplidas_que_quedaron_pendientes(self):
+        # Cumplida por el webhook, pero un save() con la instancia vieja la dejó en PENDING
+        Transaccion.objects.filter(referencia='REF_APROBADA').update(cumplimiento=Transaccion.CUMPLIDA)
+        self.assertIn('1 ya cumplida(s) marcada(s) como aprobada(s)', self.reconciliar())
+        self.assertEqual(self.estados()['REF_APROBADA'], 'APPROVED')
+        self.assertFalse(Pedido.objects.exists())
+
+
+class DescuentoStockTests(TestCase):
+    def setUp(self):
+        self.variantes = []
+        for i in range(3):
+            producto = Producto.objects.create(nombre=f'Producto {i}', precio=100, stock=20)
+            self.variantes += [
+                ProductoVariante.objects.create(producto=producto, talla=talla, color='Negro', stock=5)
+                for talla in ('S', 'M')
+            ]
+
+    def linea(self, variante, cantidad=1, **extra):
+        return {'producto_id': variante.producto_id, 'variante_id': variante.id, 'cantidad': cantidad, **extra}
+
+    def consultas(self, lineas):
+        with CaptureQueriesContext(connection) as contexto:
+            exitoso, _ = actualizar_stock_productos({'productos': lineas})
+        self.assertTrue(exitoso)
+        return len(contexto)
+
+    def test_consultas_constantes_sin_importar_el_tamano_del_pedido(self):
+        una = self.consultas([self.linea(self.variantes[0])])
+        todas = self.consultas([self.linea(v) for v in self.variantes])
+        self.assertEqual(una, todas)
+
+    def test_descuenta_lineas_repetidas_y_omite_las_que_no_alcanzan(self):
+        s, m = self.variantes[:2]
+        exitoso, _ = actualizar_stock_productos({'productos': [
+            self.linea(s, 2),
+            self.linea(s, 3),
+            self.linea(s, 1),  # Ya no alcanza
+            {'producto_id': m.producto_id, 'talla': 'M', 'color': 'Negro', 'cantidad': 4},  # Sin FK
+        ]})
+        self.assertFalse(exitoso)
+        s.refresh_from_db()
+        m.refresh_from_db()
+        producto = Producto.objects.get(pk=s.producto_id)
+        self.assertEqual((s.stock, m.stock, producto.stock, producto.stock_variantes), (0, 1, 11, 1))
+        self.assertEqual(
+            list(Inventario.objects.order_by('id').values_list('variante_id', 'stock_anterior', 'stock_nuevo')),
+            [(s.id, 5, 3), (s.id, 3, 0), (m.id, 5, 1)],
+        )
+
+    def test_no_vende_lo_reservado_por_otros(self):
+        # Compra aprobada cuya reserva ya se liberó: no puede llevarse lo que otro apartó
+        variante = self.variantes[0]
+        reservar_stock(Transaccion.objects.create(referencia='REF_OTRO', monto=100), [(variante.id, 4)])
+        exitoso, mensajes = actualizar_stock_productos({'productos': [self.linea(variante, 2)]})
+        self.assertFalse(exitoso)
+        self.assertIn('Disponible: 1', mensajes[0])
+        variante.refresh_from_db()
+        self.assertEqual((variante.stock, variante.stock_reservado), (5, 4))
+
+
+class ArchivoTransaccionTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='cliente', password='pass1234')
+        self.detalle = {'productos': [{'producto_id': 1, 'nombre': 'Vestido', 'cantidad': 2}], 'total': 200.0}
+
+    def test_payloads_comprimidos_y_leidos_solo_al_usarlos(self):
+        Transaccion.objects.create(usuario=self.usuario, referencia='REF_A', monto=200, detalle_pedido=self.detalle)
+        self.assertNotIn('detalle_pedido', [f.name for f in Transaccion._meta.concrete_fields])
+        self.assertTrue(bytes(TransaccionArchivo.objects.get().detalle_pedido).startswith(b'\x1f\x8b'))
+
+        with self.assertNumQueries(1):
+            transaccion = Transaccion.objects.get()
+        with self.assertNumQueries(1):
+            self.assertEqual(transaccion.get_total_productos(), 2)
+            self.assertIsNone(transaccion.respuesta_completa)
+
+        # Un cambio sobre el dict leído también se guarda; lo no tocado no se reescribe
+        transaccion.detalle_pedido['productos'][0]['cantidad'] = 3
+        transaccion.respuesta_completa = {'status': 'APPROVED'}
+        transaccion.save()
+        transaccion = Transaccion.objects.get()
+        self.assertEqual((transaccion.get_total_productos(), transaccion.respuesta_completa), (3, {'status': 'APPROVED'}))
+        with self.assertNumQueries(1):
+            transaccion.save()
+
+    def test_historial_paginado(self):
+        for i in range(25):
+            Transaccion.objects.create(usuario=self.usuario, referencia=f'REF_{i}', monto=100, detalle_pedido=self.detalle)
+        self.client.force_login(self.usuario)
+        pagina = self.client.get(reverse('pagos:historial'), {'page': 2}).context['transacciones']
+        self.assertEqual((pagina.number, len(pagina)), (2, 5))
 
-# Create your tests here.
@@ -1,10 +1,13 @@
 import hashlib
 import hmac
-import requests
 from django.conf import settings
 from datetime import datetime
 import random
 import string
+from collections import defaultdict
+
+from .cliente_wompi import ErrorWompi, obtener_cliente
+
 
 class WompiUtils:
     """Utilidades para integración con Wompi"""
@@ -45,9 +48,10 @@ class WompiUtils:
         return firma
     
     @staticmethod
-    def verificar_firma_evento(checksum_recibido, evento_json):
+    def checksum_evento(evento_json):
         """
-        Verifica la firma de un evento webhook usando EVENTS SECRET
+        Calcula el checksum de un evento como lo hace Wompi: SHA256 de los
+        valores de signature.properties + timestamp + EVENTS SECRET
         """
         # Extraer propiedades según el evento
         properties = evento_json['signature']['properties']
@@ -74,26 +78,24 @@ class WompiUtils:
         cadena = ''.join(valores)
         
         # Calcular SHA256
-        firma_calculada = hashlib.sha256(cadena.encode('utf-8')).hexdigest().upper()
-        
-        return firma_calculada == checksum_recibido.upper()
+        return hashlib.sha256(cadena.encode('utf-8')).hexdigest().upper()
+    
+    @staticmethod
+    def verificar_firma_evento(checksum_recibido, evento_json):
+        """
+        Verifica la firma de un evento webhook usando EVENTS SECRET
+        """
+        return WompiUtils.checksum_evento(evento_json) == checksum_recibido.upper()
     
     @staticmethod
     def consultar_transaccion(transaction_id):
         """
-        Consulta el estado de una transacción en Wompi
+        Consulta el estado de una transacción en Wompi (cliente compartido con
+        pool de conexiones, timeouts, reintentos y caché; ver cliente_wompi.py)
         """
-        url = f"{WompiUtils.get_base_url()}/transactions/{transaction_id}"
-        
-        headers = {
-            'Authorization': f'Bearer {settings.WOMPI_PUBLIC_KEY}'
-        }
-        
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            return obtener_cliente().consultar_transaccion(transaction_id)
+        except ErrorWompi as e:
             print(f"Error consultando transacción: {e}")
             return None
 
@@ -101,6 +103,18 @@ class WompiUtils:
 def actualizar_stock_productos(detalle_pedido, usuario=None):
     """
     Actualiza el stock de las variantes de productos después de un pago exitoso.
+
+    El número de consultas no depende del tamaño del pedido: un SELECT FOR
+    UPDATE de las variantes y otro de los productos (ambos en orden de id, así
+    dos pagos simultáneos no se interbloquean), un UPDATE condicional
+    (``WHERE stock >= stock_reservado + n``) para todas las variantes y otro
+    (``WHERE stock >= n``) para los productos, el resumen de stock y un
+    bulk_create de los movimientos de inventario.
+
+    Solo se vende lo que no está reservado por otros compradores. Se llama
+    después de ``convertir_reservas``: las reservas de esta misma compra ya no
+    cuentan en ``stock_reservado``, y una compra cuya reserva se liberó (venció
+    o fue reemplazada) no puede llevarse unidades que otro tiene apartadas.
     
     Args:
         detalle_pedido (dict): Diccionario con los productos del pedido
@@ -110,7 +124,11 @@ def actualizar_stock_productos(detalle_pedido, usuario=None):
         tuple: (exitoso: bool, mensajes: list)
     """
     from carrito.models import ProductoVariante, Inventario, Producto
+    from core.generaciones import incrementar_generacion
+    from core.middleware import ambito_producto
     from django.db import transaction
+    from django.db.models import Case, F, IntegerField, Q, When
+    from django.utils import timezone
     
     mensajes = []
     exitoso = True
@@ -123,6 +141,35 @@ def actualizar_stock_productos(detalle_pedido, usuario=None):
     # Usar transacción atómica para garantizar consistencia
     try:
         with transaction.atomic():
+            # Variantes por FK, o por producto + talla + color en pedidos anteriores a la FK
+            por_id = {p['variante_id'] for p in productos if p.get('variante_id')}
+            por_texto = {
+                (p['producto_id'], p['talla'], p['color']) for p in productos
+                if not p.get('variante_id') and p.get('producto_id') and p.get('talla') and p.get('color')
+            }
+            filtro = Q(id__in=por_id)
+            for producto_id, talla, color in por_texto:
+                filtro |= Q(producto_id=producto_id, talla=talla, color=color)
+            variantes = list(
+                ProductoVariante.objects.select_for_update().filter(filtro).order_by('id')
+                .only('id', 'producto_id', 'talla', 'color', 'stock', 'stock_reservado')
+            ) if por_id or por_texto else []
+            variantes_por_id = {v.id: v for v in variantes}
+            variantes_por_texto = {(v.producto_id, v.talla, v.color): v for v in variantes}
+
+            productos_bloqueados = {
+                p.id: p for p in Producto.objects.select_for_update().filter(
+                    id__in={p.get('producto_id') for p in productos if p.get('producto_id')}
+                ).order_by('id').only('id', 'stock')
+            }
+
+            # Stock que queda tras cada línea; varias líneas pueden compartir variante o producto
+            stock_variante = {v.id: v.stock for v in variantes}
+            disponible_variante = {v.id: v.stock - v.stock_reservado for v in variantes}
+            stock_producto = {p.id: p.stock for p in productos_bloqueados.values()}
+            descuento_variante, descuento_producto = defaultdict(int), defaultdict(int)
+            movimientos = []
+
             for prod_data in productos:
                 producto_id = prod_data.get('producto_id')
                 cantidad = prod_data.get('cantidad', 0)
@@ -135,86 +182,105 @@ def actualizar_stock_productos(detalle_pedido, usuario=None):
                     continue
                 
                 # Verificar si el producto existe
-                try:
-                    producto = Producto.objects.get(id=producto_id)
-                except Producto.DoesNotExist:
+                if producto_id not in productos_bloqueados:
                     mensajes.append(f"❌ Producto {nombre} (ID: {producto_id}) no encontrado")
                     exitoso = False
                     continue
                 
-                # Si tiene talla y color, buscar la variante
-                if talla and color:
-                    try:
-                        variante = ProductoVariante.objects.select_for_update().get(
-                            producto_id=producto_id,
-                            talla=talla,
-                            color=color
-                        )
-                        
-                        # Verificar stock disponible en la variante
-                        if variante.stock < cantidad:
-                            mensajes.append(
-                                f"⚠️ Stock insuficiente para {nombre} ({talla}/{color}). "
-                                f"Disponible: {variante.stock}, Solicitado: {cantidad}"
-                            )
-                            exitoso = False
-                            continue
-                        
-                        # Verificar stock total del producto
-                        if producto.stock < cantidad:
-                            mensajes.append(
-                                f"⚠️ Stock total insuficiente para {nombre}. "
-                                f"Disponible: {producto.stock}, Solicitado: {cantidad}"
-                            )
-                            exitoso = False
-                            continue
-                        
-                        # Guardar stock anterior
-                        stock_anterior = variante.stock
-                        stock_anterior_producto = producto.stock
-                        
-                        # Actualizar stock de la variante
-                        variante.stock -= cantidad
-                        variante.save()
-                        
-                        # ✅ ACTUALIZAR STOCK TOTAL DEL PRODUCTO
-                        producto.stock -= cantidad
-                        producto.save()
-                        
-                        # Registrar movimiento de inventario
-                        Inventario.objects.create(
-                            variante=variante,
-                            tipo_movimiento='salida',
-                            cantidad=cantidad,
-                            stock_anterior=stock_anterior,
-                            stock_nuevo=variante.stock,
-                            usuario=usuario,
-                            observaciones=f'Venta realizada - Pago Wompi (Stock total: {stock_anterior_producto} → {producto.stock})'
-                        )
-                        
-                        mensajes.append(
-                            f"✅ Stock actualizado: {nombre} ({talla}/{color}) - "
-                            f"Descontado: {cantidad} | "
-                            f"Stock variante: {variante.stock} | "
-                            f"Stock total producto: {producto.stock}"
-                        )
-                        
-                    except ProductoVariante.DoesNotExist:
-                        mensajes.append(
-                            f"⚠️ Variante no encontrada para {nombre} "
-                            f"(Talla: {talla}, Color: {color}). Se omitirá la actualización de stock."
-                        )
-                        # No marcamos como error crítico ya que el pedido se creó
-                        
-                else:
-                    # Si no tiene talla/color especificados, podríamos actualizar el stock general del producto
-                    # o simplemente registrar que no se puede actualizar
+                if not (prod_data.get('variante_id') or (talla and color)):
                     mensajes.append(
                         f"ℹ️ Producto {nombre} sin talla/color especificados. "
                         f"No se actualizó stock de variantes."
                     )
+                    continue
+
+                if prod_data.get('variante_id'):
+                    variante = variantes_por_id.get(prod_data['variante_id'])
+                else:
+                    variante = variantes_por_texto.get((producto_id, talla, color))
+                if variante is None:
+                    mensajes.append(
+                        f"⚠️ Variante no encontrada para {nombre} "
+                        f"(Talla: {talla}, Color: {color}). Se omitirá la actualización de stock."
+                    )
+                    # No marcamos como error crítico ya que el pedido se creó
+                    continue
+                talla, color = variante.talla, variante.color
+                
+                # Verificar stock disponible (sin las reservas de otros) en la variante
+                if disponible_variante[variante.id] < cantidad:
+                    mensajes.append(
+                        f"⚠️ Stock insuficiente para {nombre} ({talla}/{color}). "
+                        f"Disponible: {disponible_variante[variante.id]}, Solicitado: {cantidad}"
+                    )
+                    exitoso = False
+                    continue
+                
+                # Verificar stock total del producto
+                if stock_producto[producto_id] < cantidad:
+                    mensajes.append(
+                        f"⚠️ Stock total insuficiente para {nombre}. "
+                        f"Disponible: {stock_producto[producto_id]}, Solicitado: {cantidad}"
+                    )
+                    exitoso = False
+                    continue
+                
+                stock_anterior = stock_variante[variante.id]
+                stock_anterior_producto = stock_producto[producto_id]
+                stock_variante[variante.id] -= cantidad
+                disponible_variante[variante.id] -= cantidad
+                stock_producto[producto_id] -= cantidad
+                descuento_variante[variante.id] += cantidad
+                descuento_producto[producto_id] += cantidad
+                
+                # Registrar movimiento de inventario
+                movimientos.append(Inventario(
+                    variante_id=variante.id,
+                    tipo_movimiento='salida',
+                    cantidad=cantidad,
+                    stock_anterior=stock_anterior,
+                    stock_nuevo=stock_variante[variante.id],
+                    usuario=usuario,
+                    observaciones=f'Venta realizada - Pago Wompi (Stock total: {stock_anterior_producto} → {stock_producto[producto_id]})'
+                ))
+                
+                mensajes.append(
+                    f"✅ Stock actualizado: {nombre} ({talla}/{color}) - "
+                    f"Descontado: {cantidad} | "
+                    f"Stock variante: {stock_variante[variante.id]} | "
+                    f"Stock total producto: {stock_producto[producto_id]}"
+                )
+
+            if movimientos:
+                ahora = timezone.now()
+                for modelo, descuentos in ((ProductoVariante, descuento_variante), (Producto, descuento_producto)):
+                    # Un UPDATE para todas las filas; el WHERE repite la verificación de stock
+                    condicion = Q()
+                    for pk, cantidad in descuentos.items():
+                        if modelo is ProductoVariante:
+                            condicion |= Q(pk=pk, stock__gte=F('stock_reservado') + cantidad)
+                        else:
+                            condicion |= Q(pk=pk, stock__gte=cantidad)
+                    actualizadas = modelo.objects.filter(condicion).update(
+                        stock=Case(
+                            *(When(pk=pk, then=F('stock') - cantidad) for pk, cantidad in descuentos.items()),
+                            output_field=IntegerField(),
+                        ),
+                        updated_at=ahora,
+                    )
+                    if actualizadas != len(descuentos):
+                        raise RuntimeError(f'el stock de {modelo._meta.verbose_name_plural} cambió durante la actualización')
+
+                Producto.recalcular_resumen_stock(list(descuento_producto))
+                Inventario.objects.bulk_create(movimientos)
+
+                # Los UPDATE no disparan post_save: invalidar la caché como lo harían las señales
+                incrementar_generacion(ProductoVariante)
+                incrementar_generacion(Producto)
+                for producto_id in descuento_producto:
+                    incrementar_generacion(ambito_producto(producto_id))
         
         return exitoso, mensajes
         
     except Exception as e:
-        return False, [f"❌ Error al actualizar stock: {str(e)}"]
\ No newline at end of file
+        return False, [f"❌ Error al actualizar stock: {str(e)}"]
@@ -7,11 +7,18 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from .models import Transaccion
 from .utils import WompiUtils
+from .bandeja import registrar_evento
+from .cumplimiento import cumplir_transaccion
+from .reservas import (
+    StockInsuficiente, liberar_reservas, liberar_reservas_reemplazadas,
+    reservar_stock,
+)
+from django.db import transaction as db_transaction
 from django.utils import timezone
 import json, random
 
 # Importar modelos de tu app core
-from carrito.models import Carrito, ItemCarrito, Pedido
+from carrito.models import Carrito, ItemCarrito
 
 def pagina_pago(request):
     """Vista para redirigir a Wompi Web Checkout"""
@@ -116,138 +123,41 @@ def confirmar_pago(request):
 @require_http_methods(["POST"])
 def webhook_wompi(request):
     """
-    Endpoint para recibir eventos de Wompi
+    Endpoint para recibir eventos de Wompi. Solo verifica la firma y guarda el
+    evento en la bandeja; el comando procesar_webhooks lo aplica (pagos/bandeja.py)
     """
     try:
-        # Obtener checksum del header
         checksum_recibido = request.headers.get('X-Event-Checksum', '')
-        
-        # Parsear JSON
         evento = json.loads(request.body)
-        
-        print("="*60)
-        print("🔔 WEBHOOK RECIBIDO")
-        print("="*60)
-        print(f"Evento: {evento.get('event')}")
-        print("="*60)
-        
-        # Verificar firma
+
         if not WompiUtils.verificar_firma_evento(checksum_recibido, evento):
-            print("❌ FIRMA INVÁLIDA")
+            print("❌ Webhook con firma inválida")
             return JsonResponse({'error': 'Firma inválida'}, status=400)
-        
-        print("✅ FIRMA VÁLIDA")
-        
-        # Procesar evento según tipo
-        tipo_evento = evento.get('event')
-        
-        if tipo_evento == 'transaction.updated':
-            datos_transaccion = evento['data']['transaction']
-            
-            try:
-                transaccion = Transaccion.objects.get(
-                    referencia=datos_transaccion['reference']
-                )
-                
-                transaccion.wompi_transaction_id = datos_transaccion['id']
-                transaccion.wompi_status = datos_transaccion['status']
-                transaccion.metodo_pago = datos_transaccion.get('payment_method_type', '')
-                transaccion.respuesta_completa = datos_transaccion
-                
-                # Actualizar estado
-                if datos_transaccion['status'] == 'APPROVED':
-                    transaccion.estado = 'APPROVED'
-                    print(f"✅ Transacción APROBADA: {transaccion.referencia}")
-                    
-                    # 🎉 Crear pedidos si hay detalle
-                    if transaccion.detalle_pedido and transaccion.usuario:
-                        productos = transaccion.detalle_pedido.get('productos', [])
-                        direccion_envio = transaccion.detalle_pedido.get('direccion_envio', '')
-                        telefono_contacto = transaccion.detalle_pedido.get('telefono_contacto', '')
-                        from carrito.models import Producto
-                        from .utils import actualizar_stock_productos
-                        
-                        for prod_data in productos:
-                            try:
-                                producto = Producto.objects.get(id=prod_data['producto_id'])
-                                
-                                # Calcular total del pedido
-                                total_pedido = producto.precio * prod_data['cantidad']
-                                
-                                # Crear notas del pedido con información de envío
-                                notas_pedido = f'Pedido realizado mediante Wompi - Referencia: {transaccion.referencia}'
-                                if direccion_envio:
-                                    notas_pedido += f'\nDirección de envío: {direccion_envio}'
-                                if telefono_contacto:
-                                    notas_pedido += f'\nTeléfono de contacto: {telefono_contacto}'
-                                
-                                # Crear pedido con todos los campos necesarios
-                                pedido = Pedido.objects.create(
-                                    usuario=transaccion.usuario,
-                                    producto=producto,
-                                    cantidad=prod_data['cantidad'],
-                                    total=total_pedido,
-                                    estado='pendiente',
-                                    telefono=telefono_contacto or transaccion.usuario.telefono or '',
-                                    notas=notas_pedido
-                                )
-                                print(f"✅ Pedido {pedido.numero} creado: {producto.nombre} x{prod_data['cantidad']} - Total: ${total_pedido}")
-                                print(f"   Dirección: {direccion_envio}")
-                            except Producto.DoesNotExist:
-                                print(f"❌ Producto {prod_data['producto_id']} no encontrado")
-                            except Exception as e:
-                                print(f"❌ Error creando pedido: {e}")
-                        
-                        # 📦 Actualizar stock de variantes
-                        exitoso, mensajes = actualizar_stock_productos(
-                            transaccion.detalle_pedido,
-                            transaccion.usuario
-                        )
-                        
-                        for mensaje in mensajes:
-                            print(mensaje)
-                        
-                        if not exitoso:
-                            print("⚠️ Algunos productos no pudieron actualizar su stock")
-                        
-                        # Vaciar carrito
-                        try:
-                            carrito = Carrito.objects.get(usuario=transaccion.usuario)
-                            carrito.items.all().delete()
-                            print(f"✅ Carrito vaciado para usuario {transaccion.usuario.username}")
-                        except Carrito.DoesNotExist:
-                            print(f"⚠️ Carrito no encontrado para usuario {transaccion.usuario.username}")
-                        except Exception as e:
-                            print(f"❌ Error vaciando carrito: {e}")
-                    
-                elif datos_transaccion['status'] == 'DECLINED':
-                    transaccion.estado = 'DECLINED'
-                    print(f"❌ Transacción RECHAZADA: {transaccion.referencia}")
-                elif datos_transaccion['status'] == 'VOIDED':
-                    transaccion.estado = 'VOIDED'
-                    print(f"⚠️ Transacción ANULADA: {transaccion.referencia}")
-                
-                transaccion.save()
-                
-            except Transaccion.DoesNotExist:
-                print(f"❌ Transacción no encontrada: {datos_transaccion['reference']}")
-        
-        return JsonResponse({'status': 'ok'})
-        
-    except Exception as e:
-        print(f"❌ Error en webhook: {e}")
-        return JsonResponse({'error': str(e)}, status=500)
+    except (ValueError, KeyError, TypeError) as e:
+        return JsonResponse({'error': f'Evento inválido: {e}'}, status=400)
+
+    # Un reintento de Wompi (mismo checksum) también responde 200 para que deje de enviarlo
+    nuevo = registrar_evento(evento, checksum_recibido)
+    return JsonResponse({'status': 'ok', 'duplicado': not nuevo})
 
 def historial_transacciones(request):
     """Vista para ver el historial de transacciones"""
+    from django.core.paginator import Paginator
     
     if request.user.is_authenticated:
-        transacciones = Transaccion.objects.filter(usuario=request.user)
+        # Índice (usuario, -creado); los payloads de Wompi quedan en TransaccionArchivo
+        transacciones = Transaccion.objects.filter(usuario=request.user).only(
+            'id', 'referencia', 'monto', 'estado', 'metodo_pago', 'creado'
+        ).order_by('-creado')
     else:
-        transacciones = []
+        transacciones = Transaccion.objects.none()
+    
+    # Paginación: 20 transacciones por página
+    paginator = Paginator(transacciones, 20)
+    page_obj = paginator.get_page(request.GET.get('page', 1))
     
     return render(request, 'pagos/historial.html', {
-        'transacciones': transacciones
+        'transacciones': page_obj
     })
 @login_required
 def checkout_desde_carrito(request):
@@ -275,19 +185,20 @@ def checkout_desde_carrito(request):
     
     # Obtener carrito del usuario
     try:
-        carrito = Carrito.objects.prefetch_related('items__producto').get(usuario=request.user)
-        items = carrito.items.all()
-        
-        if not items.exists():
-            messages.error(request, 'Tu carrito está vacío')
-            return redirect('ver_carrito')
-        
+        carrito = Carrito.objects.get(usuario=request.user)
     except Carrito.DoesNotExist:
         messages.error(request, 'No tienes un carrito creado')
         return redirect('index')
     
-    # Calcular total del carrito
-    total = carrito.total()
+    # Líneas, unidades y total en una sola consulta agregada (sin caché: es el monto a cobrar)
+    resumen = carrito.items.resumen()
+    if not resumen['lineas']:
+        messages.error(request, 'Tu carrito está vacío')
+        return redirect('ver_carrito')
+    
+    # Subtotal de cada línea calculado en SQL; la variante llega por la FK en el mismo JOIN
+    items = list(carrito.items.select_related('producto', 'variante').con_subtotal())
+    total = resumen['total']
     
     if total <= 0:
         messages.error(request, 'El total del carrito debe ser mayor a cero')
@@ -319,6 +230,7 @@ def checkout_desde_carrito(request):
     for item in items:
         detalle_productos.append({
             'producto_id': item.producto.id,
+            'variante_id': item.variante_id,
             'nombre': item.producto.nombre,
             'precio': float(item.producto.precio),
             'cantidad': item.cantidad,
@@ -330,22 +242,35 @@ def checkout_desde_carrito(request):
     detalle_pedido = {
         'productos': detalle_productos,
         'total': float(total),
-        'cantidad_items': items.count(),
+        'cantidad_items': resumen['lineas'],
         'direccion_envio': request.user.direccion,
         'telefono_contacto': request.user.telefono
     }
     
-    # Crear transacción en BD
-    transaccion = Transaccion.objects.create(
-        usuario=request.user,
-        referencia=referencia,
-        monto=total,
-        estado='PENDING',
-        signature=firma,
-        email=request.user.email,
-        nombre_completo=request.user.get_full_name() or request.user.username,
-        detalle_pedido=detalle_pedido
-    )
+    # Crear transacción en BD y apartar el stock hasta que Wompi confirme el pago
+    lineas_reserva = [(p['variante_id'], p['cantidad']) for p in detalle_productos if p['variante_id']]
+    liberar_reservas_reemplazadas(request.user, lineas_reserva)
+    try:
+        with db_transaction.atomic():
+            transaccion = Transaccion.objects.create(
+                usuario=request.user,
+                referencia=referencia,
+                monto=total,
+                estado='PENDING',
+                signature=firma,
+                email=request.user.email,
+                nombre_completo=request.user.get_full_name() or request.user.username,
+                detalle_pedido=detalle_pedido
+            )
+            reservar_stock(transaccion, lineas_reserva)
+    except StockInsuficiente as e:
+        item = next(i for i in items if i.variante_id == e.variante_id)
+        messages.error(
+            request,
+            f'No hay stock suficiente de {item.producto.nombre} ({item.variante.talla}/{item.variante.color}). '
+            f'Disponible: {item.variante.stock_disponible}'
+        )
+        return redirect('ver_carrito')
     
     print("="*60)
     print("🛒 CHECKOUT DESDE CARRITO")
@@ -415,80 +340,15 @@ def confirmar_pago_carrito(request):
         
         # Mapear estado
         if datos_wompi['data']['status'] == 'APPROVED':
-            transaccion.estado = 'APPROVED'
-            
-            # 🎉 PAGO APROBADO: Crear pedidos y vaciar carrito
-            if transaccion.detalle_pedido and transaccion.usuario:
-                productos = transaccion.detalle_pedido.get('productos', [])
-                direccion_envio = transaccion.detalle_pedido.get('direccion_envio', '')
-                telefono_contacto = transaccion.detalle_pedido.get('telefono_contacto', '')
-                from .utils import actualizar_stock_productos
-                
-                # Crear un pedido por cada producto
-                for prod_data in productos:
-                    from carrito.models import Producto
-                    import uuid
-                    from datetime import datetime
-                    from decimal import Decimal
-                    
-                    try:
-                        producto = Producto.objects.get(id=prod_data['producto_id'])
-                        
-                        # Calcular total del pedido
-                        total_pedido = Decimal(str(prod_data['precio'])) * prod_data['cantidad']
-                        
-                        # Generar número único de pedido
-                        numero_pedido = f"PED-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
-                        
-                        # Crear notas del pedido con información de envío
-                        notas_pedido = f'Pedido realizado mediante Wompi - Referencia: {transaccion.referencia}'
-                        if direccion_envio:
-                            notas_pedido += f'\nDirección de envío: {direccion_envio}'
-                        if telefono_contacto:
-                            notas_pedido += f'\nTeléfono de contacto: {telefono_contacto}'
-                        
-                        # Crear el pedido con todos los campos necesarios
-                        Pedido.objects.create(
-                            usuario=transaccion.usuario,
-                            producto=producto,
-                            cantidad=prod_data['cantidad'],
-                            numero=numero_pedido,
-                            total=total_pedido,
-                            estado='pendiente',
-                            telefono=telefono_contacto or (transaccion.usuario.telefono if hasattr(transaccion.usuario, 'telefono') else None),
-                            notas=notas_pedido
-                        )
-                        print(f"✅ Pedido {numero_pedido} creado para {producto.nombre}")
-                        print(f"   Dirección: {direccion_envio}")
-
-                    except Producto.DoesNotExist:
-                        print(f"❌ Producto {prod_data['producto_id']} no encontrado")
-                
-                # 📦 Actualizar stock de variantes
-                exitoso, mensajes = actualizar_stock_productos(
-                    transaccion.detalle_pedido,
-                    transaccion.usuario
-                )
-                
-                for mensaje in mensajes:
-                    print(mensaje)
-                
-                if not exitoso:
-                    print("⚠️ Algunos productos no pudieron actualizar su stock")
-                    messages.warning(request, 'Pedido creado pero algunos productos no pudieron actualizar su stock.')
-                
-                # Vaciar el carrito
-                try:
-                    carrito = Carrito.objects.get(usuario=transaccion.usuario)
-                    carrito.items.all().delete()
-                    print(f"✅ Carrito vaciado para usuario {transaccion.usuario.username}")
-                except Carrito.DoesNotExist:
-                    pass
-            
+            # 🎉 PAGO APROBADO: pedidos, stock y carrito (no-op si el webhook ya lo hizo)
+            resultado = cumplir_transaccion(transaccion)
             messages.success(request, '¡Pago aprobado exitosamente! Tu pedido ha sido registrado.')
+            if resultado is not None and not resultado[0]:
+                messages.warning(request, 'Pedido creado pero algunos productos no pudieron actualizar su stock.')
             
         elif datos_wompi['data']['status'] == 'DECLINED':
             transaccion.estado = 'DECLINED'
+            liberar_reservas(transaccion)
             messages.error(request, 'El pago fue rechazado. Por favor intenta con otro método de pago.')
         else:
             transaccion.estado = 'PENDING'
@@ -3,7 +3,7 @@ Script de prueba para crear un pedido manualmente y verificar que aparece en el
 """
 
 from django.contrib.auth import get_user_model
-from carrito.models import Pedido, Producto
+from carrito.models import Pedido, PedidoLinea, Producto
 
 User = get_user_model()
 
@@ -15,8 +15,6 @@ if usuario and producto:
     # Crear pedido de prueba
     pedido = Pedido.objects.create(
         usuario=usuario,
-        producto=producto,
-        cantidad=2,
         total=producto.precio * 2,
         estado='pendiente',
         telefono=usuario.telefono or '3001234567',
@@ -25,14 +23,21 @@ if usuario and producto:
         codigo_postal='110111',
         notas='Pedido de prueba para verificar el dashboard'
     )
+    PedidoLinea.objects.create(
+        pedido=pedido,
+        producto=producto,
+        cantidad=2,
+        precio_unitario=producto.precio,
+        subtotal=producto.precio * 2,
+    )
     
     print("=" * 60)
     print("✅ PEDIDO DE PRUEBA CREADO")
     print("=" * 60)
     print(f"Número: {pedido.numero}")
     print(f"Usuario: {pedido.usuario.username}")
-    print(f"Producto: {pedido.producto.nombre}")
-    print(f"Cantidad: {pedido.cantidad}")
+    print(f"Producto: {producto.nombre}")
+    print(f"Cantidad: 2")
     print(f"Total: ${pedido.total}")
     print(f"Estado: {pedido.get_estado_display()}")
     print(f"Fecha: {pedido.fecha}")